@@ -0,0 +1,86 @@
+"""Alertas de stock bajo y de vencimiento.
+
+``Producto.en_alerta`` guarda si ``cantidad <= umbral_stock_bajo``. Se
+recalcula en ``Producto.save()`` y dentro del mismo UPDATE que mueve el
+stock, asi la vista de alertas y los conteos del navbar leen un indice
+parcial en vez de comparar columnas en toda la tabla.
+
+El vencimiento se sigue por lote (lotes.py): los lotes por vencer se leen
+del indice parcial de lotes con stock, y ``Producto.fecha_vencimiento`` es
+el vencimiento mas proximo de cada producto.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import BooleanField, ExpressionWrapper, F, Q
+from django.utils import timezone
+
+from . import cache as inventario_cache
+from .models import Lote, Producto
+
+DIAS_AVISO_VENCIMIENTO = 30
+SEGUNDOS_CACHE_CONTEOS = 60
+
+
+def en_alerta_tras(delta=0):
+    """Valor de ``en_alerta`` luego de sumar ``delta`` al stock, para usar en un UPDATE.
+
+    En un UPDATE todas las expresiones ven los valores anteriores de la fila,
+    por eso se compara la cantidad actual contra ``umbral - delta``.
+    """
+    return ExpressionWrapper(Q(cantidad__lte=F('umbral_stock_bajo') - delta), output_field=BooleanField())
+
+
+def recalcular(productos=None):
+    """Recalcula la marca para un queryset (o todo el catalogo) con un solo UPDATE."""
+    if productos is None:
+        productos = Producto.objects.all()
+    actualizados = productos.update(en_alerta=en_alerta_tras(0))
+    invalidar()
+    return actualizados
+
+
+def productos_stock_bajo():
+    return Producto.objects.filter(en_alerta=True)
+
+
+def fecha_limite_vencimiento(hoy=None):
+    hoy = hoy or timezone.now().date()
+    return hoy + timedelta(days=DIAS_AVISO_VENCIMIENTO)
+
+
+def lotes_vigentes(desde=None, hasta=None):
+    """Lotes con stock y vencimiento, opcionalmente en un rango de fechas (indice lote_vencimiento_idx)."""
+    lotes = Lote.objects.filter(cantidad__gt=0, fecha_vencimiento__isnull=False)
+    if desde:
+        lotes = lotes.filter(fecha_vencimiento__gte=desde)
+    if hasta:
+        lotes = lotes.filter(fecha_vencimiento__lte=hasta)
+    return lotes
+
+
+def lotes_por_vencer(hoy=None):
+    return lotes_vigentes(hasta=fecha_limite_vencimiento(hoy))
+
+
+def conteos():
+    """Productos con stock bajo y lotes por vencer, cacheados hasta el proximo cambio de stock.
+
+    El vencimiento cuenta lotes, como el listado de productos por vencer.
+    """
+    hoy = timezone.now().date()
+    clave = inventario_cache.clave('alertas', hoy)
+    datos = cache.get(clave)
+    if datos is None:
+        datos = {
+            'stock_bajo': productos_stock_bajo().count(),
+            'vencimiento': lotes_por_vencer(hoy).count(),
+        }
+        cache.set(clave, datos, SEGUNDOS_CACHE_CONTEOS)
+    return datos
+
+
+def invalidar():
+    """Descarta los conteos cacheados al confirmar la transaccion en curso."""
+    transaction.on_commit(lambda: inventario_cache.invalidar('alertas'))
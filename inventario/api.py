@@ -0,0 +1,579 @@
+"""API JSON de productos, lotes, movimientos, precios de compra y categorias.
+
+Pensada para los lectores de codigo de barras y la integracion con el ERP,
+que antes leian el HTML de los listados. Las filas se serializan desde
+``.values()`` (sin instanciar modelos) y se paginan con cursor
+(``?cursor=``, ``?limite=``); ``?campos=codigo,cantidad`` limita las columnas.
+
+Los GET llevan ``ETag`` y ``Last-Modified`` tomados de ``VersionInventario``:
+un cliente que consulta periodicamente con ``If-None-Match`` recibe
+``304 Not Modified`` sin que se ejecute la consulta del listado mientras
+nada cambie en el inventario.
+
+Los lectores y el ERP se autentican con ``Authorization: Bearer <clave>``
+(ver tokens.py y ``manage.py crear_token_api``); el navegador, con su sesion.
+Solo las escrituras con sesion llevan token CSRF, y sus rechazos vuelven en
+JSON como cualquier otro error de la API.
+
+Con ASGI se sirven las variantes de vistas_async.py, que leen con el ORM
+asincrono (``AsyncApiMixin``).
+"""
+import asyncio
+import functools
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.forms.models import model_to_dict
+from django.http import Http404, HttpResponse, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from . import cambios, catalogo, lotes, stock, tokens, ubicaciones
+from .decorators import GroupRequiredMixin
+from .forms import (
+    BusquedaProductoForm, FiltroMovimientosForm, LoteForm, MovimientoInventarioForm, PrecioCompraForm,
+    ProductoForm,
+)
+from .models import Categoria, Lote, MovimientoInventario, PrecioCompra, Producto, VersionInventario
+from .paginacion import apaginar_keyset, paginar_keyset
+
+TAMANO_PAGINA = 50
+TAMANO_MAXIMO = 500
+
+
+class ErrorApi(Exception):
+    def __init__(self, mensaje, status=400, **extra):
+        self.mensaje = mensaje
+        self.status = status
+        self.extra = extra
+        super().__init__(mensaje)
+
+
+class _RevisionCsrf(CsrfViewMiddleware):
+    """La revision de CsrfViewMiddleware, devolviendo el motivo del rechazo en vez de la pagina 403."""
+
+    def _reject(self, request, reason):
+        return reason
+
+
+def _leer_json(request):
+    try:
+        datos = json.loads(request.body)
+    except ValueError:
+        raise ErrorApi('JSON inválido.')
+    if not isinstance(datos, dict):
+        raise ErrorApi('Se esperaba un objeto JSON.')
+    return datos
+
+
+def _errores_formulario(form):
+    return ErrorApi('Datos inválidos.', errores=form.errors.get_json_data())
+
+
+def _serializar(filas, campos):
+    """Renombra las columnas de filas de ``.values()`` segun ``campos`` ({nombre: columna})."""
+    return [{nombre: fila[columna] for nombre, columna in campos.items()} for fila in filas]
+
+
+def _categorias_por_producto(ids):
+    categorias = {pk: [] for pk in ids}
+    relaciones = Producto.categorias.through.objects.filter(producto_id__in=ids).order_by('categoria_id')
+    for producto_id, categoria_id in relaciones.values_list('producto_id', 'categoria_id'):
+        categorias[producto_id].append(categoria_id)
+    return categorias
+
+
+class ApiView(LoginRequiredMixin, GroupRequiredMixin, View):
+    """Base de los recursos: permisos por metodo, errores en JSON y listados por ``.values()``.
+
+    ``campos`` relaciona el nombre publico de cada columna con el campo que
+    se pide a ``.values()``; ``campos_calculados`` son columnas que arma
+    ``completar()`` con una consulta aparte por pagina.
+    """
+    raise_exception = True
+    group_required = ['Administrador', 'Gestor de Inventario', 'Encargado de Logística']
+    grupos_escritura = ['Administrador', 'Gestor de Inventario']
+    grupos_eliminacion = ['Administrador']
+    campos = {}
+    campos_calculados = ()
+    orden = ['id']
+
+    def test_func(self):
+        if self.request.method == 'DELETE':
+            self.group_required = self.grupos_eliminacion
+        elif self.request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            self.group_required = self.grupos_escritura
+        return super().test_func()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # La revision CSRF la hace autenticar(): solo aplica a la sesion del navegador
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def handle_no_permission(self):
+        if not self.request.user.is_authenticated:
+            raise ErrorApi('Autenticación requerida.', status=401)
+        raise ErrorApi('No tiene permisos para esta operación.', status=403)
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            self.autenticar(request)
+            return super().dispatch(request, *args, **kwargs)
+        except (ErrorApi, Http404) as exc:
+            return self.respuesta_error(exc)
+
+    def respuesta_error(self, exc):
+        if isinstance(exc, Http404):
+            return JsonResponse({'error': str(exc) or 'No encontrado.'}, status=404)
+        respuesta = JsonResponse({'error': exc.mensaje, **exc.extra}, status=exc.status)
+        if exc.status == 401:
+            respuesta.headers['WWW-Authenticate'] = tokens.ESQUEMA
+        return respuesta
+
+    def autenticar(self, request):
+        """Usa la clave de API si la hay; si no, la sesion, con revision CSRF en las escrituras."""
+        try:
+            usuario = tokens.autenticar(request)
+        except tokens.TokenInvalido as exc:
+            raise ErrorApi(str(exc), status=401)
+        if usuario is not None:
+            request.user = usuario
+            return
+        if request.method in ('GET', 'HEAD', 'OPTIONS', 'TRACE') or not request.user.is_authenticated:
+            return
+        revision = _RevisionCsrf(lambda request: None)
+        revision.process_request(request)
+        motivo = revision.process_view(request, None, (), {})
+        if motivo:
+            raise ErrorApi(f'Verificación CSRF fallida: {motivo}', status=403)
+
+    # Lectura
+
+    def campos_pedidos(self):
+        pedidos = self.request.GET.get('campos')
+        if not pedidos:
+            return [*self.campos, *self.campos_calculados]
+        nombres = [nombre.strip() for nombre in pedidos.split(',') if nombre.strip()]
+        desconocidos = [n for n in nombres if n not in self.campos and n not in self.campos_calculados]
+        if desconocidos:
+            raise ErrorApi(f"Campos desconocidos: {', '.join(desconocidos)}.")
+        return nombres
+
+    def serializar(self, queryset, nombres):
+        """Filas de ``queryset`` como diccionarios con los ``nombres`` publicos."""
+        return _serializar(queryset, {n: self.campos[n] for n in nombres if n in self.campos})
+
+    def valores(self, queryset, nombres, extra=()):
+        columnas = {self.campos[n] for n in nombres if n in self.campos}
+        return queryset.values(*columnas, 'id', *extra)
+
+    def completar(self, filas, ids, nombres):
+        """Agrega los ``campos_calculados`` pedidos. ``ids`` va en el mismo orden que ``filas``."""
+
+    def consulta_listado(self, queryset):
+        """Campos pedidos, consulta, orden y tamaño de la pagina del listado."""
+        nombres = self.campos_pedidos()
+        try:
+            limite = min(int(self.request.GET.get('limite', TAMANO_PAGINA)), TAMANO_MAXIMO)
+        except ValueError:
+            raise ErrorApi('limite debe ser un número entero.')
+        orden = self.get_orden()
+        filas_orden = self.valores(queryset, nombres, [campo.lstrip('-') for campo in orden])
+        return nombres, filas_orden, orden, max(limite, 1)
+
+    def listar(self, queryset):
+        nombres, filas_orden, orden, limite = self.consulta_listado(queryset)
+        pagina = paginar_keyset(filas_orden, orden, self.request.GET.get('cursor'), limite)
+        filas = self.serializar(pagina, nombres)
+        self.completar(filas, [fila['id'] for fila in pagina], nombres)
+        return self.listado(filas, pagina)
+
+    def listado(self, filas, pagina):
+        return {
+            'resultados': filas,
+            'siguiente': self._url_cursor(pagina.siguiente),
+            'anterior': self._url_cursor(pagina.anterior),
+        }
+
+    def detalle(self, queryset):
+        nombres = self.campos_pedidos()
+        fila = self.valores(queryset, nombres).first()
+        if fila is None:
+            raise Http404('No encontrado.')
+        filas = self.serializar([fila], nombres)
+        self.completar(filas, [fila['id']], nombres)
+        return filas[0]
+
+    def get_orden(self):
+        return self.orden
+
+    def filtros(self, form_class):
+        """Formulario de filtros validado con los parametros de la consulta."""
+        form = form_class(self.request.GET)
+        if not form.is_valid():
+            raise _errores_formulario(form)
+        return form
+
+    def _url_cursor(self, cursor):
+        if cursor is None:
+            return None
+        params = self.request.GET.copy()
+        params['cursor'] = cursor
+        return f'{self.request.path}?{params.urlencode()}'
+
+    def respuesta_condicional(self, generar):
+        """Responde 304 si el cliente ya tiene la version actual; si no, llama a ``generar()``."""
+        version = VersionInventario.objects.filter(pk=1).values_list('version', 'actualizado').first()
+        etag, ultima, respuesta = self.revalidar(version)
+        if respuesta is None:
+            respuesta = JsonResponse(generar())
+        return self.con_validadores(respuesta, etag, ultima)
+
+    def revalidar(self, version):
+        """ETag, Last-Modified y la respuesta 304 (o None) para la fila de ``VersionInventario``."""
+        version, actualizado = version or (0, None)
+        # La misma version se ve distinta segun la URL (filtros, cursor, campos)
+        huella = hashlib.md5(self.request.get_full_path().encode()).hexdigest()[:16]
+        etag = quote_etag(f'{version}-{huella}')
+        ultima = int(actualizado.timestamp()) if actualizado else None
+        return etag, ultima, get_conditional_response(self.request, etag=etag, last_modified=ultima)
+
+    def con_validadores(self, respuesta, etag, ultima):
+        respuesta.headers['ETag'] = etag
+        if ultima is not None:
+            respuesta.headers['Last-Modified'] = http_date(ultima)
+        # Los clientes pueden guardar la respuesta pero deben revalidarla
+        patch_cache_control(respuesta, private=True, no_cache=True)
+        return respuesta
+
+
+class AsyncApiMixin:
+    """Lecturas con el ORM asincrono para servir la API con ASGI (ver vistas_async.py).
+
+    Se antepone a un recurso de este modulo. La autenticacion, los permisos y
+    ``completar()`` corren en un hilo; los ``get`` asincronos de cada recurso
+    usan ``arespuesta_condicional``, ``alistar`` y ``adetalle``. Las escrituras
+    (formularios, transacciones, señales) siguen siendo sincronicas y se
+    ejecutan en un hilo con ``sync_to_async``.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for metodo in ('post', 'patch', 'delete'):
+            handler = getattr(cls, metodo, None)
+            if handler is not None and not asyncio.iscoroutinefunction(handler):
+                setattr(cls, metodo, _en_hilo(handler))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            request.user = await request.auser()
+            await sync_to_async(self.autenticar)(request)
+            if not request.user.is_authenticated or not await sync_to_async(self.test_func)():
+                self.handle_no_permission()
+            return await View.dispatch(self, request, *args, **kwargs)
+        except (ErrorApi, Http404) as exc:
+            return self.respuesta_error(exc)
+
+    async def arespuesta_condicional(self, generar):
+        """Como ``respuesta_condicional``; ``generar()`` es una corrutina."""
+        version = await VersionInventario.objects.filter(pk=1).values_list('version', 'actualizado').afirst()
+        etag, ultima, respuesta = self.revalidar(version)
+        if respuesta is None:
+            respuesta = JsonResponse(await generar())
+        return self.con_validadores(respuesta, etag, ultima)
+
+    async def alistar(self, queryset):
+        nombres, filas_orden, orden, limite = self.consulta_listado(queryset)
+        pagina = await apaginar_keyset(filas_orden, orden, self.request.GET.get('cursor'), limite)
+        filas = self.serializar(pagina, nombres)
+        await self.acompletar(filas, [fila['id'] for fila in pagina], nombres)
+        return self.listado(filas, pagina)
+
+    async def adetalle(self, queryset):
+        nombres = self.campos_pedidos()
+        fila = await self.valores(queryset, nombres).afirst()
+        if fila is None:
+            raise Http404('No encontrado.')
+        filas = self.serializar([fila], nombres)
+        await self.acompletar(filas, [fila['id']], nombres)
+        return filas[0]
+
+    async def acompletar(self, filas, ids, nombres):
+        if any(nombre in self.campos_calculados for nombre in nombres):
+            await sync_to_async(self.completar)(filas, ids, nombres)
+
+
+def _en_hilo(handler):
+    @functools.wraps(handler)
+    async def envoltura(self, request, *args, **kwargs):
+        return await sync_to_async(handler)(self, request, *args, **kwargs)
+    return envoltura
+
+
+class ProductoApiMixin:
+    campos = {
+        'id': 'id',
+        'codigo': 'codigo',
+        'nombre': 'nombre',
+        'descripcion': 'descripcion',
+        'cantidad': 'cantidad',
+        'ubicacion': 'ubicacion',
+        'fecha_vencimiento': 'fecha_vencimiento',
+        'umbral_stock_bajo': 'umbral_stock_bajo',
+        'en_alerta': 'en_alerta',
+        'precio_actual': 'precio_actual',
+    }
+    campos_calculados = ('categorias',)
+
+    def completar(self, filas, ids, nombres):
+        if 'categorias' not in nombres:
+            return
+        categorias = _categorias_por_producto(ids)
+        for fila, pk in zip(filas, ids):
+            fila['categorias'] = categorias[pk]
+
+    def formulario(self, datos, instance=None):
+        form = ProductoForm(datos, instance=instance)
+        # Las categorias nuevas se crean por /api/categorias/
+        form.fields.pop('nuevas_categorias')
+        return form
+
+    def guardar(self, datos, instance=None):
+        form = self.formulario(datos, instance=instance)
+        if not form.is_valid():
+            raise _errores_formulario(form)
+        return form.save()
+
+
+class ProductosApiView(ProductoApiMixin, ApiView):
+    def get(self, request):
+        self.form = self.filtros(BusquedaProductoForm)
+        return self.respuesta_condicional(lambda: self.listar(self.form.filtrar(Producto.objects.all())))
+
+    def get_orden(self):
+        return self.form.orden_keyset()
+
+    def post(self, request):
+        producto = self.guardar(_leer_json(request))
+        return JsonResponse(self.detalle(Producto.objects.filter(pk=producto.pk)), status=201)
+
+
+class ProductoApiView(ProductoApiMixin, ApiView):
+    def get(self, request, codigo):
+        return self.respuesta_condicional(lambda: self.detalle(Producto.objects.filter(codigo=codigo)))
+
+    def patch(self, request, codigo):
+        producto = self.actualizar(codigo, _leer_json(request))
+        return JsonResponse(self.detalle(Producto.objects.filter(pk=producto.pk)))
+
+    def actualizar(self, codigo, nuevos):
+        producto = catalogo.producto_o_404(codigo)
+        # Los campos que no vienen en el JSON conservan su valor actual
+        datos = model_to_dict(producto, fields=[c for c in ProductoForm._meta.fields if c != 'categorias'])
+        datos['categorias'] = list(producto.categorias.values_list('pk', flat=True))
+        datos.update(nuevos)
+        return self.guardar(datos, instance=producto)
+
+    def delete(self, request, codigo):
+        catalogo.producto_o_404(codigo).delete()
+        return HttpResponse(status=204)
+
+
+class MovimientosApiView(ApiView):
+    group_required = [
+        'Administrador', 'Gestor de Inventario', 'Encargado de Logística',
+        'Auditor de Inventario', 'Comprador', 'Jefe de Producción',
+    ]
+    grupos_escritura = ['Administrador', 'Gestor de Inventario', 'Encargado de Logística']
+    campos = {
+        'id': 'id',
+        'producto': 'producto__codigo',
+        'tipo_movimiento': 'tipo_movimiento',
+        'cantidad': 'cantidad',
+        'fecha': 'fecha',
+        'usuario': 'usuario__username',
+        'proyecto': 'proyecto',
+        'observaciones': 'observaciones',
+        'origen': 'ubicacion_origen__nombre',
+        'destino': 'ubicacion_destino__nombre',
+        'lote': 'lote__codigo',
+        'fecha_vencimiento': 'lote__fecha_vencimiento',
+    }
+    orden = ['-fecha', '-id']
+
+    def get(self, request):
+        form = self.filtros(FiltroMovimientosForm)
+        return self.respuesta_condicional(lambda: self.listar(form.filtrar(MovimientoInventario.objects.all())))
+
+    def post(self, request):
+        movimiento = self.registrar(_leer_json(request), request.user)
+        return JsonResponse(self.detalle(MovimientoInventario.objects.filter(pk=movimiento.pk)), status=201)
+
+    def registrar(self, datos, usuario):
+        # Se acepta el producto por codigo, como lo envian los lectores
+        if 'producto' in datos and not isinstance(datos['producto'], int):
+            producto = catalogo.producto_por_codigo(str(datos['producto']))
+            datos['producto'] = producto.pk if producto else None
+        # Y las ubicaciones por nombre, como se muestran en la respuesta
+        nombres = {
+            campo: str(datos.pop(clave))
+            for clave, campo in (('origen', 'ubicacion_origen'), ('destino', 'ubicacion_destino'))
+            if datos.get(clave)
+        }
+        ids = ubicaciones.ids_por_nombre(nombres.values())
+        for campo, nombre in nombres.items():
+            if nombre not in ids:
+                raise ErrorApi(f'No existe la ubicación {nombre}.')
+            datos.setdefault(campo, ids[nombre])
+        form = MovimientoInventarioForm(datos)
+        if not form.is_valid():
+            raise _errores_formulario(form)
+        form.instance.usuario = usuario
+        try:
+            return stock.registrar_movimiento(
+                form.instance, form.cleaned_data['lote'], form.cleaned_data['fecha_vencimiento']
+            )
+        except stock.StockInsuficienteError as exc:
+            raise ErrorApi(str(exc), status=409)
+
+
+class PreciosApiView(ApiView):
+    campos = {
+        'id': 'id',
+        'precio': 'precio',
+        'fecha_compra': 'fecha_compra',
+    }
+    orden = ['-fecha_compra', '-id']
+
+    def get(self, request, codigo):
+        producto = catalogo.producto_o_404(codigo)
+        return self.respuesta_condicional(lambda: self.listar(PrecioCompra.objects.filter(producto=producto)))
+
+    def post(self, request, codigo):
+        precio = self.guardar(codigo, _leer_json(request))
+        return JsonResponse(self.detalle(PrecioCompra.objects.filter(pk=precio.pk)), status=201)
+
+    def guardar(self, codigo, datos):
+        producto = catalogo.producto_o_404(codigo)
+        form = PrecioCompraForm({**datos, 'producto': producto.pk})
+        if not form.is_valid():
+            raise _errores_formulario(form)
+        return form.save()
+
+
+class LotesApiMixin:
+    campos = {
+        'id': 'id',
+        'codigo': 'codigo',
+        'cantidad': 'cantidad',
+        'cantidad_inicial': 'cantidad_inicial',
+        'fecha_vencimiento': 'fecha_vencimiento',
+        'creado': 'creado',
+    }
+
+
+class LotesApiView(LotesApiMixin, ApiView):
+    def get(self, request, codigo):
+        producto = catalogo.producto_o_404(codigo)
+        return self.respuesta_condicional(lambda: self.listar(lotes.lotes_de(producto)))
+
+
+class LoteApiView(LotesApiMixin, ApiView):
+    """``PATCH`` con ``fecha_vencimiento`` corrige el vencimiento de un lote ya creado."""
+
+    def get(self, request, codigo, pk):
+        producto = catalogo.producto_o_404(codigo)
+        return self.respuesta_condicional(lambda: self.detalle(Lote.objects.filter(producto=producto, pk=pk)))
+
+    def patch(self, request, codigo, pk):
+        lote = self.corregir(codigo, pk, _leer_json(request))
+        return JsonResponse(self.detalle(Lote.objects.filter(pk=lote.pk)))
+
+    def corregir(self, codigo, pk, datos):
+        producto = catalogo.producto_o_404(codigo)
+        lote = Lote.objects.filter(producto=producto, pk=pk).first()
+        if lote is None:
+            raise Http404('No existe el lote.')
+        # Un JSON sin la fecha no debe borrarla
+        if 'fecha_vencimiento' not in datos:
+            raise ErrorApi('Datos inválidos.', errores={
+                'fecha_vencimiento': [{'message': 'Este campo es obligatorio.', 'code': 'required'}]
+            })
+        form = LoteForm(datos, instance=lote)
+        if not form.is_valid():
+            raise _errores_formulario(form)
+        return lotes.corregir_vencimiento(lote, form.cleaned_data['fecha_vencimiento'])
+
+
+class CategoriasApiView(ApiView):
+    grupos_escritura = ['Administrador']
+    campos = {
+        'id': 'id',
+        'nombre': 'nombre',
+    }
+    orden = ['nombre', 'id']
+
+    def get(self, request):
+        return self.respuesta_condicional(lambda: self.listar(Categoria.objects.all()))
+
+    def post(self, request):
+        nombre = str(_leer_json(request).get('nombre', '')).strip()
+        if not nombre:
+            raise ErrorApi('Datos inválidos.', errores={'nombre': [{'message': 'Este campo es obligatorio.', 'code': 'required'}]})
+        categoria, creada = Categoria.objects.get_or_create(nombre=nombre)
+        return JsonResponse(self.detalle(Categoria.objects.filter(pk=categoria.pk)), status=201 if creada else 200)
+
+
+class SincronizacionApiView(ApiView):
+    """Cambios posteriores a ``?since=<seq>`` para los dispositivos sin conexion (ver cambios.py).
+
+    Cada objeto aparece una vez con su estado actual; los borrados van en
+    ``eliminados``. El dispositivo guarda ``hasta`` y vuelve a pedir mientras
+    ``mas`` sea verdadero. Con ``since=0`` se descarga el catalogo completo.
+    """
+    modelos = {
+        cambios.PRODUCTO: ('productos', Producto, ProductoApiMixin.campos),
+        cambios.CATEGORIA: ('categorias', Categoria, CategoriasApiView.campos),
+        cambios.MOVIMIENTO: ('movimientos', MovimientoInventario, MovimientosApiView.campos),
+    }
+
+    def get(self, request):
+        try:
+            desde = int(request.GET.get('since', 0))
+            limite = min(int(request.GET.get('limite', TAMANO_PAGINA * 10)), TAMANO_MAXIMO * 10)
+        except ValueError:
+            raise ErrorApi('since y limite deben ser números enteros.')
+        filas, hay_mas = cambios.pendientes(desde, max(limite, 1))
+
+        vigentes = {modelo: [] for modelo in self.modelos}
+        eliminados = {clave: [] for clave, _, _ in self.modelos.values()}
+        for _, modelo, objeto_id, eliminado, _ in filas:
+            if eliminado:
+                eliminados[self.modelos[modelo][0]].append(objeto_id)
+            else:
+                vigentes[modelo].append(objeto_id)
+
+        respuesta = {
+            'since': desde,
+            'hasta': filas[-1][0] if filas else desde,
+            'mas': hay_mas,
+        }
+        for modelo, ids in vigentes.items():
+            clave, model, campos = self.modelos[modelo]
+            # limite no supera TAMANO_MAXIMO * 10, asi los ids caben en un solo IN
+            datos = _serializar(model.objects.filter(pk__in=ids).values(*campos.values()), campos) if ids else []
+            if modelo == cambios.PRODUCTO and datos:
+                categorias = _categorias_por_producto([fila['id'] for fila in datos])
+                for fila in datos:
+                    fila['categorias'] = categorias[fila['id']]
+            # Un objeto borrado despues de leer los cambios se informa como eliminado
+            encontrados = {fila['id'] for fila in datos}
+            eliminados[clave] += [pk for pk in ids if pk not in encontrados]
+            respuesta[clave] = datos
+        respuesta['eliminados'] = eliminados
+        return JsonResponse(respuesta)
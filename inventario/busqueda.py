@@ -0,0 +1,195 @@
+"""Indice de texto completo para buscar productos por codigo, nombre y descripcion.
+
+En SQLite se usa una tabla virtual FTS5 que se mantiene con las señales de
+``Producto``; en PostgreSQL un indice GIN sobre ``to_tsvector`` que la base
+mantiene sola. Otros motores usan ``icontains`` como respaldo.
+
+El filtro por nombre del listado de productos (``filtrar_nombre``) usa el
+mismo indice: en SQLite busca palabras que empiezan con lo escrito; en
+PostgreSQL el texto pasa por ``plainto_tsquery``, que acepta cualquier
+entrada y compara palabras reducidas a su raiz.
+
+Las lecturas usan la base que el router asigna a ``Producto`` para leer y
+los cambios del indice la de escritura.
+"""
+import re
+
+from django.db import DatabaseError, connections, router, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Producto
+
+TABLA_FTS = 'inventario_producto_fts'
+INDICE_GIN = 'inventario_producto_busqueda_gin'
+CONFIG_PG = 'spanish'
+VECTOR_PG = (
+    f"to_tsvector('{CONFIG_PG}', coalesce(codigo, '') || ' ' || "
+    "coalesce(nombre, '') || ' ' || coalesce(descripcion, ''))"
+)
+CAMPOS_RESULTADO = ('id', 'codigo', 'nombre', 'cantidad', 'ubicacion')
+
+
+def _terminos(texto):
+    return re.findall(r'\w+', texto or '')[:8]
+
+
+def _conexion(escritura=False):
+    if escritura:
+        return connections[router.db_for_write(Producto)]
+    return connections[router.db_for_read(Producto)]
+
+
+def crear_indice(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else _conexion(escritura=True)
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5("
+                "codigo, nombre, descripcion, "
+                "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+        elif conn.vendor == 'postgresql':
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {INDICE_GIN} "
+                f"ON inventario_producto USING GIN ({VECTOR_PG})"
+            )
+
+
+def eliminar_indice(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else _conexion(escritura=True)
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLA_FTS}")
+        elif conn.vendor == 'postgresql':
+            cursor.execute(f"DROP INDEX IF EXISTS {INDICE_GIN}")
+
+
+def reconstruir():
+    """Vuelve a llenar la tabla FTS desde ``Producto``. Devuelve las filas indexadas."""
+    conn = _conexion(escritura=True)
+    if conn.vendor != 'sqlite':
+        return Producto.objects.count()
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_FTS}")
+        cursor.execute(
+            f"INSERT INTO {TABLA_FTS}(rowid, codigo, nombre, descripcion) "
+            "SELECT id, codigo, nombre, descripcion FROM inventario_producto"
+        )
+        return cursor.rowcount
+
+
+def indexar_producto(producto, using=None):
+    conn = connections[using] if using else _conexion(escritura=True)
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid = %s", [producto.pk])
+        cursor.execute(
+            f"INSERT INTO {TABLA_FTS}(rowid, codigo, nombre, descripcion) VALUES (%s, %s, %s, %s)",
+            [producto.pk, producto.codigo, producto.nombre, producto.descripcion],
+        )
+
+
+def indexar_ids(ids):
+    """Reindexa un grupo de productos, para cargas masivas que no emiten señales."""
+    conn = _conexion(escritura=True)
+    if conn.vendor != 'sqlite' or not ids:
+        return
+    marcadores = ', '.join(['%s'] * len(ids))
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid IN ({marcadores})", list(ids))
+        cursor.execute(
+            f"INSERT INTO {TABLA_FTS}(rowid, codigo, nombre, descripcion) "
+            f"SELECT id, codigo, nombre, descripcion FROM inventario_producto WHERE id IN ({marcadores})",
+            list(ids),
+        )
+
+
+def desindexar_producto(pk, using=None):
+    conn = connections[using] if using else _conexion(escritura=True)
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid = %s", [pk])
+
+
+def _ids_sqlite(conn, terminos, limite):
+    consulta = ' AND '.join('"%s"*' % t for t in terminos)
+    with conn.cursor() as cursor:
+        # bm25 da mas peso a coincidencias en codigo y nombre que en descripcion
+        cursor.execute(
+            f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s "
+            f"ORDER BY bm25({TABLA_FTS}, 10.0, 5.0, 1.0) LIMIT %s",
+            [consulta, limite],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def _ids_postgresql(conn, terminos, limite):
+    consulta = ' '.join(terminos)
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT id FROM inventario_producto "
+            f"WHERE {VECTOR_PG} @@ plainto_tsquery('{CONFIG_PG}', %s) "
+            f"ORDER BY ts_rank({VECTOR_PG}, plainto_tsquery('{CONFIG_PG}', %s)) DESC LIMIT %s",
+            [consulta, consulta, limite],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def filtrar_nombre(productos, texto):
+    """Filtra ``productos`` a los que tienen en el nombre palabras que empiezan con cada termino.
+
+    Usa el indice de texto completo de la base del queryset en vez de
+    ``nombre__icontains``, que recorre toda la tabla. El orden del queryset
+    no cambia. En PostgreSQL compara palabras completas (ver el encabezado).
+    """
+    terminos = _terminos(texto)
+    if not terminos:
+        return productos
+    vendor = connections[productos.db].vendor
+    if vendor == 'sqlite':
+        consulta = ' AND '.join('nombre : "%s"*' % t for t in terminos)
+        return productos.filter(pk__in=RawSQL(f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s", [consulta]))
+    if vendor == 'postgresql':
+        consulta = ' '.join(terminos)
+        # El indice GIN cubre codigo, nombre y descripcion; luego se revisa solo el nombre
+        return productos.filter(pk__in=RawSQL(
+            f"SELECT id FROM inventario_producto WHERE {VECTOR_PG} @@ plainto_tsquery('{CONFIG_PG}', %s) "
+            f"AND to_tsvector('{CONFIG_PG}', nombre) @@ plainto_tsquery('{CONFIG_PG}', %s)",
+            [consulta, consulta],
+        ))
+    for termino in terminos:
+        productos = productos.filter(nombre__icontains=termino)
+    return productos
+
+
+def buscar(texto, limite=10):
+    """Productos que coinciden con ``texto`` ordenados por relevancia, como dicts."""
+    terminos = _terminos(texto)
+    if not terminos:
+        return []
+
+    ids = None
+    conn = _conexion()
+    try:
+        if conn.vendor == 'sqlite':
+            ids = _ids_sqlite(conn, terminos, limite)
+        elif conn.vendor == 'postgresql':
+            # Un error aborta la transaccion abierta en PostgreSQL; el savepoint la deja usable
+            with transaction.atomic(using=conn.alias):
+                ids = _ids_postgresql(conn, terminos, limite)
+    except DatabaseError:
+        # Sin FTS5 compilado en SQLite o sin el indice en PostgreSQL
+        # (ProgrammingError): se cae a la busqueda simple
+        ids = None
+
+    if ids is None:
+        productos = Producto.objects.all()
+        for termino in terminos:
+            productos = productos.filter(Q(nombre__icontains=termino) | Q(codigo__istartswith=termino))
+        return list(productos.order_by('codigo').values(*CAMPOS_RESULTADO)[:limite])
+
+    por_id = {p['id']: p for p in Producto.objects.filter(pk__in=ids).values(*CAMPOS_RESULTADO)}
+    return [por_id[pk] for pk in ids if pk in por_id]
@@ -0,0 +1,56 @@
+"""Utilidades sobre el framework de cache de Django para la app inventario.
+
+Las claves llevan un numero de version por espacio de nombres; invalidar un
+espacio completo es solo incrementar su version, sin buscar ni borrar claves.
+``leer`` implementa la lectura con cache (read-through) y cuenta aciertos y
+fallos por espacio en ``metricas.registro``.
+"""
+from django.core.cache import cache
+
+from .metricas import registro
+
+PREFIJO = 'inventario'
+_FALTA = object()
+
+
+def _clave_version(espacio):
+    return f'{PREFIJO}:version:{espacio}'
+
+
+def version(espacio):
+    return cache.get_or_set(_clave_version(espacio), 1, None)
+
+
+def invalidar(espacio):
+    """Deja obsoletas todas las claves del espacio de nombres."""
+    try:
+        cache.incr(_clave_version(espacio))
+    except ValueError:
+        cache.set(_clave_version(espacio), 2, None)
+
+
+def clave(espacio, *partes):
+    partes = ':'.join(str(p) for p in partes)
+    return f'{PREFIJO}:{espacio}:v{version(espacio)}:{partes}'
+
+
+def leer(espacio, partes, calcular, segundos=None):
+    """Devuelve el valor cacheado o lo obtiene con ``calcular()`` y lo guarda.
+
+    ``partes`` completa la clave dentro del espacio; ``None`` como valor
+    calculado tambien se guarda, asi una busqueda sin resultado no vuelve a
+    consultar la base hasta la proxima invalidacion.
+    """
+    k = clave(espacio, *partes)
+    valor = cache.get(k, _FALTA)
+    if valor is not _FALTA:
+        registro.contar_cache(espacio, True)
+        return valor
+    registro.contar_cache(espacio, False)
+    valor = calcular()
+    cache.set(k, valor, segundos)
+    return valor
+
+
+def borrar(espacio, *partes):
+    cache.delete(clave(espacio, *partes))
@@ -0,0 +1,89 @@
+"""Registro de cambios para la sincronizacion incremental de los dispositivos.
+
+Cada producto, categoria o movimiento tiene a lo sumo una fila en ``Cambio``
+con el numero de secuencia (``seq``) de su ultima modificacion; al cambiar
+otra vez se borra esa fila y se inserta una nueva con un ``seq`` mayor. Asi
+un dispositivo que pide ``seq > N`` recibe cada objeto una sola vez, con su
+estado actual, sin importar cuantas veces cambio mientras estuvo sin red.
+Los borrados quedan como filas con ``eliminado=True`` (lapidas).
+
+Si dos transacciones registran el mismo objeto a la vez, la segunda
+reintenta y se queda con la fila, con un ``seq`` mayor que el de la primera.
+
+Los cambios se registran en la misma transaccion que el dato: las señales
+cubren los ``save()``/``delete()`` y los caminos masivos (importaciones,
+pronosticos, seed_inventario) llaman a ``registrar`` directamente.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Cambio
+
+PRODUCTO = 'producto'
+CATEGORIA = 'categoria'
+MOVIMIENTO = 'movimiento'
+TAMANO_LOTE = 5000
+REINTENTOS = 5
+
+
+def registrar(cambios, eliminado=False):
+    """Registra como modificados los objetos de ``cambios`` ({modelo: ids})."""
+    cambios = {modelo: sorted(set(ids)) for modelo, ids in cambios.items() if ids}
+    if not cambios:
+        return
+    ahora = timezone.now()
+    for intento in range(REINTENTOS):
+        try:
+            with transaction.atomic():
+                _reemplazar(cambios, eliminado, ahora)
+            return
+        except IntegrityError:
+            # Otra transaccion registro alguno de estos objetos entre el DELETE y
+            # el INSERT (con PostgreSQL el INSERT espera a que confirme). Su fila
+            # lleva un seq anterior a este cambio: se vuelve a borrar y se inserta
+            # con uno nuevo, para que los dispositivos que ya la leyeron vean este
+            if intento == REINTENTOS - 1:
+                raise
+
+
+def _reemplazar(cambios, eliminado, ahora):
+    for modelo, ids in cambios.items():
+        for i in range(0, len(ids), TAMANO_LOTE):
+            Cambio.objects.filter(modelo=modelo, objeto_id__in=ids[i:i + TAMANO_LOTE]).delete()
+    Cambio.objects.bulk_create(
+        [
+            Cambio(modelo=modelo, objeto_id=pk, eliminado=eliminado, registrado=ahora)
+            for modelo, ids in cambios.items()
+            for pk in ids
+        ],
+        batch_size=TAMANO_LOTE,
+    )
+
+
+def registrar_productos(ids):
+    registrar({PRODUCTO: ids})
+
+
+def pendientes(desde, limite):
+    """Cambios con ``seq > desde`` en orden. Devuelve (cambios, hay_mas).
+
+    Con PostgreSQL una transaccion puede confirmar despues que otra que tomo
+    un ``seq`` mayor. Para no saltarse su cambio, se corta en la primera fila
+    registrada hace menos de ``INVENTARIO_SYNC_MARGEN_SEGUNDOS``: esas filas
+    se entregan en la siguiente sincronizacion.
+    """
+    margen = getattr(settings, 'INVENTARIO_SYNC_MARGEN_SEGUNDOS', 2)
+    corte = timezone.now() - datetime.timedelta(seconds=margen)
+    filas = list(
+        Cambio.objects.filter(seq__gt=desde).order_by('seq')
+        .values_list('seq', 'modelo', 'objeto_id', 'eliminado', 'registrado')[:limite + 1]
+    )
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+    for i, fila in enumerate(filas):
+        if fila[4] > corte:
+            return filas[:i], False
+    return filas, hay_mas
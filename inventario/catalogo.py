@@ -0,0 +1,108 @@
+"""Lecturas frecuentes del catalogo servidas desde el cache.
+
+Categorias (para los formularios) y productos buscados por codigo o id pasan
+por ``cache.leer``. Las señales de ``Producto``, ``Categoria`` y
+``MovimientoInventario`` borran las entradas afectadas; las operaciones que
+actualizan productos con ``UPDATE`` sin señales (stock, cargas masivas,
+precios) llaman a ``invalidar_producto`` o ``invalidar_productos``.
+
+Lo que se guarda en el cache se lee siempre del primario: un valor leido de
+una replica atrasada quedaria en el cache despues de la invalidacion.
+
+Los productos incluyen su stock, y la invalidacion solo llega al cache del
+proceso que escribio. Por eso ``INVENTARIO_CACHE_CATALOGO_SEGUNDOS`` vale 0
+(sin cache, se lee la base en cada peticion) salvo que el cache sea
+compartido entre procesos (ver maestranza/settings.py).
+
+Las listas de opciones de los formularios (categorias y ubicaciones) se
+guardan siempre, por ``INVENTARIO_CACHE_OPCIONES_SEGUNDOS``: cambian poco y
+en otro proceso una opcion nueva solo tarda en aparecer hasta que vence la
+entrada. La validacion de los formularios sigue consultando la base.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
+
+from . import cache
+from .models import Categoria, Producto, Ubicacion
+from .routers import ALIAS_PRIMARIO
+
+
+def _segundos():
+    return getattr(settings, 'INVENTARIO_CACHE_CATALOGO_SEGUNDOS', 0)
+
+
+def _segundos_opciones():
+    return getattr(settings, 'INVENTARIO_CACHE_OPCIONES_SEGUNDOS', 60)
+
+
+def categorias():
+    return cache.leer(
+        'categorias', ('lista',),
+        lambda: list(Categoria.objects.using(ALIAS_PRIMARIO).order_by('nombre')), _segundos_opciones(),
+    )
+
+
+def opciones_categorias():
+    """Lista (pk, nombre) para asignar a ``field.choices`` sin consultar la base al renderizar."""
+    return [(c.pk, str(c)) for c in categorias()]
+
+
+def opciones_ubicaciones():
+    """Lista (pk, nombre) de las ubicaciones, como ``opciones_categorias``."""
+    return cache.leer(
+        'ubicaciones', ('opciones',),
+        lambda: list(Ubicacion.objects.using(ALIAS_PRIMARIO).order_by('nombre').values_list('pk', 'nombre')),
+        _segundos_opciones(),
+    )
+
+
+def producto_por_pk(pk):
+    if not _segundos():
+        return Producto.objects.filter(pk=pk).first()
+    return cache.leer('productos', ('pk', pk), lambda: Producto.objects.using(ALIAS_PRIMARIO).filter(pk=pk).first(), _segundos())
+
+
+def producto_por_codigo(codigo):
+    if not _segundos():
+        return Producto.objects.filter(codigo=codigo).first()
+    pk = cache.leer(
+        'productos', ('codigo', codigo),
+        lambda: Producto.objects.using(ALIAS_PRIMARIO).filter(codigo=codigo).values_list('pk', flat=True).first(),
+        _segundos(),
+    )
+    if pk is None:
+        return None
+    producto = producto_por_pk(pk)
+    if producto is None or producto.codigo != codigo:
+        # El codigo cambio desde que se guardo la entrada
+        return Producto.objects.filter(codigo=codigo).first()
+    return producto
+
+
+def producto_o_404(codigo):
+    producto = producto_por_codigo(codigo)
+    if producto is None:
+        raise Http404("Producto no encontrado.")
+    return producto
+
+
+def invalidar_producto(pk, codigo=None):
+    """Borra las entradas de un producto al confirmar la transaccion en curso."""
+    def borrar():
+        cache.borrar('productos', 'pk', pk)
+        if codigo is not None:
+            cache.borrar('productos', 'codigo', codigo)
+    transaction.on_commit(borrar)
+
+
+def invalidar_productos():
+    transaction.on_commit(lambda: cache.invalidar('productos'))
+
+
+def invalidar_categorias():
+    transaction.on_commit(lambda: cache.invalidar('categorias'))
+
+
+def invalidar_ubicaciones():
+    transaction.on_commit(lambda: cache.invalidar('ubicaciones'))
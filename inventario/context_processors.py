@@ -0,0 +1,18 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import alertas
+from .roles import tiene_alguno
+
+GRUPOS_ALERTAS = ['Administrador', 'Gestor de Inventario', 'Encargado de Logística']
+
+
+def alertas_inventario(request):
+    """Conteos de alertas para el navbar; solo se calculan si la plantilla los usa."""
+    user = getattr(request, 'user', None)
+    if not user or not user.is_authenticated:
+        return {}
+    return {
+        'alertas_inventario': SimpleLazyObject(
+            lambda: alertas.conteos() if tiene_alguno(user, GRUPOS_ALERTAS) else {}
+        ),
+    }
@@ -1,4 +1,8 @@
+from asgiref.sync import sync_to_async
 from django.contrib.auth.mixins import UserPassesTestMixin
+from django.views import View
+
+from .roles import tiene_alguno
 
 class GroupRequiredMixin(UserPassesTestMixin):
     group_required = []  
@@ -6,5 +10,23 @@ class GroupRequiredMixin(UserPassesTestMixin):
     def test_func(self):
         user = self.request.user
         return user.is_authenticated and (
-            user.groups.filter(name__in=self.group_required).exists() or user.is_superuser
+            user.is_superuser or tiene_alguno(user, self.group_required)
         )
+
+
+class AsyncAccesoMixin:
+    """Revisa el acceso de LoginRequiredMixin y GroupRequiredMixin en un ``dispatch`` async.
+
+    Se antepone a la vista sincronica para servirla con ASGI (ver vistas_async.py).
+    El usuario se carga con ``request.auser()`` y queda en ``request.user``
+    para que la plantilla y el codigo sincronico no lo vuelvan a consultar.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        permitido = request.user.is_authenticated
+        if permitido and hasattr(self, 'test_func'):
+            permitido = await sync_to_async(self.test_func)()
+        if not permitido:
+            return self.handle_no_permission()
+        return await View.dispatch(self, request, *args, **kwargs)
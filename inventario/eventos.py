@@ -0,0 +1,219 @@
+"""Eventos en vivo de stock, alertas y movimientos para los tableros abiertos.
+
+Un solo ``Publicador`` por proceso reparte cada evento a todas las
+conexiones SSE (ver ``EventosView``): con N tableros abiertos el costo es
+una lectura de la base por cambio y N escrituras en colas en memoria, en vez
+de N consultas de los listados cada pocos segundos.
+
+De donde salen los eventos lo decide ``INVENTARIO_EVENTOS_BACKEND``:
+
+* ``BackendMemoria`` (por defecto) publica desde las señales, al confirmar
+  la transaccion. Solo llega a los tableros conectados al mismo proceso.
+* ``BackendCambios`` sirve con varios procesos o servidores: un hilo por
+  proceso lee el registro de cambios (cambios.py) cada
+  ``INVENTARIO_EVENTOS_INTERVALO`` segundos, mientras haya tableros conectados.
+
+Las conexiones SSE solo se sirven con ASGI (maestranza/asgi.py). Con WSGI
+Django no envia nada del flujo hasta que termina y cada tablero ocuparia un
+worker, asi que las paginas no abren el EventSource (ver ``en_vivo``).
+"""
+import asyncio
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+
+from . import alertas, cambios
+from .models import Cambio, MovimientoInventario, Producto
+
+logger = logging.getLogger(__name__)
+
+TAMANO_COLA = 200
+# Con mas objetos afectados se envia un solo evento "recargar"
+MAX_OBJETOS_EVENTO = 200
+
+
+def en_vivo(request):
+    """True si la peticion llega por ASGI, el unico servidor que puede enviar el flujo."""
+    return isinstance(request, ASGIRequest)
+
+
+def _fecha_iso(valor):
+    return valor.isoformat() if valor else None
+
+
+def eventos_productos(ids):
+    """Eventos ``stock`` y, si corresponde, ``alerta`` para los productos ``ids``."""
+    ids = list(ids)
+    if len(ids) > MAX_OBJETOS_EVENTO:
+        return [('recargar', {})]
+    limite_vencimiento = alertas.fecha_limite_vencimiento()
+    eventos = []
+    filas = Producto.objects.filter(pk__in=ids).values(
+        'id', 'codigo', 'nombre', 'cantidad', 'umbral_stock_bajo', 'en_alerta', 'fecha_vencimiento'
+    )
+    for fila in filas:
+        por_vencer = fila['fecha_vencimiento'] is not None and fila['fecha_vencimiento'] <= limite_vencimiento
+        fila['fecha_vencimiento'] = _fecha_iso(fila['fecha_vencimiento'])
+        eventos.append(('stock', fila))
+        if fila['en_alerta']:
+            eventos.append(('alerta', dict(fila, tipo='stock_bajo')))
+        if por_vencer:
+            eventos.append(('alerta', dict(fila, tipo='vencimiento')))
+    return eventos
+
+
+def eventos_movimientos(ids):
+    ids = list(ids)
+    if len(ids) > MAX_OBJETOS_EVENTO:
+        return [('recargar', {})]
+    filas = MovimientoInventario.objects.filter(pk__in=ids).order_by('fecha', 'id').values(
+        'id', 'producto_id', 'producto__codigo', 'producto__nombre', 'tipo_movimiento', 'cantidad',
+        'proyecto', 'usuario__username', 'fecha',
+    )
+    return [('movimiento', dict(fila, fecha=_fecha_iso(fila['fecha']))) for fila in filas]
+
+
+class Suscripcion:
+    """Cola de eventos de una conexion, atada al event loop que la atiende."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.cola = asyncio.Queue(maxsize=TAMANO_COLA)
+
+    def entregar(self, evento):
+        # Corre en el loop de la suscripcion
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # El cliente no alcanza a leer: se descarta lo pendiente y se le pide recargar
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait(('recargar', {}))
+
+    async def siguiente(self, espera):
+        return await asyncio.wait_for(self.cola.get(), espera)
+
+
+class Publicador:
+    def __init__(self):
+        self._suscripciones = set()
+        self._candado = threading.Lock()
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            ruta = getattr(settings, 'INVENTARIO_EVENTOS_BACKEND', 'inventario.eventos.BackendMemoria')
+            self._backend = import_string(ruta)(self)
+        return self._backend
+
+    def suscribir(self):
+        suscripcion = Suscripcion(asyncio.get_running_loop())
+        with self._candado:
+            self._suscripciones.add(suscripcion)
+        self.backend.suscrito()
+        return suscripcion
+
+    def desuscribir(self, suscripcion):
+        with self._candado:
+            self._suscripciones.discard(suscripcion)
+
+    def hay_suscriptores(self):
+        return bool(self._suscripciones)
+
+    def difundir(self, eventos):
+        """Entrega ``eventos`` a todas las suscripciones. Se puede llamar desde cualquier hilo."""
+        if not eventos:
+            return
+        with self._candado:
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            for evento in eventos:
+                try:
+                    suscripcion.loop.call_soon_threadsafe(suscripcion.entregar, evento)
+                except RuntimeError:
+                    # El loop ya se cerro: la conexion termino sin desuscribirse
+                    self.desuscribir(suscripcion)
+                    break
+
+
+class BackendMemoria:
+    """Publica al confirmar cada transaccion, solo en el proceso que escribio."""
+
+    def __init__(self, publicador):
+        self.publicador = publicador
+
+    def suscrito(self):
+        pass
+
+    def publicar(self, productos=(), movimientos=()):
+        if not self.publicador.hay_suscriptores():
+            return
+        productos = list(productos)
+        movimientos = list(movimientos)
+
+        def enviar():
+            self.publicador.difundir(eventos_movimientos(movimientos) + eventos_productos(productos))
+        transaction.on_commit(enviar)
+
+
+class BackendCambios:
+    """Lee el registro de cambios en un hilo por proceso; sirve con varios procesos."""
+
+    def __init__(self, publicador):
+        self.publicador = publicador
+        self.intervalo = getattr(settings, 'INVENTARIO_EVENTOS_INTERVALO', 1)
+        self._hilo = None
+        self._candado = threading.Lock()
+
+    def publicar(self, productos=(), movimientos=()):
+        # Los cambios ya quedan en Cambio dentro de la misma transaccion
+        pass
+
+    def suscrito(self):
+        with self._candado:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._leer_cambios, name='inventario-eventos', daemon=True)
+                self._hilo.start()
+
+    def _leer_cambios(self):
+        desde = None
+        while True:
+            time.sleep(self.intervalo)
+            if not self.publicador.hay_suscriptores():
+                desde = None
+                continue
+            close_old_connections()
+            try:
+                if desde is None:
+                    # Solo interesan los cambios posteriores a la primera conexion
+                    desde = Cambio.objects.order_by('-seq').values_list('seq', flat=True).first() or 0
+                    continue
+                filas, _ = cambios.pendientes(desde, MAX_OBJETOS_EVENTO * 10)
+                if not filas:
+                    continue
+                desde = filas[-1][0]
+                ids = {cambios.PRODUCTO: [], cambios.MOVIMIENTO: []}
+                for _, modelo, objeto_id, eliminado, _ in filas:
+                    if not eliminado and modelo in ids:
+                        ids[modelo].append(objeto_id)
+                self.publicador.difundir(
+                    eventos_movimientos(ids[cambios.MOVIMIENTO]) + eventos_productos(ids[cambios.PRODUCTO])
+                )
+            except Exception:
+                # Un error de la base no debe matar el hilo; se reintenta en el siguiente ciclo
+                logger.exception('Error leyendo el registro de cambios')
+            finally:
+                close_old_connections()
+
+
+publicador = Publicador()
+
+
+def publicar(productos=(), movimientos=()):
+    publicador.backend.publicar(productos=productos, movimientos=movimientos)
@@ -1,10 +1,36 @@
+import datetime
+
 from django import forms
-from .models import Producto,Categoria, PrecioCompra
+from django.conf import settings
+from django.utils import timezone
+from django.db.models import Value
+from django.db.models.functions import Concat, Upper
+from .models import Producto,Categoria, PrecioCompra, MovimientoInventario, Ubicacion, Lote
+from . import busqueda, catalogo
+from django.urls import reverse_lazy
 from django.contrib.auth.models import User,Group
 from django.contrib.auth.forms import UserCreationForm
 
 
-class ProductoForm(forms.ModelForm):
+class CategoriasEnCacheMixin:
+    """Toma las opciones de categoria del cache para renderizar sin consultar la base.
+
+    La validacion sigue usando el queryset del campo.
+    """
+    campos_categoria = ('categorias',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        opciones = catalogo.opciones_categorias()
+        for nombre in self.campos_categoria:
+            campo = self.fields[nombre]
+            if getattr(campo, 'empty_label', None) is not None:
+                campo.choices = [('', campo.empty_label)] + opciones
+            else:
+                campo.choices = opciones
+
+
+class ProductoForm(CategoriasEnCacheMixin, forms.ModelForm):
     categorias = forms.ModelMultipleChoiceField(
         queryset=Categoria.objects.all(),
         required=False,
@@ -14,7 +40,9 @@ class ProductoForm(forms.ModelForm):
 
     fecha_vencimiento = forms.DateField(
         required=False,
-        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+        help_text="Vencimiento del stock inicial del producto. "
+                  "Luego se muestra el vencimiento más próximo de sus lotes."
     )
     nuevas_categorias = forms.CharField(
         required=False,
@@ -34,6 +62,43 @@ class ProductoForm(forms.ModelForm):
             # 'categorias': forms.CheckboxSelectMultiple(),  <-- Ya está definido arriba en el campo explícito
         }
 
+    # Al editar, el stock y su vencimiento solo cambian con movimientos y
+    # lotes: guardar el valor leido con el formulario pisaria los movimientos
+    # registrados mientras tanto (ver Producto.save)
+    campos_stock = {
+        'cantidad': 'La cantidad se modifica con movimientos (entradas, salidas o ajustes).',
+        'fecha_vencimiento': 'El vencimiento se indica en la entrada del stock o se corrige en su lote.',
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            for nombre, mensaje in self.campos_stock.items():
+                self.fields[nombre].disabled = True
+                self.fields[nombre].help_text = mensaje
+
+    def clean(self):
+        datos = super().clean()
+        # Un campo deshabilitado ignora lo enviado: la API debe avisar en vez de descartarlo
+        if self.instance.pk:
+            for nombre, mensaje in self.campos_stock.items():
+                enviado = self.data.get(self.add_prefix(nombre))
+                if enviado is None:
+                    continue
+                try:
+                    distinto = self.fields[nombre].to_python(enviado) != getattr(self.instance, nombre)
+                except forms.ValidationError:
+                    distinto = True
+                if distinto:
+                    self.add_error(nombre, mensaje)
+        return datos
+
+
+class LoteForm(forms.ModelForm):
+    class Meta:
+        model = Lote
+        fields = ['fecha_vencimiento']
+
 
 
 class UserRegisterForm(UserCreationForm):
@@ -66,7 +131,7 @@ class PrecioCompraForm(forms.ModelForm):
         }
 
 
-class ReporteInventarioForm(forms.Form):
+class ReporteInventarioForm(CategoriasEnCacheMixin, forms.Form):
     fecha_inicio = forms.DateField(
         required=False,
         widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
@@ -82,4 +147,252 @@ class ReporteInventarioForm(forms.Form):
         required=False,
         widget=forms.CheckboxSelectMultiple,
         label="Categorías"
-    )
\ No newline at end of file
+    )
+    formato = forms.ChoiceField(
+        choices=[('csv', 'CSV'), ('xlsx', 'Excel (.xlsx)')],
+        initial='csv',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        label="Formato"
+    )
+    segundo_plano = forms.BooleanField(
+        required=False,
+        label="Generar en segundo plano",
+        help_text="Recomendado para reportes grandes: se avisa cuando el archivo esté listo."
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['formato'].help_text = (
+            "El CSV se descarga de inmediato. Un Excel con más de "
+            f"{settings.REPORTES_XLSX_MAXIMO_DIRECTO} productos se genera en segundo plano."
+        )
+
+
+# Mayor que cualquier caracter: texto + FIN_PREFIJO acota los valores que empiezan con texto
+FIN_PREFIJO = '\U0010ffff'
+
+
+class BusquedaProductoForm(CategoriasEnCacheMixin, forms.Form):
+    ORDEN_CHOICES = [
+        ('codigo', 'Código (A-Z)'),
+        ('-codigo', 'Código (Z-A)'),
+        ('nombre', 'Nombre (A-Z)'),
+        ('-nombre', 'Nombre (Z-A)'),
+        ('ubicacion', 'Ubicación'),
+        ('cantidad', 'Cantidad (menor a mayor)'),
+        ('-cantidad', 'Cantidad (mayor a menor)'),
+    ]
+    campos_categoria = ('categoria',)
+
+    codigo = forms.CharField(
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Código'}),
+        label="Código"
+    )
+    nombre = forms.CharField(
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Nombre'}),
+        label="Nombre"
+    )
+    ubicacion = forms.CharField(
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Ubicación'}),
+        label="Ubicación"
+    )
+    categoria = forms.ModelChoiceField(
+        queryset=Categoria.objects.all(),
+        required=False,
+        empty_label="Todas las categorías",
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        label="Categoría"
+    )
+    orden = forms.ChoiceField(
+        choices=ORDEN_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        label="Ordenar por"
+    )
+
+    def filtrar(self, productos):
+        """Aplica los filtros validos del formulario al queryset de productos.
+
+        Los prefijos se buscan como rangos (``>= texto`` y ``< texto + U+10FFFF``),
+        que usan el indice de la columna; ``startswith`` (LIKE) no lo usa en
+        SQLite. El nombre se busca por palabras en el indice de texto completo.
+        """
+        if not self.is_valid():
+            return productos
+        datos = self.cleaned_data
+        if datos['codigo']:
+            productos = productos.filter(codigo__gte=datos['codigo'], codigo__lt=datos['codigo'] + FIN_PREFIJO)
+        if datos['nombre']:
+            productos = busqueda.filtrar_nombre(productos, datos['nombre'])
+        if datos['ubicacion']:
+            # Sin distinguir mayusculas: indice producto_ubicacion_mayus_idx sobre UPPER(ubicacion)
+            prefijo = Upper(Value(datos['ubicacion']))
+            productos = productos.alias(ubicacion_mayus=Upper('ubicacion')).filter(
+                ubicacion_mayus__gte=prefijo, ubicacion_mayus__lt=Concat(prefijo, Value(FIN_PREFIJO)),
+            )
+        if datos['categoria']:
+            productos = productos.filter(categorias=datos['categoria'])
+        return productos
+
+    def orden_keyset(self):
+        orden = 'codigo'
+        if self.is_valid() and self.cleaned_data['orden']:
+            orden = self.cleaned_data['orden']
+        # El id desempata y sigue la misma direccion que el campo principal
+        return [orden, '-id' if orden.startswith('-') else 'id']
+
+
+class ProductoAutocompleteWidget(forms.Widget):
+    """Campo de texto que busca productos en el endpoint de autocompletado.
+
+    Solo guarda el id del producto elegido en un input oculto, asi que el
+    formulario no necesita renderizar un <option> por cada producto.
+    """
+    template_name = 'inventario/widgets/producto_autocomplete.html'
+
+    def __init__(self, attrs=None, url=reverse_lazy('producto-buscar')):
+        super().__init__(attrs)
+        self.url = url
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        etiqueta = ''
+        if value:
+            producto = catalogo.producto_por_pk(value)
+            etiqueta = str(producto) if producto else ''
+        context['widget'].update({'url': str(self.url), 'etiqueta': etiqueta})
+        return context
+
+
+class MovimientoInventarioForm(forms.ModelForm):
+    # Datos del lote que crea una entrada (ver lotes.py)
+    lote = forms.CharField(
+        max_length=50,
+        required=False,
+        help_text="Solo entradas y ajustes de alta. Si se deja vacío se usa uno derivado del movimiento."
+    )
+    fecha_vencimiento = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date'}),
+        help_text="Solo entradas y ajustes de alta: vencimiento del lote."
+    )
+
+    class Meta:
+        model = MovimientoInventario
+        fields = [
+            'producto', 'tipo_movimiento', 'cantidad', 'lote', 'fecha_vencimiento',
+            'ubicacion_origen', 'ubicacion_destino', 'proyecto', 'observaciones',
+        ]
+        widgets = {
+            'producto': ProductoAutocompleteWidget(),
+        }
+        help_texts = {
+            'ubicacion_origen': 'Salidas y transferencias. Si se deja vacío, la ubicación del producto.',
+            'ubicacion_destino': 'Entradas y transferencias. Si se deja vacío, la ubicación del producto.',
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Las opciones salen del cache (ver catalogo.py); la validacion usa el queryset
+        opciones = catalogo.opciones_ubicaciones()
+        for nombre in ('ubicacion_origen', 'ubicacion_destino'):
+            campo = self.fields[nombre]
+            campo.queryset = Ubicacion.objects.order_by('nombre')
+            campo.choices = [('', campo.empty_label)] + opciones
+
+    def clean(self):
+        datos = super().clean()
+        tipo = datos.get('tipo_movimiento')
+        if tipo == 'TRANSFERENCIA':
+            origen, destino = datos.get('ubicacion_origen'), datos.get('ubicacion_destino')
+            if origen is None:
+                self.add_error('ubicacion_origen', 'Indique desde qué ubicación se transfiere.')
+            if destino is None:
+                self.add_error('ubicacion_destino', 'Indique a qué ubicación se transfiere.')
+            if origen is not None and origen == destino:
+                self.add_error('ubicacion_destino', 'El destino debe ser distinto del origen.')
+        return datos
+
+
+class ImportarMovimientosForm(forms.Form):
+    archivo = forms.FileField(
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv'}),
+        label="Archivo CSV",
+        help_text="Columnas: codigo, tipo_movimiento, cantidad, proyecto, observaciones y, opcionales, "
+                  "origen y destino (nombres de ubicación), lote y fecha_vencimiento (entradas)"
+    )
+
+
+class ImportarCatalogoForm(forms.Form):
+    archivo = forms.FileField(
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.xlsx,.csv'}),
+        label="Archivo Excel o CSV",
+        help_text="Columnas: codigo, nombre, descripcion, cantidad, ubicacion, fecha_vencimiento, "
+                  "umbral_stock_bajo, categorias (separadas por coma; solo un administrador puede crear nuevas)"
+    )
+    simular = forms.BooleanField(
+        required=False,
+        initial=True,
+        label="Solo simular (mostrar diferencias sin guardar)"
+    )
+
+
+class FiltroMovimientosForm(forms.Form):
+    producto = forms.CharField(
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Código de producto'}),
+        label="Producto"
+    )
+    tipo_movimiento = forms.ChoiceField(
+        choices=[('', 'Todos los tipos')] + MovimientoInventario.TIPO_MOVIMIENTO_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        label="Tipo"
+    )
+    proyecto = forms.CharField(
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Proyecto'}),
+        label="Proyecto"
+    )
+    usuario = forms.CharField(
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Usuario'}),
+        label="Usuario"
+    )
+    desde = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+        label="Desde"
+    )
+    hasta = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+        label="Hasta"
+    )
+
+    def filtrar(self, movimientos):
+        """Aplica los filtros validos del formulario al queryset de movimientos."""
+        if not self.is_valid():
+            return movimientos
+        datos = self.cleaned_data
+        if datos['producto']:
+            movimientos = movimientos.filter(producto__codigo=datos['producto'])
+        if datos['tipo_movimiento']:
+            movimientos = movimientos.filter(tipo_movimiento=datos['tipo_movimiento'])
+        if datos['proyecto']:
+            movimientos = movimientos.filter(proyecto=datos['proyecto'])
+        if datos['usuario']:
+            movimientos = movimientos.filter(usuario__username=datos['usuario'])
+        # Rangos sobre la columna (no fecha__date) para que usen el indice
+        if datos['desde']:
+            movimientos = movimientos.filter(fecha__gte=_inicio_dia(datos['desde']))
+        if datos['hasta']:
+            movimientos = movimientos.filter(fecha__lt=_inicio_dia(datos['hasta'] + datetime.timedelta(days=1)))
+        return movimientos
+
+
+def _inicio_dia(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
\ No newline at end of file
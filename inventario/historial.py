@@ -0,0 +1,220 @@
+"""Cierres diarios del historial de movimientos.
+
+``generar_cierres`` procesa solo los dias que aun no estan cerrados y deja:
+
+* ``SnapshotStock``: stock al cierre del dia de cada producto que tuvo
+  movimientos ese dia.
+* ``ResumenMovimientosDiario``: cantidad y numero de movimientos por dia,
+  tipo y proyecto.
+
+Con eso el stock a una fecha es el snapshot mas cercano mas los movimientos
+entre el snapshot y la fecha, y los totales de un periodo salen de sumar
+filas diarias en vez de recorrer toda la tabla de movimientos.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import CierreDiario, MovimientoInventario, ResumenMovimientosDiario, SnapshotStock
+from .stock import cantidad_con_signo
+
+TAMANO_LOTE = 5000
+UN_DIA = datetime.timedelta(days=1)
+
+
+def _inicio_dia(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
+def _neto(movimientos):
+    return movimientos.aggregate(neto=Coalesce(Sum(cantidad_con_signo()), 0))['neto']
+
+
+def ultimo_cierre():
+    return CierreDiario.objects.aggregate(fecha=Max('fecha'))['fecha']
+
+
+def dias_pendientes(hasta=None):
+    """Rango (desde, hasta) de dias por cerrar, o None si no hay ninguno."""
+    ayer = timezone.localdate() - UN_DIA
+    hasta = min(hasta or ayer, ayer)
+    ultimo = ultimo_cierre()
+    if ultimo is not None:
+        desde = ultimo + UN_DIA
+    else:
+        primero = MovimientoInventario.objects.aggregate(fecha=Min('fecha'))['fecha']
+        desde = timezone.localdate(primero) if primero else hasta
+    if desde > hasta:
+        return None
+    return desde, hasta
+
+
+def _snapshots(desde, hasta):
+    # Una sola consulta trae el stock actual junto con los netos diarios desde
+    # ``desde`` hasta hoy, asi ambos salen de la misma lectura consistente.
+    # El cierre de cada dia se reconstruye hacia atras desde el stock actual;
+    # cuadra porque la cantidad de un producto existente solo cambia por
+    # movimientos (los ajustes tambien, ver stock.py).
+    netos = (
+        MovimientoInventario.objects
+        .filter(fecha__gte=_inicio_dia(desde))
+        .annotate(dia=TruncDate('fecha'))
+        .values('producto_id', 'producto__cantidad', 'dia')
+        .annotate(neto=Sum(cantidad_con_signo()))
+        .order_by('producto_id', '-dia')
+    )
+    producto_actual = None
+    posteriores = 0
+    lote = []
+    total = 0
+    for fila in netos.iterator(chunk_size=TAMANO_LOTE):
+        if fila['producto_id'] != producto_actual:
+            producto_actual = fila['producto_id']
+            posteriores = 0
+        if fila['dia'] <= hasta:
+            lote.append(SnapshotStock(
+                producto_id=producto_actual,
+                fecha=fila['dia'],
+                cantidad=fila['producto__cantidad'] - posteriores,
+            ))
+        posteriores += fila['neto']
+        if len(lote) >= TAMANO_LOTE:
+            SnapshotStock.objects.bulk_create(lote)
+            total += len(lote)
+            lote = []
+    SnapshotStock.objects.bulk_create(lote)
+    return total + len(lote)
+
+
+def _resumenes(desde, hasta):
+    filas = (
+        MovimientoInventario.objects
+        .filter(fecha__gte=_inicio_dia(desde), fecha__lt=_inicio_dia(hasta + UN_DIA))
+        .annotate(dia=TruncDate('fecha'))
+        .values('dia', 'tipo_movimiento', 'proyecto')
+        .annotate(total=Sum('cantidad'), conteo=Count('id'))
+        .order_by()
+    )
+    # Sin proyecto y proyecto vacio se guardan juntos como ''
+    acumulado = {}
+    for fila in filas:
+        clave = (fila['dia'], fila['tipo_movimiento'], fila['proyecto'] or '')
+        total, conteo = acumulado.get(clave, (0, 0))
+        acumulado[clave] = (total + fila['total'], conteo + fila['conteo'])
+    ResumenMovimientosDiario.objects.bulk_create(
+        [
+            ResumenMovimientosDiario(fecha=dia, tipo_movimiento=tipo, proyecto=proyecto, cantidad=total, movimientos=conteo)
+            for (dia, tipo, proyecto), (total, conteo) in acumulado.items()
+        ],
+        batch_size=TAMANO_LOTE,
+    )
+    conteos = {}
+    for (dia, _, _), (_, conteo) in acumulado.items():
+        conteos[dia] = conteos.get(dia, 0) + conteo
+    return conteos
+
+
+def generar_cierres(hasta=None):
+    """Cierra los dias pendientes hasta ``hasta`` (por defecto ayer). Devuelve los cierres creados."""
+    rango = dias_pendientes(hasta)
+    if rango is None:
+        return []
+    desde, hasta = rango
+    with transaction.atomic():
+        _snapshots(desde, hasta)
+        conteos = _resumenes(desde, hasta)
+        cierres = []
+        dia = desde
+        while dia <= hasta:
+            cierres.append(CierreDiario(fecha=dia, movimientos=conteos.get(dia, 0)))
+            dia += UN_DIA
+        CierreDiario.objects.bulk_create(cierres, batch_size=TAMANO_LOTE)
+    return cierres
+
+
+def borrar_cierres():
+    """Elimina todos los cierres, para reconstruirlos si se editaron movimientos ya cerrados."""
+    with transaction.atomic():
+        SnapshotStock.objects.all().delete()
+        ResumenMovimientosDiario.objects.all().delete()
+        CierreDiario.objects.all().delete()
+
+
+def stock_en_fecha(producto, fecha):
+    """Stock de ``producto`` al cierre del dia ``fecha``.
+
+    Parte del snapshot mas cercano y solo suma los movimientos entre ese
+    snapshot y la fecha. Sin snapshots se descuentan del stock actual los
+    movimientos posteriores a la fecha.
+    """
+    fin = _inicio_dia(fecha + UN_DIA)
+    movimientos = MovimientoInventario.objects.filter(producto=producto)
+    snapshots = SnapshotStock.objects.filter(producto=producto)
+
+    anterior = snapshots.filter(fecha__lte=fecha).order_by('-fecha').first()
+    if anterior is not None:
+        desde = _inicio_dia(anterior.fecha + UN_DIA)
+        return anterior.cantidad + _neto(movimientos.filter(fecha__gte=desde, fecha__lt=fin))
+
+    siguiente = snapshots.filter(fecha__gt=fecha).order_by('fecha').first()
+    if siguiente is not None:
+        hasta = _inicio_dia(siguiente.fecha + UN_DIA)
+        return siguiente.cantidad - _neto(movimientos.filter(fecha__gte=fin, fecha__lt=hasta))
+
+    return producto.cantidad - _neto(movimientos.filter(fecha__gte=fin))
+
+
+def totales_periodo(desde, hasta, proyecto=None, tipo_movimiento=None):
+    """Cantidad y numero de movimientos por proyecto y tipo entre ``desde`` y ``hasta`` (inclusive).
+
+    Los dias cerrados salen de los resumenes diarios; los que aun no se
+    cierran se agregan directo desde los movimientos.
+    """
+    totales = {}
+
+    def sumar(proyecto_fila, tipo, cantidad, conteo):
+        clave = (proyecto_fila or '', tipo)
+        actual = totales.get(clave, (0, 0))
+        totales[clave] = (actual[0] + cantidad, actual[1] + conteo)
+
+    ultimo = ultimo_cierre()
+    if ultimo is not None and desde <= ultimo:
+        resumenes = ResumenMovimientosDiario.objects.filter(fecha__gte=desde, fecha__lte=min(hasta, ultimo))
+        if proyecto is not None:
+            resumenes = resumenes.filter(proyecto=proyecto)
+        if tipo_movimiento:
+            resumenes = resumenes.filter(tipo_movimiento=tipo_movimiento)
+        filas = (
+            resumenes.values('proyecto', 'tipo_movimiento')
+            .annotate(total=Sum('cantidad'), conteo=Sum('movimientos'))
+            .order_by()
+        )
+        for fila in filas:
+            sumar(fila['proyecto'], fila['tipo_movimiento'], fila['total'], fila['conteo'])
+
+    abiertos = max(desde, ultimo + UN_DIA) if ultimo is not None else desde
+    if abiertos <= hasta:
+        movimientos = MovimientoInventario.objects.filter(
+            fecha__gte=_inicio_dia(abiertos), fecha__lt=_inicio_dia(hasta + UN_DIA),
+        )
+        if proyecto == '':
+            movimientos = movimientos.filter(Q(proyecto='') | Q(proyecto__isnull=True))
+        elif proyecto is not None:
+            movimientos = movimientos.filter(proyecto=proyecto)
+        if tipo_movimiento:
+            movimientos = movimientos.filter(tipo_movimiento=tipo_movimiento)
+        filas = (
+            movimientos.values('proyecto', 'tipo_movimiento')
+            .annotate(total=Sum('cantidad'), conteo=Count('id'))
+            .order_by()
+        )
+        for fila in filas:
+            sumar(fila['proyecto'], fila['tipo_movimiento'], fila['total'], fila['conteo'])
+
+    return [
+        {'proyecto': p, 'tipo_movimiento': t, 'cantidad': cantidad, 'movimientos': conteo}
+        for (p, t), (cantidad, conteo) in sorted(totales.items())
+    ]
@@ -0,0 +1,534 @@
+"""Carga masiva de movimientos y del catalogo de productos desde CSV, JSON o Excel.
+
+Las lineas se validan antes de escribir, los productos se resuelven por
+``codigo`` con una sola consulta por lote y cada lote se guarda en una
+transaccion con inserciones masivas y UPDATEs agregados.
+Las lineas con errores se informan y se omiten sin abortar el archivo.
+"""
+import csv
+import datetime
+import heapq
+import io
+
+import openpyxl
+from django.db import transaction
+from django.db.models import F
+
+from . import alertas, busqueda, cambios, catalogo, eventos, lotes, ubicaciones, valorizacion
+from .models import Categoria, Lote, MovimientoInventario, Producto, StockUbicacion, VersionInventario
+from .stock import SIGNO_MOVIMIENTO, UBICACIONES_MOVIMIENTO, crea_lote
+
+COLUMNAS_MOVIMIENTOS = [
+    'codigo', 'tipo_movimiento', 'cantidad', 'proyecto', 'observaciones',
+    'origen', 'destino', 'lote', 'fecha_vencimiento',
+]
+COLUMNAS_CATALOGO = [
+    'codigo', 'nombre', 'descripcion', 'cantidad', 'ubicacion',
+    'fecha_vencimiento', 'umbral_stock_bajo', 'categorias',
+]
+TAMANO_LOTE = 5000
+# Cantidad maxima de diferencias que se guardan para mostrar en una simulacion
+MAX_CAMBIOS_DETALLE = 1000
+
+
+class ResultadoImportacion:
+    def __init__(self):
+        self.creados = 0
+        self.errores = []
+
+    def error(self, linea, mensaje):
+        self.errores.append({'linea': linea, 'error': mensaje})
+
+    def as_dict(self):
+        return {'creados': self.creados, 'errores': self.errores}
+
+
+def leer_csv(archivo):
+    """Genera (numero_linea, fila) desde un CSV con encabezado (texto, bytes o archivo binario)."""
+    if isinstance(archivo, (bytes, bytearray)):
+        archivo = io.StringIO(archivo.decode('utf-8-sig'))
+    elif isinstance(archivo, io.BufferedIOBase) or hasattr(archivo, 'chunks'):
+        # Archivos subidos (UploadedFile) y archivos abiertos en modo binario
+        archivo = io.TextIOWrapper(getattr(archivo, 'file', archivo), encoding='utf-8-sig', newline='')
+    lector = csv.DictReader(archivo)
+    for fila in lector:
+        yield lector.line_num, fila
+
+
+def leer_xlsx(archivo):
+    """Genera (numero_fila, fila) de la primera hoja, leyendo en modo read_only."""
+    wb = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = wb.worksheets[0].iter_rows(values_only=True)
+        encabezados = [str(c).strip() if c is not None else '' for c in next(filas, [])]
+        for numero, valores in enumerate(filas, start=2):
+            if not any(v is not None and v != '' for v in valores):
+                continue
+            yield numero, dict(zip(encabezados, valores))
+    finally:
+        wb.close()
+
+
+def _validar_movimiento(fila):
+    """Devuelve (datos, None) o (None, mensaje de error)."""
+    if not isinstance(fila, dict):
+        return None, 'Cada movimiento debe ser un objeto con sus campos.'
+    codigo = (fila.get('codigo') or '').strip()
+    tipo = (fila.get('tipo_movimiento') or '').strip().upper()
+    if not codigo:
+        return None, 'Falta el código del producto.'
+    if tipo not in SIGNO_MOVIMIENTO:
+        return None, f'Tipo de movimiento inválido: {tipo or "(vacío)"}.'
+    try:
+        cantidad = int(fila.get('cantidad'))
+    except (TypeError, ValueError):
+        return None, 'La cantidad debe ser un número entero.'
+    if cantidad <= 0:
+        return None, 'La cantidad debe ser mayor que cero.'
+    # Sin origen o destino se usa la ubicacion principal del producto
+    usa_origen, usa_destino = UBICACIONES_MOVIMIENTO[tipo]
+    origen = _texto(fila.get('origen')) if usa_origen else ''
+    destino = _texto(fila.get('destino')) if usa_destino else ''
+    if tipo == 'TRANSFERENCIA':
+        if not origen or not destino:
+            return None, 'Una transferencia requiere origen y destino.'
+        if origen == destino:
+            return None, 'El origen y el destino de una transferencia deben ser distintos.'
+    # El lote solo se indica en las entradas; las salidas consumen en orden de vencimiento
+    lote = _texto(fila.get('lote')) if crea_lote(tipo) else ''
+    if len(lote) > 50:
+        return None, 'lote supera los 50 caracteres.'
+    try:
+        fecha_vencimiento = _fecha(fila.get('fecha_vencimiento')) if crea_lote(tipo) else None
+    except ValueError as exc:
+        return None, str(exc)
+    return {
+        'codigo': codigo,
+        'tipo_movimiento': tipo,
+        'cantidad': cantidad,
+        'proyecto': (fila.get('proyecto') or '').strip() or None,
+        'observaciones': (fila.get('observaciones') or '').strip() or None,
+        'origen': origen or None,
+        'destino': destino or None,
+        'lote': lote or None,
+        'fecha_vencimiento': fecha_vencimiento,
+    }, None
+
+
+def _insertar_movimientos(movimientos, usuario):
+    """Inserta los movimientos con ``bulk_create`` y devuelve sus ids en orden.
+
+    En PostgreSQL y SQLite 3.35+ el INSERT devuelve los ids (RETURNING), asi
+    cada linea queda asociada a su fila sin volver a consultarla.
+    """
+    usuario_id = usuario.pk if usuario else None
+    creados = MovimientoInventario.objects.bulk_create(
+        [
+            MovimientoInventario(
+                producto_id=producto_id, tipo_movimiento=tipo, cantidad=cantidad,
+                proyecto=proyecto, observaciones=observaciones,
+                ubicacion_origen_id=origen, ubicacion_destino_id=destino, usuario_id=usuario_id,
+            )
+            for producto_id, tipo, cantidad, proyecto, observaciones, origen, destino in movimientos
+        ],
+        batch_size=1000,
+    )
+    return [movimiento.pk for movimiento in creados]
+
+
+def _importar_lote(lote, usuario, resultado):
+    validas = []
+    for linea, fila in lote:
+        datos, error = _validar_movimiento(fila)
+        if error:
+            resultado.error(linea, error)
+        else:
+            validas.append((linea, datos))
+    if not validas:
+        return
+
+    with transaction.atomic():
+        codigos = {datos['codigo'] for _, datos in validas}
+        # Una consulta por lote; en PostgreSQL las filas quedan bloqueadas hasta el commit
+        productos = {
+            codigo: [pk, cantidad, ubicacion]
+            for codigo, pk, cantidad, ubicacion in Producto.objects.select_for_update()
+            .filter(codigo__in=codigos).values_list('codigo', 'pk', 'cantidad', 'ubicacion')
+        }
+        principales = ubicaciones.ids_por_nombre(
+            {ubicaciones.nombre_principal(p[2]) for p in productos.values()}, crear=True
+        )
+        # Las ubicaciones indicadas en el archivo deben existir
+        nombradas = ubicaciones.ids_por_nombre(
+            {datos[c] for _, datos in validas for c in ('origen', 'destino') if datos[c]}
+        )
+        # Stock por ubicacion de los productos del lote, bloqueado despues de los productos
+        antes = {
+            (producto_id, ubicacion_id): (pk, cantidad)
+            for pk, producto_id, ubicacion_id, cantidad in StockUbicacion.objects.select_for_update()
+            .filter(producto_id__in=[p[0] for p in productos.values()])
+            .order_by('producto_id', 'ubicacion_id').values_list('pk', 'producto_id', 'ubicacion_id', 'cantidad')
+        }
+        saldos = {par: cantidad for par, (_, cantidad) in antes.items()}
+        # Lotes con stock por producto en orden FEFO: (fecha, 0, id) para los
+        # existentes y (fecha, 1, n) para los que crea el lote, que quedan despues
+        fefo = {}
+        saldo_lote = {}
+        for pk, producto_id, cantidad, fecha_vencimiento in Lote.objects.filter(
+            producto_id__in=[p[0] for p in productos.values()], cantidad__gt=0
+        ).values_list('pk', 'producto_id', 'cantidad', 'fecha_vencimiento'):
+            fefo.setdefault(producto_id, []).append((fecha_vencimiento or datetime.date.max, 0, pk))
+            saldo_lote[0, pk] = cantidad
+        for cola in fefo.values():
+            heapq.heapify(cola)
+        lotes_antes = dict(saldo_lote)
+        entradas = []
+
+        movimientos = []
+        deltas = {}
+        for linea, datos in validas:
+            producto = productos.get(datos['codigo'])
+            if producto is None:
+                resultado.error(linea, f"No existe un producto con código {datos['codigo']}.")
+                continue
+            faltantes = [datos[c] for c in ('origen', 'destino') if datos[c] and datos[c] not in nombradas]
+            if faltantes:
+                resultado.error(linea, f"No existe la ubicación {faltantes[0]}.")
+                continue
+            usa_origen, usa_destino = UBICACIONES_MOVIMIENTO[datos['tipo_movimiento']]
+            principal = principales[ubicaciones.nombre_principal(producto[2])]
+            origen = (nombradas[datos['origen']] if datos['origen'] else principal) if usa_origen else None
+            destino = (nombradas[datos['destino']] if datos['destino'] else principal) if usa_destino else None
+            delta = SIGNO_MOVIMIENTO[datos['tipo_movimiento']] * datos['cantidad']
+            # Saldo corriente: las lineas se aplican en el orden del archivo
+            if producto[1] + delta < 0:
+                resultado.error(linea, f"Cantidad insuficiente en inventario para {datos['codigo']}.")
+                continue
+            if origen is not None and saldos.get((producto[0], origen), 0) < datos['cantidad']:
+                resultado.error(linea, f"Cantidad insuficiente en la ubicación de origen para {datos['codigo']}.")
+                continue
+            producto[1] += delta
+            deltas[producto[0]] = deltas.get(producto[0], 0) + delta
+            if origen is not None:
+                saldos[producto[0], origen] -= datos['cantidad']
+            if destino is not None:
+                saldos[producto[0], destino] = saldos.get((producto[0], destino), 0) + datos['cantidad']
+            if crea_lote(datos['tipo_movimiento']):
+                clave = (1, len(entradas))
+                entradas.append((len(movimientos), datos))
+                saldo_lote[clave] = datos['cantidad']
+                heapq.heappush(fefo.setdefault(producto[0], []), (datos['fecha_vencimiento'] or datetime.date.max, *clave))
+            elif delta < 0:
+                _consumir_fefo(fefo.get(producto[0], []), saldo_lote, -delta)
+            movimientos.append((
+                producto[0], datos['tipo_movimiento'], datos['cantidad'],
+                datos['proyecto'], datos['observaciones'], origen, destino,
+            ))
+
+        if not movimientos:
+            return
+        # Un UPDATE por cada variacion distinta, no uno por producto ni por linea
+        por_delta = {}
+        for pk, delta in deltas.items():
+            if delta:
+                por_delta.setdefault(delta, []).append(pk)
+        for delta, pks in por_delta.items():
+            Producto.objects.filter(pk__in=pks).update(
+                cantidad=F('cantidad') + delta, en_alerta=alertas.en_alerta_tras(delta)
+            )
+        ubicaciones.aplicar_saldos(antes, saldos)
+        por_saldo = {}
+        for (nuevo, pk), cantidad in saldo_lote.items():
+            if not nuevo and cantidad != lotes_antes[0, pk]:
+                por_saldo.setdefault(cantidad, []).append(pk)
+        for cantidad, pks in por_saldo.items():
+            Lote.objects.filter(pk__in=pks).update(cantidad=cantidad)
+        # Las inserciones y updates masivos no emiten señales
+        insertados = _insertar_movimientos(movimientos, usuario)
+        # Los ids vienen en el orden de las lineas: cada entrada con su lote
+        Lote.objects.bulk_create(
+            [
+                Lote(
+                    producto_id=movimientos[i][0],
+                    codigo=datos['lote'] or lotes.codigo_entrada(insertados[i]),
+                    cantidad=saldo_lote[1, n],
+                    cantidad_inicial=datos['cantidad'],
+                    fecha_vencimiento=datos['fecha_vencimiento'],
+                    movimiento_id=insertados[i],
+                )
+                for n, (i, datos) in enumerate(entradas)
+            ],
+            batch_size=1000,
+        )
+        lotes.actualizar_vencimiento(Producto.objects.filter(pk__in=list(deltas)))
+        cambios.registrar({cambios.PRODUCTO: deltas, cambios.MOVIMIENTO: insertados})
+        eventos.publicar(productos=deltas, movimientos=insertados)
+        VersionInventario.incrementar()
+        alertas.invalidar()
+        valorizacion.invalidar(deltas)
+        catalogo.invalidar_productos()
+    resultado.creados += len(movimientos)
+
+
+def _consumir_fefo(cola, saldo_lote, cantidad):
+    """Descuenta ``cantidad`` de la cola FEFO de un producto, como lotes.consumir."""
+    while cantidad and cola:
+        clave = cola[0][1:]
+        tomado = min(saldo_lote[clave], cantidad)
+        saldo_lote[clave] -= tomado
+        cantidad -= tomado
+        if not saldo_lote[clave]:
+            heapq.heappop(cola)
+
+
+def numerar(filas):
+    """Numera desde 1 las filas de un arreglo JSON, como las lineas de un CSV."""
+    return enumerate(filas, start=1)
+
+
+def importar_movimientos(filas, usuario=None, tamano_lote=TAMANO_LOTE):
+    """Importa movimientos desde un iterable de (numero_linea, dict)."""
+    resultado = ResultadoImportacion()
+    lote = []
+    for item in filas:
+        lote.append(item)
+        if len(lote) >= tamano_lote:
+            _importar_lote(lote, usuario, resultado)
+            lote = []
+    if lote:
+        _importar_lote(lote, usuario, resultado)
+    resultado.errores.sort(key=lambda e: e['linea'])
+    return resultado
+
+
+# --- Catalogo de productos ---
+
+# cantidad y fecha_vencimiento solo se usan al crear: son el lote inicial del producto
+CAMPOS_ACTUALIZABLES = ['nombre', 'descripcion', 'ubicacion', 'umbral_stock_bajo']
+
+
+class ResultadoCatalogo(ResultadoImportacion):
+    def __init__(self):
+        super().__init__()
+        self.actualizados = 0
+        self.sin_cambios = 0
+        self.categorias_creadas = 0
+        self.cambios = []
+
+    def as_dict(self):
+        return dict(
+            super().as_dict(),
+            actualizados=self.actualizados,
+            sin_cambios=self.sin_cambios,
+            categorias_creadas=self.categorias_creadas,
+            cambios=self.cambios,
+        )
+
+
+def _texto(valor):
+    return '' if valor is None else str(valor).strip()
+
+
+def _fecha(valor):
+    if valor in (None, ''):
+        return None
+    if isinstance(valor, datetime.datetime):
+        return valor.date()
+    if isinstance(valor, datetime.date):
+        return valor
+    for formato in ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y'):
+        try:
+            return datetime.datetime.strptime(str(valor).strip(), formato).date()
+        except ValueError:
+            pass
+    raise ValueError(f'Fecha de vencimiento inválida: {valor}.')
+
+
+def _entero(valor, campo, defecto):
+    if valor in (None, ''):
+        return defecto
+    try:
+        numero = int(float(valor)) if isinstance(valor, float) else int(str(valor).strip())
+    except ValueError:
+        raise ValueError(f'{campo} debe ser un número entero.')
+    if numero < 0:
+        raise ValueError(f'{campo} no puede ser negativo.')
+    return numero
+
+
+def _validar_producto(fila):
+    """Devuelve (datos, None) o (None, mensaje de error)."""
+    if not isinstance(fila, dict):
+        return None, 'Cada producto debe ser un objeto con sus campos.'
+    datos = {
+        'codigo': _texto(fila.get('codigo')),
+        'nombre': _texto(fila.get('nombre')),
+        'descripcion': _texto(fila.get('descripcion')),
+        'ubicacion': _texto(fila.get('ubicacion')),
+    }
+    for campo, largo in (('codigo', 20), ('nombre', 100), ('ubicacion', 100)):
+        if not datos[campo]:
+            return None, f'Falta el campo {campo}.'
+        if len(datos[campo]) > largo:
+            return None, f'{campo} supera los {largo} caracteres.'
+    try:
+        datos['cantidad'] = _entero(fila.get('cantidad'), 'cantidad', 0)
+        datos['umbral_stock_bajo'] = _entero(fila.get('umbral_stock_bajo'), 'umbral_stock_bajo', 5)
+        datos['fecha_vencimiento'] = _fecha(fila.get('fecha_vencimiento'))
+    except ValueError as exc:
+        return None, str(exc)
+    categorias = [c.strip() for c in _texto(fila.get('categorias')).split(',') if c.strip()]
+    if any(len(c) > 50 for c in categorias):
+        return None, 'Los nombres de categoría no pueden superar los 50 caracteres.'
+    datos['categorias'] = categorias
+    return datos, None
+
+
+def _importar_catalogo_lote(lote, simular, resultado, crear_categorias=True):
+    validas = []
+    for linea, fila in lote:
+        datos, error = _validar_producto(fila)
+        if error:
+            resultado.error(linea, error)
+        else:
+            validas.append((linea, datos))
+    if not crear_categorias:
+        # Solo un administrador crea categorias, como con nuevas_categorias en el formulario
+        nombres = {c for _, datos in validas for c in datos['categorias']}
+        conocidas = set(Categoria.objects.filter(nombre__in=nombres).values_list('nombre', flat=True)) if nombres else set()
+    por_codigo = {}
+    for linea, datos in validas:
+        if not crear_categorias:
+            desconocidas = [c for c in datos['categorias'] if c not in conocidas]
+            if desconocidas:
+                resultado.error(
+                    linea, f"Categorías inexistentes: {', '.join(desconocidas)}. Solo un administrador puede crearlas."
+                )
+                continue
+        # Si el codigo se repite en el archivo manda la ultima linea
+        por_codigo[datos['codigo']] = datos
+    if not por_codigo:
+        return
+
+    existentes = {
+        p['codigo']: p
+        for p in Producto.objects.filter(codigo__in=por_codigo).values('id', 'codigo', *CAMPOS_ACTUALIZABLES)
+    }
+    through = Producto.categorias.through
+    categorias_actuales = {}
+    for producto_id, nombre in through.objects.filter(
+        producto_id__in=[p['id'] for p in existentes.values()]
+    ).values_list('producto_id', 'categoria__nombre'):
+        categorias_actuales.setdefault(producto_id, set()).add(nombre)
+
+    escribir = []
+    categorias_nuevas = {}
+    reubicados = {}
+    for codigo, datos in por_codigo.items():
+        actual = existentes.get(codigo)
+        faltantes = set(datos['categorias'])
+        if actual is None:
+            diferencias = {'nuevo': True}
+            resultado.creados += 1
+        else:
+            faltantes -= categorias_actuales.get(actual['id'], set())
+            diferencias = {
+                campo: [actual[campo], datos[campo]]
+                for campo in CAMPOS_ACTUALIZABLES if actual[campo] != datos[campo]
+            }
+            if not diferencias and not faltantes:
+                resultado.sin_cambios += 1
+                continue
+            resultado.actualizados += 1
+            if 'ubicacion' in diferencias:
+                reubicados[actual['id']] = actual['ubicacion']
+        if faltantes:
+            diferencias['categorias'] = sorted(faltantes)
+            categorias_nuevas[codigo] = faltantes
+        if len(resultado.cambios) < MAX_CAMBIOS_DETALLE:
+            resultado.cambios.append(dict(diferencias, codigo=codigo))
+        if actual is None or set(diferencias) - {'categorias'}:
+            escribir.append(datos)
+
+    nombres_categorias = set().union(*categorias_nuevas.values()) if categorias_nuevas else set()
+    if simular:
+        if nombres_categorias:
+            resultado.categorias_creadas += len(
+                nombres_categorias - set(Categoria.objects.filter(nombre__in=nombres_categorias)
+                                         .values_list('nombre', flat=True))
+            )
+        return
+
+    with transaction.atomic():
+        if escribir:
+            # La cantidad y el vencimiento solo se usan al crear: el stock de un
+            # producto existente se modifica con movimientos, no con la carga del catalogo.
+            Producto.objects.bulk_create(
+                [Producto(**{k: v for k, v in d.items() if k != 'categorias'}) for d in escribir],
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['codigo'],
+                update_fields=CAMPOS_ACTUALIZABLES,
+            )
+        if nombres_categorias:
+            antes = Categoria.objects.count()
+            Categoria.objects.bulk_create(
+                [Categoria(nombre=n) for n in nombres_categorias], batch_size=1000, ignore_conflicts=True
+            )
+            resultado.categorias_creadas += Categoria.objects.count() - antes
+            ids_categoria = dict(
+                Categoria.objects.filter(nombre__in=nombres_categorias).values_list('nombre', 'id')
+            )
+
+        ids_producto = dict(
+            Producto.objects.filter(codigo__in=por_codigo).values_list('codigo', 'id')
+        )
+        if nombres_categorias:
+            through.objects.bulk_create(
+                [
+                    through(producto_id=ids_producto[codigo], categoria_id=ids_categoria[nombre])
+                    for codigo, nombres in categorias_nuevas.items()
+                    for nombre in nombres
+                ],
+                batch_size=1000,
+                ignore_conflicts=True,
+            )
+        # bulk_create no emite señales ni llama a save(): se reindexa, se
+        # recalculan las alertas y se invalida la version a mano
+        escritos = [ids_producto[d['codigo']] for d in escribir]
+        # Los productos nuevos quedan con su cantidad en la ubicacion principal y
+        # en un lote; los que cambian de ubicacion llevan alli su stock
+        ubicaciones.cambiar_principal(reubicados)
+        ubicaciones.conciliar(escritos)
+        lotes.conciliar(escritos)
+        busqueda.indexar_ids(escritos)
+        alertas.recalcular(Producto.objects.filter(pk__in=escritos))
+        cambios.registrar({
+            cambios.PRODUCTO: [*escritos, *(ids_producto[codigo] for codigo in categorias_nuevas)],
+            cambios.CATEGORIA: ids_categoria.values() if nombres_categorias else (),
+        })
+        eventos.publicar(productos=escritos)
+        VersionInventario.incrementar()
+        valorizacion.invalidar(escritos, crear=True)
+        catalogo.invalidar_productos()
+        catalogo.invalidar_categorias()
+
+
+def importar_catalogo(filas, simular=False, tamano_lote=TAMANO_LOTE, crear_categorias=True):
+    """Crea o actualiza productos por ``codigo`` desde un iterable de (numero_linea, dict).
+
+    Con ``simular=True`` no escribe nada y solo informa las diferencias.
+    Las categorias de la fila se agregan a las que ya tenga el producto; con
+    ``crear_categorias=False`` una categoria que no existe es un error de la fila.
+    """
+    resultado = ResultadoCatalogo()
+    lote = []
+    for item in filas:
+        lote.append(item)
+        if len(lote) >= tamano_lote:
+            _importar_catalogo_lote(lote, simular, resultado, crear_categorias)
+            lote = []
+    if lote:
+        _importar_catalogo_lote(lote, simular, resultado, crear_categorias)
+    resultado.errores.sort(key=lambda e: e['linea'])
+    return resultado
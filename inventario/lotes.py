@@ -0,0 +1,135 @@
+"""Lotes con vencimiento y despacho FEFO (primero en vencer, primero en salir).
+
+Cada entrada crea un lote con su codigo y fecha de vencimiento; las salidas
+y los usos en proyecto descuentan de los lotes con stock del producto en
+orden de vencimiento (los lotes sin fecha al final), en la misma transaccion
+que el movimiento. El UPDATE del stock del producto (stock.py) ya bloquea
+el producto, asi que dos salidas concurrentes no consumen el mismo saldo.
+
+Los lotes con stock de un producto suman siempre ``Producto.cantidad``, y
+``Producto.fecha_vencimiento`` es el vencimiento mas proximo entre ellos.
+Los lotes no tienen ubicacion: una transferencia no los cambia. La fecha
+de un lote ya creado se corrige con ``corregir_vencimiento``; la del
+formulario del producto solo se aplica a su stock inicial.
+"""
+from django.db import transaction
+from django.db.models import F, Min, OuterRef, Subquery, Sum
+
+from .models import Lote, Producto
+
+CODIGO_INICIAL = 'INICIAL'
+CODIGO_AJUSTE = 'AJUSTE'
+# Orden FEFO; coincide con el indice lote_fefo_idx
+ORDEN_FEFO = [F('fecha_vencimiento').asc(nulls_last=True), 'id']
+
+
+def codigo_entrada(movimiento_id):
+    return f'MOV-{movimiento_id}'
+
+
+def crear(movimiento, codigo=None, fecha_vencimiento=None):
+    """Crea el lote de una entrada ya guardada. Debe llamarse en su transaccion."""
+    return Lote.objects.create(
+        producto_id=movimiento.producto_id,
+        codigo=codigo or codigo_entrada(movimiento.pk),
+        cantidad=movimiento.cantidad,
+        cantidad_inicial=movimiento.cantidad,
+        fecha_vencimiento=fecha_vencimiento,
+        movimiento=movimiento,
+    )
+
+
+def consumir(producto_id, cantidad):
+    """Descuenta ``cantidad`` de los lotes del producto en orden FEFO.
+
+    Devuelve lo que no alcanzo a cubrir (0 si el stock por lotes cuadra).
+    """
+    agotados = []
+    pendiente = cantidad
+    lotes = Lote.objects.filter(producto_id=producto_id, cantidad__gt=0).order_by(*ORDEN_FEFO)
+    for pk, disponible in lotes.values_list('pk', 'cantidad').iterator(chunk_size=50):
+        if disponible > pendiente:
+            Lote.objects.filter(pk=pk).update(cantidad=F('cantidad') - pendiente)
+            pendiente = 0
+            break
+        agotados.append(pk)
+        pendiente -= disponible
+        if not pendiente:
+            break
+    if agotados:
+        Lote.objects.filter(pk__in=agotados).update(cantidad=0)
+    return pendiente
+
+
+def proximo_vencimiento():
+    """Subconsulta con el vencimiento mas proximo de los lotes con stock de cada producto."""
+    return Subquery(
+        Lote.objects.filter(producto=OuterRef('pk'), cantidad__gt=0)
+        .order_by().values('producto').annotate(fecha=Min('fecha_vencimiento')).values('fecha')
+    )
+
+
+def actualizar_vencimiento(productos):
+    """Recalcula ``Producto.fecha_vencimiento`` de un queryset de productos con un solo UPDATE."""
+    return productos.update(fecha_vencimiento=proximo_vencimiento())
+
+
+@transaction.atomic
+def conciliar(producto_ids):
+    """Ajusta los lotes de los productos a su ``Producto.cantidad``.
+
+    Cubre los productos creados o editados sin movimientos (formulario,
+    carga de catalogo): el stock que falta entra como un lote con la
+    ``fecha_vencimiento`` indicada en el producto, y el que sobra se
+    descuenta en orden FEFO. Luego recalcula el vencimiento del producto.
+    """
+    producto_ids = list(producto_ids)
+    if not producto_ids:
+        return
+    # El producto se bloquea primero, como en los movimientos
+    productos = list(
+        Producto.objects.select_for_update().filter(pk__in=producto_ids)
+        .values_list('pk', 'cantidad', 'fecha_vencimiento')
+    )
+    sumas = dict(
+        Lote.objects.filter(producto_id__in=producto_ids)
+        .values('producto_id').annotate(total=Sum('cantidad')).values_list('producto_id', 'total')
+    )
+    nuevos = []
+    for pk, cantidad, fecha_vencimiento in productos:
+        diferencia = cantidad - (sumas.get(pk) or 0)
+        if diferencia > 0:
+            nuevos.append(Lote(
+                producto_id=pk,
+                codigo=CODIGO_INICIAL if pk not in sumas else CODIGO_AJUSTE,
+                cantidad=diferencia,
+                cantidad_inicial=diferencia,
+                fecha_vencimiento=fecha_vencimiento,
+            ))
+        elif diferencia < 0:
+            consumir(pk, -diferencia)
+    Lote.objects.bulk_create(nuevos, batch_size=1000)
+    actualizar_vencimiento(Producto.objects.filter(pk__in=producto_ids))
+
+
+@transaction.atomic
+def corregir_vencimiento(lote, fecha_vencimiento):
+    """Corrige el vencimiento de un lote ya creado y recalcula el del producto.
+
+    El producto se guarda con ``save()`` para que las señales registren el
+    cambio (sincronizacion, cache, eventos) como en cualquier edicion.
+    """
+    Lote.objects.filter(pk=lote.pk).update(fecha_vencimiento=fecha_vencimiento)
+    lote.fecha_vencimiento = fecha_vencimiento
+    producto = Producto.objects.select_for_update().get(pk=lote.producto_id)
+    producto.fecha_vencimiento = (
+        Lote.objects.filter(producto_id=producto.pk, cantidad__gt=0)
+        .aggregate(fecha=Min('fecha_vencimiento'))['fecha']
+    )
+    producto.save(update_fields=['fecha_vencimiento'])
+    return lote
+
+
+def lotes_de(producto):
+    """Lotes con stock del producto, en el orden en que se despachan."""
+    return Lote.objects.filter(producto=producto, cantidad__gt=0).order_by(*ORDEN_FEFO)
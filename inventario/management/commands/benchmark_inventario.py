@@ -0,0 +1,186 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from inventario import alertas, catalogo, lotes, ubicaciones
+from inventario.models import Lote, MovimientoInventario, PrecioCompra, Producto
+from inventario.paginacion import codificar_cursor
+
+
+class Command(BaseCommand):
+    help = ('Mide las vistas principales con el cliente de pruebas (latencia, consultas y memoria) '
+            'y guarda el resultado en JSON para comparar entre commits. Usar sobre datos de seed_inventario.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteraciones', type=int, default=20, help='Mediciones por escenario.')
+        parser.add_argument('--calentamiento', type=int, default=2, help='Peticiones previas no medidas.')
+        parser.add_argument('--escenarios', nargs='*', help='Solo corre los escenarios indicados.')
+        parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto benchmark-<commit>.json).')
+        parser.add_argument('--comparar', help='JSON de una corrida anterior contra el que se comparan los resultados.')
+
+    def handle(self, *args, **options):
+        producto = Producto.objects.filter(precios_registrados__gt=0).order_by('-pk').first()
+        if producto is None:
+            raise CommandError('No hay productos con precios; ejecute primero seed_inventario.')
+
+        escenarios = self.escenarios(producto)
+        if options['escenarios']:
+            desconocidos = set(options['escenarios']) - set(escenarios)
+            if desconocidos:
+                raise CommandError(f"Escenarios desconocidos: {', '.join(sorted(desconocidos))}.")
+            escenarios = {nombre: escenarios[nombre] for nombre in options['escenarios']}
+
+        setup_test_environment()
+        usuario = User.objects.create_superuser(f'benchmark-{int(time.time())}', password=None)
+        cliente = Client()
+        cliente.force_login(usuario)
+        ultimo_movimiento = MovimientoInventario.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        try:
+            resultados = {}
+            for nombre, (metodo, url, datos, esperado) in escenarios.items():
+                resultados[nombre] = self.medir(cliente, metodo, url, datos, esperado, options)
+                fila = resultados[nombre]
+                self.stdout.write(
+                    f"{nombre:<22} p50 {fila['p50_ms']:>8.1f} ms  p95 {fila['p95_ms']:>8.1f} ms  "
+                    f"{fila['consultas']:>4} consultas  {fila['memoria_pico_kb']:>8.0f} KB"
+                )
+        finally:
+            teardown_test_environment()
+            self.deshacer_entradas(producto, usuario, ultimo_movimiento)
+            usuario.delete()
+
+        informe = {'metadatos': self.metadatos(options), 'escenarios': resultados}
+        salida = options['salida'] or f"benchmark-{informe['metadatos']['commit'][:10] or 'local'}.json"
+        with open(salida, 'w', encoding='utf-8') as archivo:
+            json.dump(informe, archivo, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f'Resultados guardados en {salida}.'))
+
+        if options['comparar']:
+            self.comparar(options['comparar'], resultados)
+
+    @transaction.atomic
+    def deshacer_entradas(self, producto, usuario, ultimo_movimiento):
+        """Borra las entradas de prueba y devuelve el producto al stock que tenia.
+
+        El stock por ubicacion y los lotes se ajustan con su conciliacion, para
+        que sigan sumando ``Producto.cantidad``.
+        """
+        entradas = MovimientoInventario.objects.filter(pk__gt=ultimo_movimiento, usuario=usuario)
+        Lote.objects.filter(movimiento__in=entradas).delete()
+        entradas.delete()
+        Producto.objects.filter(pk=producto.pk).update(cantidad=producto.cantidad)
+        ubicaciones.conciliar([producto.pk])
+        lotes.conciliar([producto.pk])
+        alertas.recalcular(Producto.objects.filter(pk=producto.pk))
+        catalogo.invalidar_producto(producto.pk)
+
+    def escenarios(self, producto):
+        """Nombre -> (metodo, url, datos, codigo HTTP esperado)."""
+        # Cursor a mitad del catalogo: una pagina profunda debe costar lo mismo que la primera
+        medio = Producto.objects.order_by('codigo', 'id').values_list('codigo', 'id')[Producto.objects.count() // 2]
+        listado_profundo = f"{reverse('producto-list')}?cursor={codificar_cursor(list(medio))}"
+        return {
+            'producto_list': ('get', reverse('producto-list'), None, 200),
+            'producto_list_profundo': ('get', listado_profundo, None, 200),
+            'producto_busqueda': ('get', reverse('producto-list'), {'nombre': 'perno'}, 200),
+            'movimiento_list': ('get', reverse('movimiento-list'), None, 200),
+            'alerta_stock_bajo': ('get', reverse('alerta-stock-bajo'), None, 200),
+            'productos_vencimiento': ('get', reverse('productos-vencimiento'), None, 200),
+            'producto_detalle': ('get', reverse('producto-detalle', args=[producto.codigo]), None, 200),
+            'reporte_csv': ('post', reverse('reporte-inventario'), {'formato': 'csv'}, 200),
+            'movimiento_nuevo': ('post', reverse('movimiento-nuevo'), {
+                'producto': producto.pk,
+                'tipo_movimiento': 'ENTRADA',
+                'cantidad': 1,
+                'observaciones': 'benchmark_inventario',
+            }, 302),
+        }
+
+    def medir(self, cliente, metodo, url, datos, esperado, options):
+        def peticion():
+            respuesta = getattr(cliente, metodo)(url, datos)
+            if respuesta.status_code != esperado:
+                raise CommandError(f'{metodo.upper()} {url} respondio {respuesta.status_code}, se esperaba {esperado}.')
+            # Las respuestas en streaming se consumen completas para medir todo el trabajo
+            if respuesta.streaming:
+                for _ in respuesta.streaming_content:
+                    pass
+            return respuesta
+
+        for _ in range(options['calentamiento']):
+            peticion()
+
+        tiempos = []
+        consultas = []
+        for _ in range(options['iteraciones']):
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                peticion()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            consultas.append(len(capturadas))
+
+        # La memoria se mide aparte: tracemalloc hace mas lenta cada asignacion
+        tracemalloc.start()
+        peticion()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        percentiles = statistics.quantiles(tiempos, n=100, method='inclusive') if len(tiempos) > 1 else tiempos * 99
+        return {
+            'iteraciones': len(tiempos),
+            'p50_ms': round(percentiles[49], 2),
+            'p95_ms': round(percentiles[94], 2),
+            'p99_ms': round(percentiles[98], 2),
+            'media_ms': round(statistics.fmean(tiempos), 2),
+            'max_ms': round(max(tiempos), 2),
+            'consultas': max(consultas),
+            'memoria_pico_kb': round(pico / 1024, 1),
+        }
+
+    def metadatos(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = ''
+        return {
+            'commit': commit,
+            'fecha': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'base_de_datos': connection.vendor,
+            'iteraciones': options['iteraciones'],
+            'datos': {
+                'productos': Producto.objects.count(),
+                'movimientos': MovimientoInventario.objects.count(),
+                'precios': PrecioCompra.objects.count(),
+            },
+        }
+
+    def comparar(self, ruta, resultados):
+        with open(ruta, encoding='utf-8') as archivo:
+            anterior = json.load(archivo)
+        self.stdout.write(f"Comparacion con {anterior['metadatos'].get('commit', '')[:10] or ruta}:")
+        for nombre, fila in resultados.items():
+            previo = anterior['escenarios'].get(nombre)
+            if not previo:
+                continue
+            cambio = (fila['p50_ms'] - previo['p50_ms']) / previo['p50_ms'] * 100 if previo['p50_ms'] else 0
+            self.stdout.write(
+                f"{nombre:<22} p50 {previo['p50_ms']:>8.1f} -> {fila['p50_ms']:>8.1f} ms ({cambio:+.0f}%)  "
+                f"consultas {previo['consultas']} -> {fila['consultas']}"
+            )
@@ -0,0 +1,269 @@
+import asyncio
+import importlib.util
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from inventario.models import MovimientoInventario, Producto
+
+HOST = '127.0.0.1'
+
+# Nombre -> (modulos que deben estar instalados, argumentos del servidor)
+SERVIDORES = {
+    'wsgi': (('gunicorn',), lambda puerto, o: [
+        '-m', 'gunicorn', 'maestranza.wsgi:application', '--bind', f'{HOST}:{puerto}',
+        '--workers', str(o['workers']), '--threads', str(o['hilos']), '--log-level', 'warning',
+    ]),
+    'asgi': (('uvicorn',), lambda puerto, o: [
+        '-m', 'uvicorn', 'maestranza.asgi:application', '--host', HOST, '--port', str(puerto),
+        '--workers', str(o['workers']), '--log-level', 'warning', '--no-access-log',
+    ]),
+    'asgi_gunicorn': (('gunicorn', 'uvicorn'), lambda puerto, o: [
+        '-m', 'gunicorn', 'maestranza.asgi:application', '--bind', f'{HOST}:{puerto}',
+        '--workers', str(o['workers']), '--worker-class', 'uvicorn.workers.UvicornWorker', '--log-level', 'warning',
+    ]),
+}
+
+
+class ErrorHttp(Exception):
+    pass
+
+
+async def leer_respuesta(reader):
+    """Lee una respuesta HTTP/1.1 completa. Devuelve (estado, cerrar_conexion)."""
+    linea = await reader.readline()
+    if not linea:
+        raise ErrorHttp('El servidor cerro la conexion.')
+    estado = int(linea.split()[1])
+    cabeceras = {}
+    while True:
+        linea = await reader.readline()
+        if linea in (b'\r\n', b'\n', b''):
+            break
+        nombre, _, valor = linea.decode('latin-1').partition(':')
+        cabeceras[nombre.strip().lower()] = valor.strip().lower()
+
+    cerrar = cabeceras.get('connection') == 'close'
+    if 'content-length' in cabeceras:
+        await reader.readexactly(int(cabeceras['content-length']))
+    elif cabeceras.get('transfer-encoding') == 'chunked':
+        while True:
+            tamano = int((await reader.readline()).split(b';')[0], 16)
+            if tamano == 0:
+                # Trailers opcionales hasta la linea vacia
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                break
+            await reader.readexactly(tamano + 2)
+    else:
+        await reader.read()
+        cerrar = True
+    return estado, cerrar
+
+
+class Command(BaseCommand):
+    help = ('Compara el despliegue WSGI (gunicorn) con el ASGI (uvicorn) bajo muchos clientes concurrentes: '
+            'levanta cada servidor, lo carga con conexiones keep-alive sobre los listados, el detalle y la API, '
+            'y reporta peticiones por segundo y percentiles de latencia. Usar sobre datos de seed_inventario.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servidores', nargs='*', default=['wsgi', 'asgi'], choices=sorted(SERVIDORES))
+        parser.add_argument('--clientes', type=int, default=200, help='Conexiones concurrentes.')
+        parser.add_argument('--duracion', type=float, default=20, help='Segundos medidos por servidor.')
+        parser.add_argument('--calentamiento', type=float, default=3, help='Segundos previos no medidos.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Procesos por servidor.')
+        parser.add_argument('--hilos', type=int, default=4, help='Hilos por proceso de gunicorn WSGI (gthread).')
+        parser.add_argument('--espera', type=float, default=60, help='Segundos maximos por respuesta.')
+        parser.add_argument('--puerto', type=int, default=8765)
+        parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto benchmark-servidores-<commit>.json).')
+
+    def handle(self, *args, **options):
+        for nombre in options['servidores']:
+            faltantes = [m for m in SERVIDORES[nombre][0] if importlib.util.find_spec(m) is None]
+            if faltantes:
+                raise CommandError(f"{nombre} requiere {', '.join(faltantes)} instalado (ver requirements.txt).")
+        producto = Producto.objects.order_by('-pk').first()
+        if producto is None:
+            raise CommandError('No hay productos; ejecute primero seed_inventario.')
+
+        rutas = [
+            reverse('producto-list'),
+            f"{reverse('producto-list')}?nombre=perno",
+            reverse('producto-detalle', args=[producto.codigo]),
+            reverse('alerta-stock-bajo'),
+            reverse('movimiento-list'),
+            f"{reverse('api-productos')}?limite=50",
+        ]
+        usuario = User.objects.create_superuser(f'benchmark-{int(time.time())}', password=None)
+        sesion = SessionStore()
+        sesion[SESSION_KEY] = str(usuario.pk)
+        sesion[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        sesion[HASH_SESSION_KEY] = usuario.get_session_auth_hash()
+        sesion.save()
+        cookie = f'{settings.SESSION_COOKIE_NAME}={sesion.session_key}'
+        try:
+            resultados = {}
+            for nombre in options['servidores']:
+                self.stdout.write(f'{nombre}: {options["clientes"]} clientes durante {options["duracion"]:.0f}s...')
+                resultados[nombre] = self.medir_servidor(nombre, rutas, cookie, options)
+                fila = resultados[nombre]
+                self.stdout.write(
+                    f"{nombre:<14} {fila['por_segundo']:>8.1f} pet/s  p50 {fila['p50_ms']:>8.1f} ms  "
+                    f"p99 {fila['p99_ms']:>8.1f} ms  {fila['errores']} errores"
+                )
+        finally:
+            sesion.delete()
+            usuario.delete()
+
+        if 'wsgi' in resultados:
+            base = resultados['wsgi']
+            for nombre, fila in resultados.items():
+                if nombre != 'wsgi' and base['por_segundo']:
+                    self.stdout.write(
+                        f"{nombre} vs wsgi: {fila['por_segundo'] / base['por_segundo']:.2f}x pet/s, "
+                        f"p99 {fila['p99_ms']:.0f} ms vs {base['p99_ms']:.0f} ms"
+                    )
+
+        informe = {'metadatos': self.metadatos(options, rutas), 'servidores': resultados}
+        salida = options['salida'] or f"benchmark-servidores-{informe['metadatos']['commit'][:10] or 'local'}.json"
+        with open(salida, 'w', encoding='utf-8') as archivo:
+            json.dump(informe, archivo, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f'Resultados guardados en {salida}.'))
+
+    def medir_servidor(self, nombre, rutas, cookie, options):
+        puerto = options['puerto']
+        entorno = dict(os.environ)
+        entorno['DJANGO_SETTINGS_MODULE'] = settings.SETTINGS_MODULE
+        entorno['PYTHONPATH'] = os.pathsep.join(p for p in [str(settings.BASE_DIR), entorno.get('PYTHONPATH')] if p)
+        # Configuracion de produccion salvo que se indique otra cosa
+        entorno.setdefault('DJANGO_DEBUG', 'False')
+        entorno['DJANGO_ALLOWED_HOSTS'] = ','.join(h for h in [entorno.get('DJANGO_ALLOWED_HOSTS'), HOST] if h)
+        proceso = subprocess.Popen(
+            [sys.executable, *SERVIDORES[nombre][1](puerto, options)], cwd=settings.BASE_DIR, env=entorno,
+        )
+        try:
+            self.esperar_servidor(proceso, puerto)
+            return asyncio.run(self.cargar(puerto, rutas, cookie, options))
+        finally:
+            proceso.terminate()
+            try:
+                proceso.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proceso.kill()
+                proceso.wait()
+
+    def esperar_servidor(self, proceso, puerto, limite=60):
+        fin = time.monotonic() + limite
+        while time.monotonic() < fin:
+            if proceso.poll() is not None:
+                raise CommandError(f'El servidor termino al iniciar (codigo {proceso.returncode}).')
+            try:
+                with socket.create_connection((HOST, puerto), timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'El servidor no acepto conexiones en {limite}s.')
+
+    async def cargar(self, puerto, rutas, cookie, options):
+        peticiones = [
+            (f'GET {ruta} HTTP/1.1\r\nHost: {HOST}:{puerto}\r\nCookie: {cookie}\r\n'
+             f'Accept-Encoding: identity\r\n\r\n').encode()
+            for ruta in rutas
+        ]
+        reloj = time.perf_counter
+        inicio_medicion = reloj() + options['calentamiento']
+        fin = inicio_medicion + options['duracion']
+        tiempos = {ruta: [] for ruta in rutas}
+        errores = {}
+        ultima_respuesta = inicio_medicion
+
+        async def cliente(numero):
+            nonlocal ultima_respuesta
+            reader = writer = None
+            # Cada cliente empieza por una ruta distinta para repartir la carga
+            i = numero
+            while reloj() < fin:
+                peticion, ruta = peticiones[i % len(rutas)], rutas[i % len(rutas)]
+                i += 1
+                inicio = reloj()
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.open_connection(HOST, puerto)
+                    writer.write(peticion)
+                    await writer.drain()
+                    estado, cerrar = await asyncio.wait_for(leer_respuesta(reader), options['espera'])
+                except (OSError, ErrorHttp, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError, IndexError) as exc:
+                    estado, cerrar = type(exc).__name__, True
+                # Se mide todo lo pedido dentro de la ventana, aunque responda despues:
+                # descartar las respuestas tardias esconderia justamente las mas lentas
+                if inicio >= inicio_medicion:
+                    ultima_respuesta = max(ultima_respuesta, reloj())
+                    if estado == 200:
+                        tiempos[ruta].append((reloj() - inicio) * 1000)
+                    else:
+                        errores[str(estado)] = errores.get(str(estado), 0) + 1
+                if cerrar and writer is not None:
+                    writer.close()
+                    reader = writer = None
+            if writer is not None:
+                writer.close()
+
+        await asyncio.gather(*(cliente(n) for n in range(options['clientes'])))
+
+        todos = [t for lista in tiempos.values() for t in lista]
+        if len(todos) < 2:
+            raise CommandError(f'Sin respuestas validas durante la medicion (errores: {errores}).')
+        percentiles = statistics.quantiles(todos, n=100, method='inclusive')
+        return {
+            'peticiones': len(todos),
+            'errores': sum(errores.values()),
+            'errores_por_tipo': errores,
+            'por_segundo': round(len(todos) / (ultima_respuesta - inicio_medicion), 1),
+            'p50_ms': round(percentiles[49], 2),
+            'p95_ms': round(percentiles[94], 2),
+            'p99_ms': round(percentiles[98], 2),
+            'max_ms': round(max(todos), 2),
+            'p99_por_ruta_ms': {
+                ruta: round(statistics.quantiles(lista, n=100, method='inclusive')[98], 2) if len(lista) > 1 else None
+                for ruta, lista in tiempos.items()
+            },
+        }
+
+    def metadatos(self, options, rutas):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = ''
+        return {
+            'commit': commit,
+            'fecha': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'base_de_datos': connection.vendor,
+            'clientes': options['clientes'],
+            'duracion_s': options['duracion'],
+            'workers': options['workers'],
+            'hilos_wsgi': options['hilos'],
+            'rutas': rutas,
+            'datos': {
+                'productos': Producto.objects.count(),
+                'movimientos': MovimientoInventario.objects.count(),
+            },
+        }
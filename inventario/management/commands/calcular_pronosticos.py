@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventario import pronosticos
+
+
+class Command(BaseCommand):
+    help = (
+        'Calcula el consumo diario y el punto de reorden sugerido de cada producto. '
+        'Pensado para correr una vez por noche.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=pronosticos.DIAS_HISTORIAL,
+                            help='Dias de historial de consumo a considerar.')
+        parser.add_argument('--plazo', type=int, default=pronosticos.DIAS_REPOSICION,
+                            help='Dias de reposicion del proveedor.')
+        parser.add_argument('--factor', type=float, default=pronosticos.FACTOR_SERVICIO,
+                            help='Factor z del stock de seguridad (1.65 = 95%% de nivel de servicio).')
+        parser.add_argument('--aplicar', action='store_true',
+                            help='Actualiza umbral_stock_bajo con el punto de reorden sugerido.')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        calculados = pronosticos.calcular(options['dias'], options['plazo'], options['factor'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{calculados} pronostico(s) calculados en {time.perf_counter() - inicio:.1f}s.'
+        ))
+        if options['aplicar']:
+            actualizados = pronosticos.aplicar_umbrales()
+            self.stdout.write(f'{actualizados} umbral(es) de stock bajo actualizados.')
@@ -0,0 +1,104 @@
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test import Client
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.urls import reverse
+
+from inventario.models import MovimientoInventario, Producto
+
+
+class Command(BaseCommand):
+    help = ('Prueba de carga: varios escritores concurrentes registran movimientos a traves de '
+            'MovimientoInventarioCreateView y se cuentan los errores de bloqueo de la base. '
+            'Corre sobre una base de pruebas que se crea y se borra, con el mismo motor que default.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escritores', type=int, default=8, help='Hilos escribiendo a la vez.')
+        parser.add_argument('--peticiones', type=int, default=50, help='POST por escritor.')
+        parser.add_argument('--productos', type=int, default=4, help='Productos de prueba sobre los que se reparte la carga.')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directorio:
+            prueba = connections['default'].settings_dict.setdefault('TEST', {})
+            if connections['default'].vendor == 'sqlite' and not prueba.get('NAME'):
+                # Un archivo y no la base en memoria de los tests: el bloqueo es el del despliegue
+                prueba['NAME'] = os.path.join(directorio, 'carga.sqlite3')
+            setup_test_environment()
+            bases = setup_databases(verbosity=0, interactive=False)
+            try:
+                self.cargar(options)
+            finally:
+                teardown_databases(bases, verbosity=0)
+                teardown_test_environment()
+
+    def cargar(self, options):
+        sufijo = int(time.time())
+        usuario = User.objects.create_superuser(f'carga-{sufijo}', password=None)
+        productos = [
+            Producto.objects.create(
+                codigo=f'CARGA-{sufijo}-{i}', nombre='Producto de prueba de carga',
+                ubicacion='PRUEBA', cantidad=1000,
+            )
+            for i in range(options['productos'])
+        ]
+        url = reverse('movimiento-nuevo')
+        resultados = {'ok': 0, 'rechazados': 0, 'bloqueo': 0, 'error': 0}
+        tiempos = []
+        candado = threading.Lock()
+
+        def escritor():
+            cliente = Client()
+            cliente.force_login(usuario)
+            try:
+                for _ in range(options['peticiones']):
+                    datos = {
+                        'producto': random.choice(productos).pk,
+                        'tipo_movimiento': random.choice(['ENTRADA', 'SALIDA', 'USO_PROYECTO']),
+                        'cantidad': random.randint(1, 5),
+                        'observaciones': 'carga_movimientos',
+                    }
+                    inicio = time.perf_counter()
+                    try:
+                        respuesta = cliente.post(url, datos)
+                        clave = 'ok' if respuesta.status_code == 302 else 'rechazados'
+                    except OperationalError as exc:
+                        clave = 'bloqueo' if 'locked' in str(exc) else 'error'
+                    except Exception:
+                        clave = 'error'
+                    with candado:
+                        resultados[clave] += 1
+                        tiempos.append(time.perf_counter() - inicio)
+            finally:
+                connection.close()
+
+        inicio = time.perf_counter()
+        hilos = [threading.Thread(target=escritor) for _ in range(options['escritores'])]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        registrados = MovimientoInventario.objects.filter(producto__in=productos).count()
+        total = sum(resultados.values())
+        percentiles = statistics.quantiles(tiempos, n=100) if len(tiempos) > 1 else [0] * 99
+        self.stdout.write(
+            f"{connections['default'].vendor}: {options['escritores']} escritores, {total} POST en {duracion:.2f}s "
+            f"({total / duracion:.0f}/s), p50 {percentiles[49] * 1000:.0f} ms, p95 {percentiles[94] * 1000:.0f} ms."
+        )
+        self.stdout.write(
+            f"{resultados['ok']} registrados, {resultados['rechazados']} rechazados por el formulario, "
+            f"{resultados['bloqueo']} fallidos por bloqueo, {resultados['error']} con otros errores."
+        )
+        consistente = registrados == resultados['ok']
+        if resultados['bloqueo'] or resultados['error'] or not consistente:
+            raise CommandError('Hubo escrituras fallidas o movimientos sin registrar.')
+        self.stdout.write(self.style.SUCCESS('Sin errores de bloqueo.'))
@@ -0,0 +1,28 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario import tokens
+from inventario.models import TokenApi
+
+
+class Command(BaseCommand):
+    help = 'Crea (o revoca) una clave de la API para un lector o integración.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usuario', help='Usuario con el que actúa el cliente; sus grupos definen los permisos.')
+        parser.add_argument('nombre', help='Nombre del cliente, por ejemplo "Lector bodega 1".')
+        parser.add_argument('--revocar', action='store_true', help='Desactiva las claves de ese usuario con ese nombre.')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f"No existe el usuario {options['usuario']}.")
+        if options['revocar']:
+            revocadas = TokenApi.objects.filter(usuario=usuario, nombre=options['nombre'], activo=True).update(activo=False)
+            self.stdout.write(self.style.SUCCESS(f'{revocadas} clave(s) revocada(s).'))
+            return
+        clave = tokens.crear(usuario, options['nombre'])
+        self.stdout.write('Guarde la clave ahora, no se vuelve a mostrar:')
+        self.stdout.write(self.style.SUCCESS(clave))
+        self.stdout.write('Envíela como "Authorization: Bearer <clave>".')
@@ -0,0 +1,36 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario import historial
+
+
+class Command(BaseCommand):
+    help = 'Genera los snapshots de stock y resumenes diarios de los dias aun no cerrados (correr una vez al dia).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hasta', help='Ultimo dia a cerrar (YYYY-MM-DD). Por defecto ayer.')
+        parser.add_argument(
+            '--reconstruir', action='store_true',
+            help='Borra los cierres existentes y los vuelve a generar desde el primer movimiento.',
+        )
+
+    def handle(self, *args, **options):
+        hasta = None
+        if options['hasta']:
+            try:
+                hasta = datetime.date.fromisoformat(options['hasta'])
+            except ValueError:
+                raise CommandError('--hasta debe tener el formato YYYY-MM-DD.')
+        if options['reconstruir']:
+            historial.borrar_cierres()
+            self.stdout.write('Cierres anteriores eliminados.')
+
+        cierres = historial.generar_cierres(hasta)
+        if not cierres:
+            self.stdout.write('No hay dias pendientes de cierre.')
+            return
+        movimientos = sum(c.movimientos for c in cierres)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(cierres)} dia(s) cerrados ({cierres[0].fecha} a {cierres[-1].fecha}), {movimientos} movimientos.'
+        ))
@@ -0,0 +1,37 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario import importacion
+
+
+class Command(BaseCommand):
+    help = 'Importa movimientos de inventario desde un archivo CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='CSV con columnas: ' + ', '.join(importacion.COLUMNAS_MOVIMIENTOS))
+        parser.add_argument('--usuario', help='Nombre de usuario que queda registrado en los movimientos.')
+        parser.add_argument('--lote', type=int, default=importacion.TAMANO_LOTE, help='Líneas por transacción.')
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f"No existe el usuario {options['usuario']}.")
+
+        inicio = time.perf_counter()
+        with open(options['archivo'], encoding='utf-8-sig', newline='') as archivo:
+            resultado = importacion.importar_movimientos(
+                importacion.leer_csv(archivo), usuario=usuario, tamano_lote=options['lote']
+            )
+        duracion = time.perf_counter() - inicio
+
+        for error in resultado.errores:
+            self.stderr.write(f"Línea {error['linea']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.creados} movimientos importados en {duracion:.2f}s '
+            f'({len(resultado.errores)} línea(s) con errores).'
+        ))
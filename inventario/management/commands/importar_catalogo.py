@@ -0,0 +1,93 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventario import importacion
+
+
+class Command(BaseCommand):
+    help = ('Crea o actualiza productos por código desde un archivo .xlsx o .csv '
+            '(columnas: ' + ', '.join(importacion.COLUMNAS_CATALOGO) + ').')
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', nargs='?', help='Archivo .xlsx o .csv a importar.')
+        parser.add_argument('--simular', action='store_true', help='Muestra las diferencias sin escribir nada.')
+        parser.add_argument('--lote', type=int, default=importacion.TAMANO_LOTE, help='Filas por transacción.')
+        parser.add_argument('--benchmark', type=int, metavar='N',
+                            help='Importa N productos sintéticos y deshace los cambios al terminar.')
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            return self.benchmark(options['benchmark'], options['lote'])
+        if not options['archivo']:
+            self.print_help('manage.py', 'importar_catalogo')
+            return
+
+        inicio = time.perf_counter()
+        if options['archivo'].lower().endswith('.xlsx'):
+            resultado = self.importar(importacion.leer_xlsx(options['archivo']), options)
+        else:
+            with open(options['archivo'], encoding='utf-8-sig', newline='') as archivo:
+                resultado = self.importar(importacion.leer_csv(archivo), options)
+        duracion = time.perf_counter() - inicio
+
+        if options['simular']:
+            for cambio in resultado.cambios:
+                self.stdout.write(self.describir(cambio))
+        for error in resultado.errores:
+            self.stderr.write(f"Línea {error['linea']}: {error['error']}")
+        prefijo = 'Simulación: ' if options['simular'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefijo}{resultado.creados} nuevos, {resultado.actualizados} actualizados, '
+            f'{resultado.sin_cambios} sin cambios, {resultado.categorias_creadas} categorías nuevas, '
+            f'{len(resultado.errores)} línea(s) con errores ({duracion:.2f}s).'
+        ))
+
+    def importar(self, filas, options):
+        return importacion.importar_catalogo(filas, simular=options['simular'], tamano_lote=options['lote'])
+
+    def describir(self, cambio):
+        codigo = cambio['codigo']
+        if cambio.get('nuevo'):
+            return f'+ {codigo}'
+        detalle = ', '.join(
+            f'{campo}: {valores[0]!r} -> {valores[1]!r}'
+            for campo, valores in cambio.items() if campo not in ('codigo', 'categorias')
+        )
+        if 'categorias' in cambio:
+            detalle = ', '.join(filter(None, [detalle, 'categorías + ' + ', '.join(cambio['categorias'])]))
+        return f'~ {codigo}: {detalle}'
+
+    def benchmark(self, total, lote):
+        categorias = [f'Categoría {i}' for i in range(50)]
+
+        def filas():
+            for i in range(total):
+                yield i + 1, {
+                    'codigo': f'BENCH-{i:07d}',
+                    'nombre': f'Producto sintético {i}',
+                    'descripcion': 'Generado por importar_catalogo --benchmark',
+                    'cantidad': random.randint(0, 500),
+                    'ubicacion': f'Bodega {i % 20}',
+                    'umbral_stock_bajo': 5,
+                    'categorias': ', '.join(random.sample(categorias, 2)),
+                }
+
+        with transaction.atomic():
+            inicio = time.perf_counter()
+            resultado = importacion.importar_catalogo(filas(), tamano_lote=lote)
+            creacion = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            segunda = importacion.importar_catalogo(filas(), tamano_lote=lote)
+            upsert = time.perf_counter() - inicio
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'Creación: {resultado.creados} productos en {creacion:.2f}s '
+                          f'({resultado.creados / creacion:.0f} filas/s).')
+        self.stdout.write(f'Segunda carga (upsert): {segunda.actualizados} actualizados, '
+                          f'{segunda.sin_cambios} sin cambios en {upsert:.2f}s '
+                          f'({total / upsert:.0f} filas/s).')
+        self.stdout.write(self.style.SUCCESS('Cambios del benchmark deshechos.'))
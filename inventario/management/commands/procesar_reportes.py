@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventario import reportes, valorizacion
+from inventario.models import TrabajoReporte
+
+
+class Command(BaseCommand):
+    help = 'Procesa los reportes pendientes y recalcula la valorización de los productos modificados (worker en segundo plano).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help='Procesa la cola pendiente y termina.')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera cuando no hay trabajos.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Esperando reportes pendientes...')
+        while True:
+            reclamados = reportes.reclamar_vencidos()
+            if reclamados:
+                self.stdout.write(f'{reclamados} reporte(s) abandonado(s) devueltos a la cola.')
+            procesados = self.procesar_pendientes()
+            valorizados = valorizacion.actualizar()
+            if valorizados:
+                self.stdout.write(f'Valorización de {valorizados} producto(s) recalculada.')
+                procesados += valorizados
+            borrados = reportes.limpiar_reportes_vencidos()
+            if borrados:
+                self.stdout.write(f'{borrados} archivo(s) vencido(s) eliminados.')
+            if options['una_vez']:
+                break
+            if not procesados:
+                time.sleep(options['intervalo'])
+
+    def procesar_pendientes(self):
+        procesados = 0
+        for trabajo in TrabajoReporte.objects.filter(estado='PENDIENTE').order_by('creado'):
+            try:
+                if reportes.procesar_trabajo(trabajo):
+                    procesados += 1
+                    self.stdout.write(self.style.SUCCESS(f'Reporte {trabajo.pk} generado.'))
+            except Exception as exc:
+                self.stderr.write(f'Reporte {trabajo.pk} fallo: {exc}')
+        return procesados
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from inventario import busqueda
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de texto completo de productos.'
+
+    def handle(self, *args, **options):
+        busqueda.crear_indice()
+        total = busqueda.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f'Índice de búsqueda reconstruido ({total} productos).'))
@@ -0,0 +1,271 @@
+import datetime
+import heapq
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from inventario import alertas, busqueda, cambios, catalogo, lotes, precios, ubicaciones, valorizacion
+from inventario.models import (
+    Categoria, Lote, MovimientoInventario, PrecioCompra, Producto, StockUbicacion, VersionInventario,
+)
+from inventario.stock import SIGNO_MOVIMIENTO, UBICACIONES_MOVIMIENTO
+
+ARTICULOS = [
+    'Perno', 'Tuerca', 'Golilla', 'Rodamiento', 'Filtro de aceite', 'Filtro de aire', 'Correa',
+    'Manguera', 'Válvula', 'Empaquetadura', 'Disco de corte', 'Electrodo', 'Guante', 'Casco',
+    'Cable', 'Fusible', 'Relé', 'Sensor', 'Bomba', 'Cilindro hidráulico', 'Lubricante', 'Soldadura',
+]
+MEDIDAS = ['M6', 'M8', 'M10', 'M12', '1/4"', '3/8"', '1/2"', '3/4"', '10 mm', '25 mm', 'Talla L', '5 L', '20 L']
+MATERIALES = ['acero', 'inoxidable', 'bronce', 'nitrilo', 'PVC', 'galvanizado', 'alta presión', 'industrial']
+PROYECTOS = ['Mantención locomotora 12', 'Overhaul 2104', 'Taller de ejes', 'Revisión frenos', 'Línea norte']
+TIPOS = ['ENTRADA', 'SALIDA', 'SALIDA', 'USO_PROYECTO', 'TRANSFERENCIA']
+
+
+class Command(BaseCommand):
+    help = ('Genera datos sintéticos realistas (categorías, productos, precios y movimientos) '
+            'con inserciones masivas, para pruebas de rendimiento.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=10000)
+        parser.add_argument('--categorias', type=int, default=40)
+        parser.add_argument('--movimientos', type=int, default=100000)
+        parser.add_argument('--precios', type=int, default=3, help='Precios de compra promedio por producto.')
+        parser.add_argument('--dias', type=int, default=365, help='Días de historia hacia atrás.')
+        parser.add_argument('--semilla', type=int, default=42, help='Semilla aleatoria, para datos reproducibles.')
+        parser.add_argument('--lote', type=int, default=5000)
+        parser.add_argument('--prefijo', default='SEED', help='Prefijo de los códigos de producto generados.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['semilla'])
+        self.lote = options['lote']
+        prefijo = options['prefijo']
+        if Producto.objects.filter(codigo__startswith=f'{prefijo}-').exists():
+            raise CommandError(f'Ya hay productos con el prefijo {prefijo}-; use otro --prefijo.')
+
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            categorias = self.crear_categorias(options['categorias'], prefijo)
+            productos = self.crear_productos(options['productos'], prefijo, categorias, options['dias'])
+            self.crear_precios(productos, options['precios'], options['dias'])
+            movimientos = self.crear_movimientos(productos, options['movimientos'], options['dias'])
+            # Las inserciones masivas no emiten señales: se recalcula todo lo derivado
+            ids = Producto.objects.filter(codigo__startswith=f'{prefijo}-')
+            lotes.actualizar_vencimiento(ids)
+            precios.actualizar(ids)
+            alertas.recalcular(ids)
+            cambios.registrar({
+                cambios.CATEGORIA: [categoria.pk for categoria in categorias],
+                cambios.PRODUCTO: [pk for pk, _ in productos],
+                cambios.MOVIMIENTO: MovimientoInventario.objects.filter(producto__in=ids).values_list('pk', flat=True),
+            })
+            VersionInventario.incrementar()
+            valorizacion.invalidar(ids, crear=True)
+            catalogo.invalidar_productos()
+            catalogo.invalidar_categorias()
+        busqueda.reconstruir()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(categorias)} categorías, {len(productos)} productos y {movimientos} movimientos '
+            f'generados en {time.perf_counter() - inicio:.1f}s.'
+        ))
+
+    def crear_categorias(self, cantidad, prefijo):
+        nombres = [f'{prefijo} {articulo}' for articulo in ARTICULOS]
+        nombres += [f'{prefijo} Grupo {i}' for i in range(max(cantidad - len(nombres), 0))]
+        Categoria.objects.bulk_create([Categoria(nombre=n) for n in nombres[:cantidad]], ignore_conflicts=True)
+        return list(Categoria.objects.filter(nombre__in=nombres[:cantidad]))
+
+    def crear_productos(self, cantidad, prefijo, categorias, dias):
+        hoy = timezone.localdate()
+        nuevos = []
+        for i in range(cantidad):
+            articulo = self.rng.choice(ARTICULOS)
+            umbral = self.rng.choice([5, 10, 20, 50])
+            nuevos.append(Producto(
+                codigo=f'{prefijo}-{i:07d}',
+                nombre=f'{articulo} {self.rng.choice(MEDIDAS)} {self.rng.choice(MATERIALES)}',
+                descripcion=f'{articulo} para mantención de material rodante.',
+                cantidad=self.rng.randint(0, 500),
+                ubicacion=f'Bodega {self.rng.choice("ABCD")}-{self.rng.randint(1, 40)}',
+                umbral_stock_bajo=umbral,
+                # Uno de cada cinco productos es perecible
+                fecha_vencimiento=(
+                    hoy + datetime.timedelta(days=self.rng.randint(-30, dias)) if self.rng.random() < 0.2 else None
+                ),
+            ))
+        Producto.objects.bulk_create(nuevos, batch_size=self.lote)
+        filas = list(
+            Producto.objects.filter(codigo__startswith=f'{prefijo}-').order_by('pk')
+            .values_list('pk', 'cantidad', 'ubicacion', 'fecha_vencimiento')
+        )
+        # Ubicacion principal de cada producto (ver ubicaciones.py)
+        ids = ubicaciones.ids_por_nombre({ubicacion for _, _, ubicacion, _ in filas}, crear=True)
+        self.principales = {pk: ids[ubicacion] for pk, _, ubicacion, _ in filas}
+        self.vencimientos = {pk: fecha for pk, _, _, fecha in filas}
+        productos = [(pk, cantidad) for pk, cantidad, _, _ in filas]
+
+        if categorias:
+            through = Producto.categorias.through
+            through.objects.bulk_create(
+                [
+                    through(producto_id=pk, categoria_id=categoria.pk)
+                    for pk, _ in productos
+                    for categoria in self.rng.sample(categorias, k=min(len(categorias), self.rng.randint(1, 3)))
+                ],
+                batch_size=self.lote,
+            )
+        return productos
+
+    def crear_precios(self, productos, por_producto, dias):
+        hoy = timezone.localdate()
+        nuevos = []
+        for pk, _ in productos:
+            base = Decimal(self.rng.randint(500, 200000))
+            for _ in range(self.rng.randint(max(por_producto - 2, 0), por_producto + 2)):
+                variacion = Decimal(self.rng.randint(85, 120)) / 100
+                nuevos.append(PrecioCompra(
+                    producto_id=pk,
+                    precio=(base * variacion).quantize(Decimal('0.01')),
+                    fecha_compra=hoy - datetime.timedelta(days=self.rng.randint(0, dias)),
+                ))
+            if len(nuevos) >= self.lote:
+                PrecioCompra.objects.bulk_create(nuevos)
+                nuevos = []
+        PrecioCompra.objects.bulk_create(nuevos)
+
+    def crear_movimientos(self, productos, cantidad, dias):
+        """Inserta los movimientos en orden cronologico sin dejar stock negativo.
+
+        El stock inicial de cada producto se toma como el saldo antes del
+        primer movimiento, en su ubicacion principal, y al final se guarda el
+        saldo resultante del producto y de cada ubicacion. Las transferencias
+        llevan stock de la ubicacion principal a otra. El stock inicial es un
+        lote con el vencimiento del producto, cada entrada crea un lote (con
+        vencimiento si el producto es perecible) y las salidas los consumen en
+        orden FEFO, como lotes.consumir.
+        """
+        if not productos:
+            return 0
+        en_ubicacion = {(pk, self.principales[pk]): cantidad for pk, cantidad in productos}
+        otras = sorted(set(self.principales.values()))
+        # [producto, codigo, cantidad inicial, saldo, vencimiento]; colas FEFO de (vencimiento, indice)
+        nuevos_lotes = []
+        colas = {}
+        for pk, cantidad_inicial in productos:
+            colas[pk] = []
+            if cantidad_inicial:
+                self.agregar_lote(nuevos_lotes, colas[pk], pk, lotes.CODIGO_INICIAL, cantidad_inicial, self.vencimientos[pk])
+        entradas = []
+        ahora = timezone.now()
+        usuarios = list(User.objects.values_list('pk', flat=True)[:20]) or [None]
+        saldo = dict(productos)
+        pks = list(saldo)
+        # Unos pocos productos concentran la mayor parte de los movimientos
+        pesos = [1 / (i + 1) for i in range(len(pks))]
+        elegidos = self.rng.choices(pks, weights=pesos, k=cantidad)
+        instantes = sorted(ahora - datetime.timedelta(seconds=self.rng.uniform(0, dias * 86400)) for _ in range(cantidad))
+
+        meta = MovimientoInventario._meta
+        campos = [
+            'producto', 'tipo_movimiento', 'cantidad', 'proyecto', 'observaciones',
+            'ubicacion_origen', 'ubicacion_destino', 'fecha', 'usuario',
+        ]
+        columnas = ', '.join(connection.ops.quote_name(meta.get_field(c).column) for c in campos)
+        sql = (f'INSERT INTO {connection.ops.quote_name(meta.db_table)} ({columnas}) '
+               f'VALUES ({", ".join(["%s"] * len(campos))})')
+        filas = []
+        with connection.cursor() as cursor:
+            for pk, instante in zip(elegidos, instantes):
+                tipo = self.rng.choice(TIPOS)
+                unidades = self.rng.randint(1, 25)
+                principal = self.principales[pk]
+                destino = self.rng.choice(otras) if tipo == 'TRANSFERENCIA' else principal
+                if tipo == 'TRANSFERENCIA' and destino == principal:
+                    tipo = 'ENTRADA'
+                # Las salidas y transferencias salen de la ubicacion principal
+                if UBICACIONES_MOVIMIENTO[tipo][0] and en_ubicacion[pk, principal] < unidades:
+                    tipo, destino = 'ENTRADA', principal
+                usa_origen, usa_destino = UBICACIONES_MOVIMIENTO[tipo]
+                saldo[pk] += SIGNO_MOVIMIENTO[tipo] * unidades
+                if usa_origen:
+                    en_ubicacion[pk, principal] -= unidades
+                if usa_destino:
+                    en_ubicacion[pk, destino] = en_ubicacion.get((pk, destino), 0) + unidades
+                if tipo == 'ENTRADA':
+                    vencimiento = (
+                        instante.date() + datetime.timedelta(days=self.rng.randint(30, 365))
+                        if self.vencimientos[pk] else None
+                    )
+                    entradas.append(self.agregar_lote(nuevos_lotes, colas[pk], pk, None, unidades, vencimiento))
+                elif SIGNO_MOVIMIENTO[tipo] < 0:
+                    self.consumir_fefo(nuevos_lotes, colas[pk], unidades)
+                filas.append((
+                    pk, tipo, unidades,
+                    self.rng.choice(PROYECTOS) if tipo == 'USO_PROYECTO' else None,
+                    None,
+                    principal if usa_origen else None,
+                    destino if usa_destino else None,
+                    connection.ops.adapt_datetimefield_value(instante),
+                    self.rng.choice(usuarios),
+                ))
+                if len(filas) >= self.lote:
+                    cursor.executemany(sql, filas)
+                    filas = []
+            if filas:
+                cursor.executemany(sql, filas)
+
+        # Un UPDATE por saldo distinto, como en importacion._importar_lote
+        por_saldo = {}
+        for pk, cantidad_final in saldo.items():
+            por_saldo.setdefault(cantidad_final, []).append(pk)
+        for cantidad_final, ids in por_saldo.items():
+            for i in range(0, len(ids), self.lote):
+                Producto.objects.filter(pk__in=ids[i:i + self.lote]).update(cantidad=cantidad_final)
+        StockUbicacion.objects.bulk_create(
+            [
+                StockUbicacion(producto_id=pk, ubicacion_id=ubicacion_id, cantidad=cantidad_final)
+                for (pk, ubicacion_id), cantidad_final in en_ubicacion.items() if cantidad_final
+            ],
+            batch_size=self.lote,
+        )
+        ubicaciones.recalcular_totales(otras)
+
+        # Los productos son nuevos: sus entradas, por id, estan en el orden en que se generaron
+        movimientos_entrada = (
+            MovimientoInventario.objects.filter(producto_id__in=pks, tipo_movimiento='ENTRADA')
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        por_lote = dict(zip(entradas, movimientos_entrada.iterator(chunk_size=self.lote)))
+        Lote.objects.bulk_create(
+            [
+                Lote(
+                    producto_id=pk, codigo=codigo or lotes.codigo_entrada(por_lote[i]),
+                    cantidad=restante, cantidad_inicial=inicial, fecha_vencimiento=vencimiento,
+                    movimiento_id=por_lote.get(i),
+                )
+                for i, (pk, codigo, inicial, restante, vencimiento) in enumerate(nuevos_lotes)
+            ],
+            batch_size=self.lote,
+        )
+        return cantidad
+
+    def agregar_lote(self, nuevos_lotes, cola, pk, codigo, cantidad, vencimiento):
+        indice = len(nuevos_lotes)
+        nuevos_lotes.append([pk, codigo, cantidad, cantidad, vencimiento])
+        heapq.heappush(cola, (vencimiento or datetime.date.max, indice))
+        return indice
+
+    def consumir_fefo(self, nuevos_lotes, cola, cantidad):
+        while cantidad:
+            _, indice = cola[0]
+            lote = nuevos_lotes[indice]
+            descuento = min(lote[3], cantidad)
+            lote[3] -= descuento
+            cantidad -= descuento
+            if not lote[3]:
+                heapq.heappop(cola)
@@ -0,0 +1,147 @@
+"""Registro en memoria de tiempos y consultas por vista.
+
+``InstrumentacionMiddleware`` alimenta el registro en cada peticion y
+``cache.leer`` los aciertos y fallos del cache; las vistas de metricas lo
+exponen como JSON o en formato de texto de Prometheus. Cada proceso lleva su
+propio registro.
+"""
+import math
+import threading
+
+# Limites superiores de cada balde
+BALDES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+BALDES_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, math.inf)
+
+
+class Histograma:
+    def __init__(self, baldes):
+        self.baldes = baldes
+        self.conteos = [0] * len(baldes)
+        self.suma = 0
+        self.total = 0
+        self.maximo = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.baldes):
+            if valor <= limite:
+                self.conteos[i] += 1
+                break
+        self.suma += valor
+        self.total += 1
+        self.maximo = max(self.maximo, valor)
+
+    def percentil(self, p):
+        """Aproximacion: limite superior del balde donde cae el percentil ``p``."""
+        if not self.total:
+            return 0
+        objetivo = math.ceil(self.total * p / 100)
+        acumulado = 0
+        for limite, conteo in zip(self.baldes, self.conteos):
+            acumulado += conteo
+            if acumulado >= objetivo:
+                return self.maximo if math.isinf(limite) else min(limite, self.maximo)
+        return self.maximo
+
+    def acumulados(self):
+        acumulado = 0
+        for limite, conteo in zip(self.baldes, self.conteos):
+            acumulado += conteo
+            yield limite, acumulado
+
+    def as_dict(self):
+        return {
+            'total': self.total,
+            'suma': self.suma,
+            'promedio': self.suma / self.total if self.total else 0,
+            'maximo': self.maximo,
+            'p50': self.percentil(50),
+            'p95': self.percentil(95),
+            'p99': self.percentil(99),
+        }
+
+
+class MetricasVista:
+    def __init__(self):
+        self.duracion = Histograma(BALDES_SEGUNDOS)
+        self.consultas = Histograma(BALDES_CONSULTAS)
+        self.duracion_db = Histograma(BALDES_SEGUNDOS)
+
+
+class Registro:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vistas = {}
+        self._cache = {}
+
+    def registrar(self, vista, duracion, consultas, duracion_db):
+        with self._lock:
+            metricas = self._vistas.get(vista)
+            if metricas is None:
+                metricas = self._vistas[vista] = MetricasVista()
+            metricas.duracion.observar(duracion)
+            metricas.consultas.observar(consultas)
+            metricas.duracion_db.observar(duracion_db)
+
+    def contar_cache(self, espacio, acierto):
+        with self._lock:
+            conteo = self._cache.setdefault(espacio, [0, 0])
+            conteo[0 if acierto else 1] += 1
+
+    def reiniciar(self):
+        with self._lock:
+            self._vistas = {}
+            self._cache = {}
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                vista: {
+                    'duracion_segundos': m.duracion.as_dict(),
+                    'consultas': m.consultas.as_dict(),
+                    'duracion_db_segundos': m.duracion_db.as_dict(),
+                }
+                for vista, m in sorted(self._vistas.items())
+            }
+
+    def cache_dict(self):
+        with self._lock:
+            return {
+                espacio: {
+                    'aciertos': aciertos,
+                    'fallos': fallos,
+                    'tasa_aciertos': aciertos / (aciertos + fallos) if aciertos + fallos else 0,
+                }
+                for espacio, (aciertos, fallos) in sorted(self._cache.items())
+            }
+
+    def prometheus(self):
+        lineas = []
+        series = [
+            ('inventario_vista_duracion_segundos', 'Tiempo total de respuesta por vista.', 'duracion'),
+            ('inventario_vista_consultas', 'Consultas SQL por petición y vista.', 'consultas'),
+            ('inventario_vista_duracion_db_segundos', 'Tiempo en la base de datos por vista.', 'duracion_db'),
+        ]
+        with self._lock:
+            for nombre, ayuda, atributo in series:
+                lineas.append(f'# HELP {nombre} {ayuda}')
+                lineas.append(f'# TYPE {nombre} histogram')
+                for vista, metricas in sorted(self._vistas.items()):
+                    histograma = getattr(metricas, atributo)
+                    etiqueta = vista.replace('\\', '\\\\').replace('"', '\\"')
+                    for limite, acumulado in histograma.acumulados():
+                        le = '+Inf' if math.isinf(limite) else repr(limite)
+                        lineas.append(f'{nombre}_bucket{{vista="{etiqueta}",le="{le}"}} {acumulado}')
+                    lineas.append(f'{nombre}_sum{{vista="{etiqueta}"}} {histograma.suma}')
+                    lineas.append(f'{nombre}_count{{vista="{etiqueta}"}} {histograma.total}')
+            for nombre, ayuda, indice in [
+                ('inventario_cache_aciertos_total', 'Lecturas servidas desde el cache.', 0),
+                ('inventario_cache_fallos_total', 'Lecturas que tuvieron que ir a la base.', 1),
+            ]:
+                lineas.append(f'# HELP {nombre} {ayuda}')
+                lineas.append(f'# TYPE {nombre} counter')
+                for espacio, conteo in sorted(self._cache.items()):
+                    lineas.append(f'{nombre}{{espacio="{espacio}"}} {conteo[indice]}')
+        return '\n'.join(lineas) + '\n'
+
+
+registro = Registro()
@@ -0,0 +1,143 @@
+import contextvars
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import routers
+from .metricas import registro
+
+# Contador de la peticion en curso; el ContextVar pasa a los hilos de sync_to_async
+_contador_actual = contextvars.ContextVar('inventario_contador_consultas', default=None)
+
+
+class ContadorConsultas:
+    """execute_wrapper que cuenta las consultas y suma su duracion."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.duracion = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duracion += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+def _contar(execute, sql, params, many, context):
+    contador = _contador_actual.get()
+    if contador is None:
+        return execute(sql, params, many, context)
+    return contador(execute, sql, params, many, context)
+
+
+def _instalar_contador(connection, **kwargs):
+    if _contar not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_contar)
+
+
+# Las conexiones son locales a cada hilo y con ASGI las consultas corren en los
+# hilos de sync_to_async: el contador se instala en cada conexion nueva
+connection_created.connect(_instalar_contador, dispatch_uid='inventario_contador_consultas')
+
+
+class InstrumentacionMiddleware:
+    """Registra por vista el tiempo de respuesta, las consultas SQL y el tiempo en la base.
+
+    Las consultas de respuestas en streaming que ocurren al enviar el cuerpo
+    no se cuentan, porque ya salieron del middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Conexiones abiertas antes de cargar el middleware
+        for alias in connections:
+            _instalar_contador(connections[alias])
+        contador = ContadorConsultas()
+        token = _contador_actual.set(contador)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _contador_actual.reset(token)
+        self.registrar(request, time.perf_counter() - inicio, contador)
+        return response
+
+    async def __acall__(self, request):
+        contador = ContadorConsultas()
+        token = _contador_actual.set(contador)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _contador_actual.reset(token)
+        self.registrar(request, time.perf_counter() - inicio, contador)
+        return response
+
+    def registrar(self, request, duracion, contador):
+        match = getattr(request, 'resolver_match', None)
+        vista = (match.view_name or match._func_path) if match else 'sin_ruta'
+        registro.registrar(vista, duracion, contador.consultas, contador.duracion)
+
+
+class ReplicaMiddleware:
+    """Envia a la replica las lecturas de peticiones GET/HEAD (ver routers.py).
+
+    Despues de una peticion que escribe, la cookie ``COOKIE`` fija las
+    lecturas de ese navegador al primario durante
+    ``REPLICA_LECTURA_PROPIA_SEGUNDOS``. Debe ir antes de
+    ``SessionMiddleware`` para que la sesion tambien siga la regla.
+    """
+    COOKIE = 'inventario_primario'
+    METODOS_LECTURA = ('GET', 'HEAD', 'OPTIONS')
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.activo = routers.ALIAS_REPLICA in settings.DATABASES
+        self.segundos = getattr(settings, 'REPLICA_LECTURA_PROPIA_SEGUNDOS', 10)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.activo:
+            return self.get_response(request)
+        lectura = request.method in self.METODOS_LECTURA
+        # La marca es un ContextVar: tambien la ven las consultas en sync_to_async
+        token = routers.leer_de_replica(lectura and self.COOKIE not in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.restaurar(token)
+        return self.fijar_primario(request, response)
+
+    async def __acall__(self, request):
+        if not self.activo:
+            return await self.get_response(request)
+        token = routers.leer_de_replica(request.method in self.METODOS_LECTURA and self.COOKIE not in request.COOKIES)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.restaurar(token)
+        return self.fijar_primario(request, response)
+
+    def fijar_primario(self, request, response):
+        if request.method not in self.METODOS_LECTURA:
+            response.set_cookie(self.COOKIE, '1', max_age=self.segundos, httponly=True, samesite='Lax')
+        return response
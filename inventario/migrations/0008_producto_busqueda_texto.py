@@ -0,0 +1,48 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:41
+
+from django.db import migrations
+
+VECTOR_PG = (
+    "to_tsvector('spanish', coalesce(codigo, '') || ' ' || "
+    "coalesce(nombre, '') || ' ' || coalesce(descripcion, ''))"
+)
+
+
+def crear_indice_busqueda(apps, schema_editor):
+    conn = schema_editor.connection
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS inventario_producto_fts USING fts5("
+                "codigo, nombre, descripcion, "
+                "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            cursor.execute(
+                "INSERT INTO inventario_producto_fts(rowid, codigo, nombre, descripcion) "
+                "SELECT id, codigo, nombre, descripcion FROM inventario_producto"
+            )
+        elif conn.vendor == 'postgresql':
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS inventario_producto_busqueda_gin "
+                f"ON inventario_producto USING GIN ({VECTOR_PG})"
+            )
+
+
+def eliminar_indice_busqueda(apps, schema_editor):
+    conn = schema_editor.connection
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            cursor.execute("DROP TABLE IF EXISTS inventario_producto_fts")
+        elif conn.vendor == 'postgresql':
+            cursor.execute("DROP INDEX IF EXISTS inventario_producto_busqueda_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0007_producto_indices_listado'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice_busqueda, eliminar_indice_busqueda),
+    ]
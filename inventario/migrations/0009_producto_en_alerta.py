@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:48
+
+from django.db import migrations, models
+
+
+def marcar_alertas(apps, schema_editor):
+    Producto = apps.get_model('inventario', 'Producto')
+    Producto.objects.filter(cantidad__lte=models.F('umbral_stock_bajo')).update(en_alerta=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_producto_busqueda_texto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='en_alerta',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(marcar_alertas, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('en_alerta', True)), fields=['cantidad', 'id'], name='producto_alerta_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('fecha_vencimiento__isnull', False)), fields=['fecha_vencimiento', 'id'], name='producto_vencimiento_idx'),
+        ),
+    ]
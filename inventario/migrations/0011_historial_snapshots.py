@@ -0,0 +1,58 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0010_movimiento_indices_historial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CierreDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('movimientos', models.PositiveIntegerField(default=0)),
+                ('procesado', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SnapshotStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('cantidad', models.IntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResumenMovimientosDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo_movimiento', models.CharField(choices=[('ENTRADA', 'Entrada'), ('SALIDA', 'Salida'), ('TRANSFERENCIA', 'Transferencia'), ('USO_PROYECTO', 'Uso en Proyecto')], max_length=20)),
+                ('proyecto', models.CharField(blank=True, default='', max_length=100)),
+                ('cantidad', models.PositiveBigIntegerField(default=0)),
+                ('movimientos', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['proyecto', 'fecha'], name='resumen_proyecto_fecha_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resumenmovimientosdiario',
+            constraint=models.UniqueConstraint(fields=('fecha', 'tipo_movimiento', 'proyecto'), name='resumen_dia_tipo_proyecto_unico'),
+        ),
+        migrations.AddField(
+            model_name='snapshotstock',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='inventario.producto'),
+        ),
+        migrations.AddConstraint(
+            model_name='snapshotstock',
+            constraint=models.UniqueConstraint(fields=('producto', 'fecha'), name='snapshot_producto_fecha_unico'),
+        ),
+    ]
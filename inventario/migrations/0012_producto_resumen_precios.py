@@ -0,0 +1,73 @@
+# Generated by Django 5.0.6 on 2026-10-18 13:05
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, Max, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Round
+
+
+def resumir_precios(apps, schema_editor):
+    Producto = apps.get_model('inventario', 'Producto')
+    PrecioCompra = apps.get_model('inventario', 'PrecioCompra')
+    precios = PrecioCompra.objects.filter(producto=OuterRef('pk'))
+    ultimo = precios.order_by('-fecha_compra', '-id')
+    decimal = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def agregado(expresion, output_field=decimal):
+        return Subquery(
+            precios.order_by().values('producto').annotate(valor=expresion).values('valor'),
+            output_field=output_field,
+        )
+
+    Producto.objects.update(
+        precio_actual=Subquery(ultimo.values('precio')[:1]),
+        fecha_precio_actual=Subquery(ultimo.values('fecha_compra')[:1]),
+        precio_minimo=agregado(Min('precio')),
+        precio_maximo=agregado(Max('precio')),
+        precio_promedio=agregado(Round(Avg('precio'), 2)),
+        precios_registrados=Coalesce(agregado(Count('id'), models.IntegerField()), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0011_historial_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='fecha_precio_actual',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='precio_actual',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='precio_maximo',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='precio_minimo',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='precio_promedio',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='precios_registrados',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='preciocompra',
+            index=models.Index(fields=['producto', 'fecha_compra', 'id'], name='precio_producto_fecha_idx'),
+        ),
+        migrations.RunPython(resumir_precios, migrations.RunPython.noop),
+    ]
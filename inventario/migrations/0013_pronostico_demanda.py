@@ -0,0 +1,26 @@
+# Generated by Django 5.0.6 on 2026-10-18 13:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0012_producto_resumen_precios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PronosticoDemanda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consumo_diario', models.FloatField()),
+                ('desviacion_diaria', models.FloatField()),
+                ('dias_historial', models.PositiveIntegerField()),
+                ('punto_reorden', models.PositiveIntegerField()),
+                ('calculado', models.DateTimeField()),
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pronostico', to='inventario.producto')),
+            ],
+        ),
+    ]
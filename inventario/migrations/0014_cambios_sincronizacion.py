@@ -0,0 +1,41 @@
+# Generated by Django 5.0.6 on 2026-10-18 13:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def registrar_existentes(apps, schema_editor):
+    # El catalogo actual es la primera sincronizacion de cada dispositivo;
+    # el historial de movimientos anterior no se registra
+    Cambio = apps.get_model('inventario', 'Cambio')
+    for modelo, nombre in (('categoria', 'Categoria'), ('producto', 'Producto')):
+        ids = apps.get_model('inventario', nombre).objects.order_by('pk').values_list('pk', flat=True)
+        Cambio.objects.bulk_create(
+            (Cambio(modelo=modelo, objeto_id=pk) for pk in ids.iterator(chunk_size=5000)),
+            batch_size=5000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0013_pronostico_demanda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cambio',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('modelo', models.CharField(choices=[('producto', 'Producto'), ('categoria', 'Categoría'), ('movimiento', 'Movimiento')], max_length=20)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('eliminado', models.BooleanField(default=False)),
+                ('registrado', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='cambio',
+            constraint=models.UniqueConstraint(fields=('modelo', 'objeto_id'), name='cambio_modelo_objeto_unico'),
+        ),
+        migrations.RunPython(registrar_existentes, migrations.RunPython.noop),
+    ]
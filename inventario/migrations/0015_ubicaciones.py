@@ -0,0 +1,124 @@
+# Generated by Django 5.0.6 on 2026-10-18 13:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Concat
+
+TAMANO_LOTE = 5000
+NOTA_TRANSFERENCIA = '[Transferencia anterior a las ubicaciones, registrada como entrada]'
+
+
+def poblar_ubicaciones(apps, schema_editor):
+    Producto = apps.get_model('inventario', 'Producto')
+    Ubicacion = apps.get_model('inventario', 'Ubicacion')
+    StockUbicacion = apps.get_model('inventario', 'StockUbicacion')
+    MovimientoInventario = apps.get_model('inventario', 'MovimientoInventario')
+    Cambio = apps.get_model('inventario', 'Cambio')
+    Resumen = apps.get_model('inventario', 'ResumenMovimientosDiario')
+
+    # Cada texto de ubicacion distinto pasa a ser una Ubicacion y todo el
+    # stock actual queda en la ubicacion principal de su producto
+    productos = [
+        (pk, (texto or '').strip()[:100] or 'Sin ubicación', cantidad)
+        for pk, texto, cantidad in Producto.objects.order_by('pk').values_list('pk', 'ubicacion', 'cantidad')
+    ]
+    Ubicacion.objects.bulk_create(
+        [Ubicacion(nombre=n) for n in sorted({n for _, n, _ in productos})], batch_size=TAMANO_LOTE
+    )
+    ids = dict(Ubicacion.objects.values_list('nombre', 'id'))
+    StockUbicacion.objects.bulk_create(
+        [StockUbicacion(producto_id=pk, ubicacion_id=ids[n], cantidad=c) for pk, n, c in productos if c],
+        batch_size=TAMANO_LOTE,
+    )
+    totales = {}
+    por_ubicacion = {}
+    for pk, nombre, cantidad in productos:
+        por_ubicacion.setdefault(ids[nombre], []).append(pk)
+        if cantidad:
+            total = totales.setdefault(ids[nombre], [0, 0])
+            total[0] += cantidad
+            total[1] += 1
+    for ubicacion_id, (cantidad, con_stock) in totales.items():
+        Ubicacion.objects.filter(pk=ubicacion_id).update(cantidad=cantidad, productos=con_stock)
+
+    # Las transferencias antiguas sumaban stock sin origen ni destino: se
+    # registran como entradas en la ubicacion principal, con lo que el
+    # historial y los cierres diarios siguen cuadrando con el stock
+    transferencias = MovimientoInventario.objects.filter(tipo_movimiento='TRANSFERENCIA')
+    movidos = list(transferencias.values_list('pk', flat=True))
+    for ubicacion_id, pks in por_ubicacion.items():
+        for i in range(0, len(pks), TAMANO_LOTE):
+            transferencias.filter(producto_id__in=pks[i:i + TAMANO_LOTE]).update(
+                tipo_movimiento='ENTRADA',
+                ubicacion_destino_id=ubicacion_id,
+                observaciones=Case(
+                    When(Q(observaciones__isnull=True) | Q(observaciones=''), then=Value(NOTA_TRANSFERENCIA)),
+                    default=Concat(F('observaciones'), Value(' ' + NOTA_TRANSFERENCIA), output_field=models.TextField()),
+                    output_field=models.TextField(),
+                ),
+            )
+    # Los dispositivos deben volver a descargar los movimientos reclasificados (ver cambios.py)
+    for i in range(0, len(movidos), TAMANO_LOTE):
+        lote = movidos[i:i + TAMANO_LOTE]
+        Cambio.objects.filter(modelo='movimiento', objeto_id__in=lote).delete()
+        Cambio.objects.bulk_create([Cambio(modelo='movimiento', objeto_id=pk) for pk in lote])
+
+    for resumen in Resumen.objects.filter(tipo_movimiento='TRANSFERENCIA'):
+        entradas = Resumen.objects.filter(fecha=resumen.fecha, tipo_movimiento='ENTRADA', proyecto=resumen.proyecto)
+        if entradas.update(
+            cantidad=F('cantidad') + resumen.cantidad, movimientos=F('movimientos') + resumen.movimientos
+        ):
+            resumen.delete()
+        else:
+            resumen.tipo_movimiento = 'ENTRADA'
+            resumen.save(update_fields=['tipo_movimiento'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0014_cambios_sincronizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ubicacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True)),
+                ('cantidad', models.PositiveBigIntegerField(default=0, editable=False)),
+                ('productos', models.PositiveIntegerField(default=0, editable=False)),
+            ],
+            options={
+                'verbose_name_plural': 'ubicaciones',
+            },
+        ),
+        migrations.AddField(
+            model_name='movimientoinventario',
+            name='ubicacion_destino',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movimientos_entrada', to='inventario.ubicacion'),
+        ),
+        migrations.AddField(
+            model_name='movimientoinventario',
+            name='ubicacion_origen',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movimientos_salida', to='inventario.ubicacion'),
+        ),
+        migrations.CreateModel(
+            name='StockUbicacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('producto', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='stock_ubicaciones', to='inventario.producto')),
+                ('ubicacion', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='stock', to='inventario.ubicacion')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ubicacion', 'producto'], name='stock_ubicacion_producto_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stockubicacion',
+            constraint=models.UniqueConstraint(fields=('producto', 'ubicacion'), name='stock_producto_ubicacion_unico'),
+        ),
+        migrations.RunPython(poblar_ubicaciones, migrations.RunPython.noop),
+    ]
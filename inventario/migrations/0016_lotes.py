@@ -0,0 +1,59 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+TAMANO_LOTE = 5000
+
+
+def crear_lotes_iniciales(apps, schema_editor):
+    Producto = apps.get_model('inventario', 'Producto')
+    Lote = apps.get_model('inventario', 'Lote')
+    Cambio = apps.get_model('inventario', 'Cambio')
+
+    # El stock actual de cada producto queda en un lote inicial con el
+    # vencimiento que tenia el producto
+    con_stock = Producto.objects.filter(cantidad__gt=0).order_by('pk')
+    Lote.objects.bulk_create(
+        (
+            Lote(producto_id=pk, codigo='INICIAL', cantidad=cantidad, cantidad_inicial=cantidad, fecha_vencimiento=fecha)
+            for pk, cantidad, fecha in con_stock.values_list('pk', 'cantidad', 'fecha_vencimiento').iterator()
+        ),
+        batch_size=TAMANO_LOTE,
+    )
+    # Sin stock no hay lote que venza: el vencimiento del producto ahora se deriva de sus lotes
+    sin_stock = Producto.objects.filter(cantidad=0, fecha_vencimiento__isnull=False)
+    cambiados = list(sin_stock.values_list('pk', flat=True))
+    sin_stock.update(fecha_vencimiento=None)
+    for i in range(0, len(cambiados), TAMANO_LOTE):
+        lote = cambiados[i:i + TAMANO_LOTE]
+        Cambio.objects.filter(modelo='producto', objeto_id__in=lote).delete()
+        Cambio.objects.bulk_create([Cambio(modelo='producto', objeto_id=pk) for pk in lote])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0015_ubicaciones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=50)),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('cantidad_inicial', models.PositiveIntegerField(default=0)),
+                ('fecha_vencimiento', models.DateField(blank=True, null=True)),
+                ('creado', models.DateTimeField(default=django.utils.timezone.now)),
+                ('movimiento', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lote', to='inventario.movimientoinventario')),
+                ('producto', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='lotes', to='inventario.producto')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('cantidad__gt', 0)), fields=['producto', 'fecha_vencimiento', 'id'], name='lote_fefo_idx'), models.Index(condition=models.Q(('cantidad__gt', 0), ('fecha_vencimiento__isnull', False)), fields=['fecha_vencimiento', 'id'], name='lote_vencimiento_idx')],
+            },
+        ),
+        migrations.RunPython(crear_lotes_iniciales, migrations.RunPython.noop),
+    ]
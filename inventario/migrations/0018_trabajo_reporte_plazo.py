@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0017_token_api'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoreporte',
+            name='intentos',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trabajoreporte',
+            name='tomado',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
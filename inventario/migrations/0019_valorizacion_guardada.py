@@ -0,0 +1,43 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def crear_pendientes(apps, schema_editor):
+    # Todos los productos quedan pendientes: el worker procesar_reportes los calcula
+    Producto = apps.get_model('inventario', 'Producto')
+    ValorizacionProducto = apps.get_model('inventario', 'ValorizacionProducto')
+    ids = Producto.objects.order_by('pk').values_list('pk', flat=True)
+    lote = []
+    for pk in ids.iterator(chunk_size=2000):
+        lote.append(ValorizacionProducto(producto_id=pk))
+        if len(lote) >= 2000:
+            ValorizacionProducto.objects.bulk_create(lote)
+            lote = []
+    ValorizacionProducto.objects.bulk_create(lote)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0018_trabajo_reporte_plazo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValorizacionProducto',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='valorizacion', serialize=False, to='inventario.producto')),
+                ('cantidad', models.IntegerField(default=0)),
+                ('costo_promedio', models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True)),
+                ('valor_promedio', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('valor_fifo', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('vigente', models.BooleanField(default=False)),
+                ('calculado', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('vigente', False)), fields=['producto'], name='valorizacion_pendiente_idx')],
+            },
+        ),
+        migrations.RunPython(crear_pendientes, migrations.RunPython.noop),
+    ]
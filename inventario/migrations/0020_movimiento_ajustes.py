@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0019_valorizacion_guardada'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movimientoinventario',
+            name='tipo_movimiento',
+            field=models.CharField(choices=[('ENTRADA', 'Entrada'), ('SALIDA', 'Salida'), ('TRANSFERENCIA', 'Transferencia'), ('USO_PROYECTO', 'Uso en Proyecto'), ('AJUSTE_ENTRADA', 'Ajuste (alta)'), ('AJUSTE_SALIDA', 'Ajuste (baja)')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='resumenmovimientosdiario',
+            name='tipo_movimiento',
+            field=models.CharField(choices=[('ENTRADA', 'Entrada'), ('SALIDA', 'Salida'), ('TRANSFERENCIA', 'Transferencia'), ('USO_PROYECTO', 'Uso en Proyecto'), ('AJUSTE_ENTRADA', 'Ajuste (alta)'), ('AJUSTE_SALIDA', 'Ajuste (baja)')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:13
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0020_movimiento_ajustes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(django.db.models.functions.text.Upper('ubicacion'), name='producto_ubicacion_mayus_idx'),
+        ),
+    ]
@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Upper
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class Categoria(models.Model):
     nombre = models.CharField(max_length=50, unique=True)
@@ -9,15 +11,87 @@ class Categoria(models.Model):
 
 
 
+#bodegas, pasillos o estantes; los totales los mantiene ubicaciones.py
+class Ubicacion(models.Model):
+    nombre = models.CharField(max_length=100, unique=True)
+    # Suma de StockUbicacion.cantidad y productos con stock en la ubicacion
+    cantidad = models.PositiveBigIntegerField(default=0, editable=False)
+    productos = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        verbose_name_plural = 'ubicaciones'
+
+    def __str__(self):
+        return self.nombre
+
+
 class Producto(models.Model):
     codigo = models.CharField(max_length=20, unique=True)
     nombre = models.CharField(max_length=100)
     descripcion = models.TextField(blank=True)
     cantidad = models.PositiveIntegerField(default=0)
+    # Ubicacion principal: donde entran y de donde salen los movimientos que no indican otra
     ubicacion = models.CharField(max_length=100)
+    # Vencimiento mas proximo de sus lotes con stock, mantenido por lotes.py
     fecha_vencimiento = models.DateField(null=True, blank=True)
     umbral_stock_bajo = models.PositiveIntegerField(default=5)  # umbral para alerta
     categorias = models.ManyToManyField(Categoria, blank=True)
+    # cantidad <= umbral_stock_bajo, mantenido en save() y en los UPDATE de stock (ver alertas.py)
+    en_alerta = models.BooleanField(default=False, editable=False)
+    # Resumen del historial de PrecioCompra, mantenido por precios.py
+    precio_actual = models.DecimalField(max_digits=10, decimal_places=2, null=True, editable=False)
+    fecha_precio_actual = models.DateField(null=True, editable=False)
+    precio_minimo = models.DecimalField(max_digits=10, decimal_places=2, null=True, editable=False)
+    precio_maximo = models.DecimalField(max_digits=10, decimal_places=2, null=True, editable=False)
+    precio_promedio = models.DecimalField(max_digits=10, decimal_places=2, null=True, editable=False)
+    precios_registrados = models.PositiveIntegerField(default=0, editable=False)
+
+    CAMPOS_PRECIO = (
+        'precio_actual', 'fecha_precio_actual', 'precio_minimo',
+        'precio_maximo', 'precio_promedio', 'precios_registrados',
+    )
+    # Mantenidos por los movimientos (stock.py) y los lotes (lotes.py)
+    CAMPOS_STOCK = ('cantidad', 'fecha_vencimiento', 'en_alerta')
+
+    class Meta:
+        # Indices para ordenar y paginar el listado por (campo, id)
+        indexes = [
+            models.Index(fields=['nombre', 'id'], name='producto_nombre_idx'),
+            models.Index(fields=['ubicacion', 'id'], name='producto_ubicacion_idx'),
+            # Filtro por prefijo de ubicacion sin distinguir mayusculas (BusquedaProductoForm)
+            models.Index(Upper('ubicacion'), name='producto_ubicacion_mayus_idx'),
+            models.Index(fields=['cantidad', 'id'], name='producto_cantidad_idx'),
+            # Indices parciales: solo contienen los productos que aparecen en cada alerta
+            models.Index(fields=['cantidad', 'id'], name='producto_alerta_idx', condition=models.Q(en_alerta=True)),
+            models.Index(fields=['fecha_vencimiento', 'id'], name='producto_vencimiento_idx',
+                         condition=models.Q(fecha_vencimiento__isnull=False)),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding:
+            # El resumen de precios y el stock se escriben solo desde precios.py y
+            # los movimientos: guardar un producto leido antes no debe pisarlos
+            update_fields = kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.CAMPOS_PRECIO + self.CAMPOS_STOCK
+            ]
+        if update_fields is None:
+            self.en_alerta = self.cantidad <= self.umbral_stock_bajo
+        elif 'cantidad' in update_fields:
+            self.en_alerta = self.cantidad <= self.umbral_stock_bajo
+            kwargs['update_fields'] = set(update_fields) | {'en_alerta'}
+        elif 'umbral_stock_bajo' in update_fields:
+            # Se compara la cantidad de la fila, no la leida con el objeto, con el
+            # umbral nuevo: en el UPDATE F('umbral_stock_bajo') seria el anterior
+            self.en_alerta = models.ExpressionWrapper(
+                models.Q(cantidad__lte=self.umbral_stock_bajo), output_field=models.BooleanField()
+            )
+            kwargs['update_fields'] = set(update_fields) | {'en_alerta'}
+        super().save(*args, **kwargs)
+        if isinstance(self.en_alerta, models.Expression):
+            self.refresh_from_db(fields=self.CAMPOS_STOCK)
+
     def __str__(self):
         return f"{self.codigo} - {self.nombre}"
 
@@ -30,6 +104,9 @@ class MovimientoInventario(models.Model):
         ('SALIDA', 'Salida'),
         ('TRANSFERENCIA', 'Transferencia'),
         ('USO_PROYECTO', 'Uso en Proyecto'),
+        # Correcciones de stock tras un conteo fisico (ver stock.py)
+        ('AJUSTE_ENTRADA', 'Ajuste (alta)'),
+        ('AJUSTE_SALIDA', 'Ajuste (baja)'),
     ]
 
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='movimientos')
@@ -39,16 +116,265 @@ class MovimientoInventario(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     proyecto = models.CharField(max_length=100, blank=True, null=True)
     observaciones = models.TextField(blank=True, null=True)
+    # Las entradas tienen destino, las salidas origen y las transferencias ambos (ver stock.py)
+    ubicacion_origen = models.ForeignKey(
+        Ubicacion, on_delete=models.PROTECT, null=True, blank=True, related_name='movimientos_salida'
+    )
+    ubicacion_destino = models.ForeignKey(
+        Ubicacion, on_delete=models.PROTECT, null=True, blank=True, related_name='movimientos_entrada'
+    )
+
+    class Meta:
+        # El historial se recorre por (fecha, id) descendente; cada filtro tiene
+        # su indice con el mismo orden para que la pagina siga siendo un rango del indice
+        indexes = [
+            models.Index(fields=['fecha', 'id'], name='movimiento_fecha_idx'),
+            models.Index(fields=['producto', 'fecha', 'id'], name='movimiento_producto_fecha_idx'),
+            models.Index(fields=['tipo_movimiento', 'fecha', 'id'], name='movimiento_tipo_fecha_idx'),
+            models.Index(fields=['usuario', 'fecha', 'id'], name='movimiento_usuario_fecha_idx'),
+            models.Index(fields=['proyecto', 'fecha', 'id'], name='movimiento_proyecto_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"{self.tipo_movimiento} - {self.producto.nombre} - {self.cantidad} unidades"
     
 
+#stock de cada producto en cada ubicacion; su suma es Producto.cantidad
+class StockUbicacion(models.Model):
+    # Los indices compuestos cubren ambas claves foraneas
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='stock_ubicaciones', db_index=False)
+    ubicacion = models.ForeignKey(Ubicacion, on_delete=models.PROTECT, related_name='stock', db_index=False)
+    cantidad = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'ubicacion'], name='stock_producto_ubicacion_unico'),
+        ]
+        indexes = [
+            # Tablero de una ubicacion: sus productos en orden, por rango del indice
+            models.Index(fields=['ubicacion', 'producto'], name='stock_ubicacion_producto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} en {self.ubicacion_id}: {self.cantidad}"
+
+
+#lotes de cada producto; los que tienen stock suman Producto.cantidad (ver lotes.py)
+class Lote(models.Model):
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='lotes', db_index=False)
+    codigo = models.CharField(max_length=50)
+    cantidad = models.PositiveIntegerField(default=0)  # saldo del lote
+    cantidad_inicial = models.PositiveIntegerField(default=0)
+    fecha_vencimiento = models.DateField(null=True, blank=True)
+    # Entrada que creo el lote; los lotes de stock inicial o de ajustes no tienen
+    movimiento = models.OneToOneField(
+        MovimientoInventario, on_delete=models.SET_NULL, null=True, blank=True, related_name='lote'
+    )
+    creado = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Indices parciales: los lotes agotados no se leen nunca al despachar ni al avisar
+        indexes = [
+            # Despacho FEFO: lotes con stock de un producto por vencimiento
+            models.Index(fields=['producto', 'fecha_vencimiento', 'id'], name='lote_fefo_idx',
+                         condition=models.Q(cantidad__gt=0)),
+            # Proximos a vencer y reportes por rango de fechas
+            models.Index(fields=['fecha_vencimiento', 'id'], name='lote_vencimiento_idx',
+                         condition=models.Q(cantidad__gt=0, fecha_vencimiento__isnull=False)),
+        ]
+
+    def __str__(self):
+        return f"{self.codigo} ({self.producto_id}): {self.cantidad}"
+
+
 #historial de precios de compra
 class PrecioCompra(models.Model):
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='precios_compra')
     precio = models.DecimalField(max_digits=10, decimal_places=2)
     fecha_compra = models.DateField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['producto', 'fecha_compra', 'id'], name='precio_producto_fecha_idx'),
+        ]
+
     def __str__(self):
         return f"{self.producto.nombre} - ${self.precio} ({self.fecha_compra})"
+
+
+#ultima valorizacion calculada de cada producto; vigente=False queda pendiente (ver valorizacion.py)
+class ValorizacionProducto(models.Model):
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name='valorizacion')
+    cantidad = models.IntegerField(default=0)
+    costo_promedio = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    valor_promedio = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    valor_fifo = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    vigente = models.BooleanField(default=False)
+    calculado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Solo las pendientes: el worker las busca sin recorrer el catalogo
+            models.Index(fields=['producto'], condition=models.Q(vigente=False), name='valorizacion_pendiente_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id}: {self.valor_promedio} / {self.valor_fifo}{'' if self.vigente else ' (pendiente)'}"
+
+
+#version del inventario, cambia con cada producto o movimiento registrado
+class VersionInventario(models.Model):
+    version = models.PositiveBigIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def actual(cls):
+        obj, _ = cls.objects.get_or_create(pk=1)
+        return obj.version
+
+    @classmethod
+    def incrementar(cls):
+        # Al confirmar: dentro de la transaccion del movimiento la fila unica
+        # quedaria bloqueada y todas las escrituras se harian en fila
+        transaction.on_commit(cls._incrementar)
+
+    @classmethod
+    def _incrementar(cls):
+        if not cls.objects.filter(pk=1).update(version=models.F('version') + 1, actualizado=timezone.now()):
+            cls.objects.get_or_create(pk=1, defaults={'version': 1})
+
+    def __str__(self):
+        return f"Inventario v{self.version}"
+
+
+#reportes generados en segundo plano por el comando procesar_reportes
+class TrabajoReporte(models.Model):
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('EN_PROCESO', 'En proceso'),
+        ('LISTO', 'Listo'),
+        ('ERROR', 'Error'),
+    ]
+
+    clave = models.CharField(max_length=64, db_index=True)
+    parametros = models.JSONField(default=dict)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='PENDIENTE')
+    archivo = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    # Cuando un worker lo paso a EN_PROCESO y cuantas veces se intento (ver reportes.reclamar_vencidos)
+    tomado = models.DateTimeField(null=True, blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    terminado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'creado'], name='trabajo_estado_creado_idx'),
+        ]
+
+    def __str__(self):
+        return f"Reporte {self.pk} - {self.get_estado_display()}"
+
+
+#cierres diarios del historial de movimientos (ver historial.py)
+class CierreDiario(models.Model):
+    fecha = models.DateField(unique=True)
+    movimientos = models.PositiveIntegerField(default=0)
+    procesado = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Cierre {self.fecha}"
+
+
+#stock al cierre del dia, solo para productos con movimientos ese dia
+class SnapshotStock(models.Model):
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='snapshots')
+    fecha = models.DateField()
+    cantidad = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'fecha'], name='snapshot_producto_fecha_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} al {self.fecha}: {self.cantidad}"
+
+
+#totales diarios por tipo de movimiento y proyecto
+class ResumenMovimientosDiario(models.Model):
+    fecha = models.DateField()
+    tipo_movimiento = models.CharField(max_length=20, choices=MovimientoInventario.TIPO_MOVIMIENTO_CHOICES)
+    proyecto = models.CharField(max_length=100, blank=True, default='')
+    cantidad = models.PositiveBigIntegerField(default=0)
+    movimientos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'tipo_movimiento', 'proyecto'], name='resumen_dia_tipo_proyecto_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['proyecto', 'fecha'], name='resumen_proyecto_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.tipo_movimiento} {self.proyecto or '-'}: {self.cantidad}"
+
+
+#consumo diario estimado y punto de reorden sugerido (ver pronosticos.py)
+class PronosticoDemanda(models.Model):
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, related_name='pronostico')
+    consumo_diario = models.FloatField()
+    desviacion_diaria = models.FloatField()
+    dias_historial = models.PositiveIntegerField()
+    punto_reorden = models.PositiveIntegerField()
+    calculado = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.producto_id}: {self.consumo_diario:.2f}/dia, reorden {self.punto_reorden}"
+
+    @property
+    def dias_cobertura(self):
+        """Dias que alcanza el stock actual al ritmo de consumo estimado."""
+        if not self.consumo_diario:
+            return None
+        return int(self.producto.cantidad / self.consumo_diario)
+
+
+#ultimo cambio de cada objeto, para la sincronizacion incremental (ver cambios.py)
+class Cambio(models.Model):
+    MODELO_CHOICES = [
+        ('producto', 'Producto'),
+        ('categoria', 'Categoría'),
+        ('movimiento', 'Movimiento'),
+    ]
+
+    # Creciente: cada cambio borra la fila anterior del objeto e inserta una nueva
+    seq = models.BigAutoField(primary_key=True)
+    modelo = models.CharField(max_length=20, choices=MODELO_CHOICES)
+    objeto_id = models.PositiveBigIntegerField()
+    eliminado = models.BooleanField(default=False)
+    registrado = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['modelo', 'objeto_id'], name='cambio_modelo_objeto_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.seq}: {self.modelo} {self.objeto_id}{' (eliminado)' if self.eliminado else ''}"
+
+
+#claves de la API para los lectores y el ERP (ver tokens.py)
+class TokenApi(models.Model):
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tokens_api')
+    nombre = models.CharField(max_length=100)
+    # SHA-256 de la clave: la clave solo se muestra al crearla
+    huella = models.CharField(max_length=64, unique=True, editable=False)
+    activo = models.BooleanField(default=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    ultimo_uso = models.DateTimeField(null=True, blank=True, editable=False)
+
+    def __str__(self):
+        return f"{self.nombre} ({self.usuario})"
@@ -0,0 +1,177 @@
+import base64
+import datetime
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder recorta a milisegundos; el cursor necesita el valor exacto
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def codificar_cursor(valores, direccion='>'):
+    datos = json.dumps([direccion, valores], cls=_CursorEncoder)
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        direccion, valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (ValueError, TypeError):
+        raise Http404("Cursor de paginación inválido.")
+    if direccion not in ('>', '<') or not isinstance(valores, list):
+        raise Http404("Cursor de paginación inválido.")
+    return direccion, valores
+
+
+class PaginaKeyset:
+    """Pagina obtenida por busqueda de clave (seek) en vez de OFFSET."""
+
+    def __init__(self, objetos, siguiente=None, anterior=None):
+        self.object_list = objetos
+        self.siguiente = siguiente
+        self.anterior = anterior
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.siguiente is not None
+
+    def has_previous(self):
+        return self.anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _condicion(campos, valores, direccion):
+    """Construye (a > x) OR (a = x AND b > y) ... para el orden dado."""
+    condicion = Q()
+    for i, campo in enumerate(campos):
+        nombre = campo.lstrip('-')
+        mayor = (direccion == '>') != campo.startswith('-')
+        parcial = Q(**{f'{nombre}__gt' if mayor else f'{nombre}__lt': valores[i]})
+        for previo, valor in zip(campos[:i], valores[:i]):
+            parcial &= Q(**{previo.lstrip('-'): valor})
+        condicion |= parcial
+    return condicion
+
+
+def _invertir(campo):
+    return campo[1:] if campo.startswith('-') else '-' + campo
+
+
+def _consulta_keyset(queryset, orden, cursor, tamano):
+    """Consulta de una pagina (con una fila extra para saber si hay mas) y su direccion."""
+    direccion = '>'
+    if cursor:
+        direccion, valores = decodificar_cursor(cursor)
+        if len(valores) != len(orden):
+            raise Http404("Cursor de paginación inválido.")
+        queryset = queryset.filter(_condicion(orden, valores, direccion))
+    if direccion == '<':
+        orden = [_invertir(c) for c in orden]
+    return queryset.order_by(*orden)[:tamano + 1], direccion
+
+
+def paginar_keyset(queryset, orden, cursor=None, tamano=50):
+    """Pagina un queryset ordenado por los campos ``orden`` (el ultimo debe ser unico).
+
+    El costo de cada pagina es el de una busqueda en el indice de ``orden``,
+    sin importar cuantas paginas se hayan avanzado.
+    """
+    orden = list(orden)
+    consulta, direccion = _consulta_keyset(queryset, orden, cursor, tamano)
+    return _pagina_keyset(list(consulta), orden, direccion, cursor, tamano)
+
+
+async def apaginar_keyset(queryset, orden, cursor=None, tamano=50):
+    """Version asincrona de ``paginar_keyset`` para vistas ``async def``."""
+    orden = list(orden)
+    consulta, direccion = _consulta_keyset(queryset, orden, cursor, tamano)
+    return _pagina_keyset([fila async for fila in consulta], orden, direccion, cursor, tamano)
+
+
+def _pagina_keyset(filas, orden, direccion, cursor, tamano):
+    nombres = [campo.lstrip('-') for campo in orden]
+    hay_mas = len(filas) > tamano
+    filas = filas[:tamano]
+    if direccion == '<':
+        filas.reverse()
+
+    def valores_de(obj):
+        if isinstance(obj, dict):
+            return [obj[n] for n in nombres]
+        return [getattr(obj, n) for n in nombres]
+
+    siguiente = anterior = None
+    if filas:
+        if direccion == '>':
+            if hay_mas:
+                siguiente = codificar_cursor(valores_de(filas[-1]), '>')
+            if cursor:
+                anterior = codificar_cursor(valores_de(filas[0]), '<')
+        else:
+            siguiente = codificar_cursor(valores_de(filas[-1]), '>')
+            if hay_mas:
+                anterior = codificar_cursor(valores_de(filas[0]), '<')
+    return PaginaKeyset(filas, siguiente=siguiente, anterior=anterior)
+
+
+class KeysetPaginationMixin:
+    """Reemplaza la paginacion por OFFSET de ListView por paginacion keyset.
+
+    Las vistas definen ``get_orden_keyset()``; el cursor viaja en ``?cursor=``.
+    """
+    paginate_by = 50
+    cursor_kwarg = 'cursor'
+
+    def get_orden_keyset(self):
+        return ['pk']
+
+    def paginate_queryset(self, queryset, page_size):
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        pagina = paginar_keyset(queryset, self.get_orden_keyset(), cursor, page_size)
+        return None, pagina, pagina.object_list, pagina.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Parametros de la consulta sin el cursor, para armar los enlaces de paginacion
+        params = self.request.GET.copy()
+        params.pop(self.cursor_kwarg, None)
+        context['query_params'] = params.urlencode()
+        return context
+
+
+class AsyncKeysetMixin:
+    """Handler ``async def`` para un ListView con ``KeysetPaginationMixin``, para servir con ASGI.
+
+    ``get_queryset()`` y el contexto corren en un hilo (formularios, roles,
+    cache); la pagina se lee con el ORM asincrono. El contexto y la plantilla
+    son los de la vista sincronica.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = await sync_to_async(self.get_queryset)()
+        self.pagina = await apaginar_keyset(
+            self.object_list, self.get_orden_keyset(), request.GET.get(self.cursor_kwarg),
+            self.get_paginate_by(self.object_list),
+        )
+        context = await sync_to_async(self.get_context_data)()
+        return self.render_to_response(context)
+
+    def paginate_queryset(self, queryset, page_size):
+        # La pagina ya se leyo en get()
+        return None, self.pagina, self.pagina.object_list, self.pagina.has_other_pages()
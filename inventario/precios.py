@@ -0,0 +1,46 @@
+"""Resumen de precios de compra guardado en ``Producto``.
+
+``precio_actual``, minimo, maximo y promedio se recalculan con un solo UPDATE
+cada vez que se registra o elimina un ``PrecioCompra`` (ver signals.py), asi
+el listado muestra el precio de cada producto sin consultar el historial.
+"""
+from django.db.models import Avg, Count, DecimalField, IntegerField, Max, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Round
+
+from . import catalogo
+from .models import PrecioCompra, Producto
+
+
+def _agregado(precios, expresion, output_field):
+    return Subquery(
+        precios.order_by().values('producto').annotate(valor=expresion).values('valor'),
+        output_field=output_field,
+    )
+
+
+def valores_resumen():
+    """Expresiones para un UPDATE de ``Producto`` a partir de sus precios."""
+    precios = PrecioCompra.objects.filter(producto=OuterRef('pk'))
+    ultimo = precios.order_by('-fecha_compra', '-id')
+    decimal = DecimalField(max_digits=10, decimal_places=2)
+    return {
+        'precio_actual': Subquery(ultimo.values('precio')[:1]),
+        'fecha_precio_actual': Subquery(ultimo.values('fecha_compra')[:1]),
+        'precio_minimo': _agregado(precios, Min('precio'), decimal),
+        'precio_maximo': _agregado(precios, Max('precio'), decimal),
+        'precio_promedio': _agregado(precios, Round(Avg('precio'), 2), decimal),
+        'precios_registrados': Coalesce(_agregado(precios, Count('id'), IntegerField()), Value(0)),
+    }
+
+
+def actualizar(productos=None):
+    """Recalcula el resumen para un queryset de productos (o todo el catalogo)."""
+    if productos is None:
+        productos = Producto.objects.all()
+    catalogo.invalidar_productos()
+    return productos.update(**valores_resumen())
+
+
+def actualizar_producto(producto_id):
+    catalogo.invalidar_producto(producto_id)
+    return Producto.objects.filter(pk=producto_id).update(**valores_resumen())
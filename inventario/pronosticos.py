@@ -0,0 +1,130 @@
+"""Pronostico de consumo y punto de reorden por producto.
+
+Para cada producto se toma el consumo diario (SALIDA + USO_PROYECTO) de los
+ultimos ``dias`` dias, contando en cero los dias sin movimientos, y se
+calcula su media y desviacion estandar. El punto de reorden es la demanda
+esperada durante el plazo de reposicion mas un stock de seguridad:
+
+    punto_reorden = media * plazo + z * desviacion * sqrt(plazo)
+
+La base entrega en una sola consulta, por producto, la suma y la suma de
+cuadrados de los totales diarios; Python solo recorre una fila por producto.
+Pensado para correr cada noche con ``calcular_pronosticos``.
+"""
+import datetime
+import math
+
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import alertas, cambios, catalogo, eventos
+from .models import MovimientoInventario, Producto, PronosticoDemanda, VersionInventario
+
+TIPOS_CONSUMO = ('SALIDA', 'USO_PROYECTO')
+DIAS_HISTORIAL = 90
+DIAS_REPOSICION = 7
+# z de la normal para un nivel de servicio de 95%
+FACTOR_SERVICIO = 1.65
+TAMANO_LOTE = 5000
+
+
+def _inicio_dia(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
+def _consumos_diarios(desde, hasta):
+    """Consulta (producto_id, dia, total) del consumo entre dos instantes."""
+    return (
+        MovimientoInventario.objects
+        .filter(tipo_movimiento__in=TIPOS_CONSUMO, fecha__gte=desde, fecha__lt=hasta)
+        .annotate(dia=TruncDate('fecha'))
+        .values('producto_id', 'dia')
+        .annotate(total=Sum('cantidad'))
+        .order_by()
+    )
+
+
+def estadisticas_consumo(dias=DIAS_HISTORIAL):
+    """Genera (producto_id, suma, suma_cuadrados) con los totales diarios de consumo.
+
+    La ventana son los ``dias`` dias completos anteriores a hoy. Los totales
+    por dia se agrupan con el ORM y la segunda agregacion se hace sobre esa
+    consulta como subconsulta, para que todo quede en la base.
+    """
+    hoy = timezone.localdate()
+    consumos = _consumos_diarios(_inicio_dia(hoy - datetime.timedelta(days=dias)), _inicio_dia(hoy))
+    sql, params = consumos.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT producto_id, SUM(total), SUM(total * total) FROM ({sql}) diarios GROUP BY producto_id",
+            params,
+        )
+        while True:
+            filas = cursor.fetchmany(TAMANO_LOTE)
+            if not filas:
+                break
+            yield from filas
+
+
+def punto_reorden(media, desviacion, plazo=DIAS_REPOSICION, factor=FACTOR_SERVICIO):
+    return math.ceil(media * plazo + factor * desviacion * math.sqrt(plazo))
+
+
+def calcular(dias=DIAS_HISTORIAL, plazo=DIAS_REPOSICION, factor=FACTOR_SERVICIO):
+    """Recalcula y guarda los pronosticos. Devuelve cuantos productos tienen consumo."""
+    ahora = timezone.now()
+    pronosticos = []
+    calculados = 0
+    with transaction.atomic():
+        for producto_id, suma, suma_cuadrados in estadisticas_consumo(dias):
+            media = float(suma) / dias
+            varianza = max(float(suma_cuadrados) / dias - media * media, 0.0)
+            desviacion = math.sqrt(varianza)
+            pronosticos.append(PronosticoDemanda(
+                producto_id=producto_id,
+                consumo_diario=media,
+                desviacion_diaria=desviacion,
+                dias_historial=dias,
+                punto_reorden=punto_reorden(media, desviacion, plazo, factor),
+                calculado=ahora,
+            ))
+            if len(pronosticos) >= TAMANO_LOTE:
+                _guardar(pronosticos)
+                calculados += len(pronosticos)
+                pronosticos = []
+        _guardar(pronosticos)
+        calculados += len(pronosticos)
+        # Productos que ya no tuvieron consumo en la ventana
+        PronosticoDemanda.objects.filter(calculado__lt=ahora).delete()
+    return calculados
+
+
+def _guardar(pronosticos):
+    PronosticoDemanda.objects.bulk_create(
+        pronosticos,
+        update_conflicts=True,
+        unique_fields=['producto'],
+        update_fields=['consumo_diario', 'desviacion_diaria', 'dias_historial', 'punto_reorden', 'calculado'],
+    )
+
+
+def aplicar_umbrales():
+    """Copia el punto de reorden sugerido a ``umbral_stock_bajo`` con un solo UPDATE."""
+    productos = Producto.objects.filter(pronostico__isnull=False).exclude(
+        umbral_stock_bajo=F('pronostico__punto_reorden')
+    )
+    sugerido = PronosticoDemanda.objects.filter(producto=OuterRef('pk')).values('punto_reorden')[:1]
+    with transaction.atomic():
+        ajustados = list(productos.values_list('pk', flat=True))
+        cambios.registrar_productos(ajustados)
+        eventos.publicar(productos=ajustados)
+        actualizados = Producto.objects.filter(pk__in=productos.values('pk')).update(
+            umbral_stock_bajo=Subquery(sugerido)
+        )
+        # El UPDATE no pasa por save(): la marca de alerta se recalcula aparte
+        alertas.recalcular(Producto.objects.filter(pronostico__isnull=False))
+        VersionInventario.incrementar()
+        catalogo.invalidar_productos()
+    return actualizados
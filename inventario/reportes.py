@@ -0,0 +1,190 @@
+import csv
+import hashlib
+import json
+import os
+from datetime import timedelta
+
+import openpyxl
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import alertas
+from .models import Producto, TrabajoReporte, VersionInventario
+
+# Cantidad de productos que se leen por viaje a la base de datos. Las
+# categorias se precargan por cada bloque, no por cada fila.
+TAMANO_BLOQUE = 2000
+
+ENCABEZADOS = ['Código', 'Nombre', 'Cantidad', 'Ubicación', 'Fecha Vencimiento', 'Categorías']
+
+
+def filtrar_productos(fecha_inicio=None, fecha_fin=None, categorias=None):
+    """Queryset de productos del reporte segun los filtros del formulario."""
+    productos = Producto.objects.all()
+    if fecha_inicio or fecha_fin:
+        # Productos con algun lote con stock que vence en el rango (indice lote_vencimiento_idx)
+        lotes = alertas.lotes_vigentes(fecha_inicio, fecha_fin)
+        productos = productos.filter(pk__in=lotes.values('producto_id'))
+    if categorias:
+        productos = productos.filter(categorias__in=categorias).distinct()
+    return productos.order_by('pk')
+
+
+def filas_reporte(productos):
+    """Genera las filas del reporte leyendo los productos por bloques."""
+    productos = productos.only(
+        'codigo', 'nombre', 'cantidad', 'ubicacion', 'fecha_vencimiento'
+    ).prefetch_related('categorias')
+    for p in productos.iterator(chunk_size=TAMANO_BLOQUE):
+        categorias_str = ", ".join(c.nombre for c in p.categorias.all())
+        fecha_ven = p.fecha_vencimiento.strftime("%d/%m/%Y") if p.fecha_vencimiento else ""
+        yield [p.codigo, p.nombre, p.cantidad, p.ubicacion, fecha_ven, categorias_str]
+
+
+class _Eco:
+    """Buffer minimo para que csv.writer devuelva cada linea en vez de guardarla."""
+
+    def write(self, value):
+        return value
+
+
+def generar_csv(productos):
+    """Generador de lineas CSV para usar con StreamingHttpResponse."""
+    writer = csv.writer(_Eco())
+    # BOM para que Excel abra el archivo con los acentos correctos
+    yield '\ufeff' + writer.writerow(ENCABEZADOS)
+    for fila in filas_reporte(productos):
+        yield writer.writerow(fila)
+
+
+def escribir_xlsx(productos, destino):
+    """Escribe el reporte en modo write_only: las filas no quedan en memoria."""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title="Reporte Inventario")
+    ws.append(ENCABEZADOS)
+    for fila in filas_reporte(productos):
+        ws.append(fila)
+    wb.save(destino)
+
+
+# --- Reportes en segundo plano ---
+
+def parametros_reporte(cleaned_data):
+    """Convierte los datos del formulario a un dict serializable para el trabajo."""
+    fecha_inicio = cleaned_data.get('fecha_inicio')
+    fecha_fin = cleaned_data.get('fecha_fin')
+    categorias = cleaned_data.get('categorias')
+    return {
+        'fecha_inicio': fecha_inicio.isoformat() if fecha_inicio else None,
+        'fecha_fin': fecha_fin.isoformat() if fecha_fin else None,
+        'categorias': sorted(c.pk for c in categorias) if categorias else [],
+        'formato': cleaned_data.get('formato') or 'xlsx',
+    }
+
+
+def clave_reporte(parametros, version=None):
+    """Hash de los parametros y la version del inventario usada para cachear el archivo."""
+    if version is None:
+        version = VersionInventario.actual()
+    datos = dict(parametros, version=version)
+    return hashlib.sha256(json.dumps(datos, sort_keys=True).encode()).hexdigest()
+
+
+def directorio_reportes():
+    return os.path.join(settings.MEDIA_ROOT, 'reportes')
+
+
+def ruta_archivo(trabajo):
+    return os.path.join(directorio_reportes(), trabajo.archivo)
+
+
+def encolar_reporte(parametros, usuario=None):
+    """Devuelve un trabajo vigente con la misma clave o crea uno nuevo pendiente."""
+    clave = clave_reporte(parametros)
+    limite = timezone.now() - timedelta(seconds=settings.REPORTES_CACHE_SEGUNDOS)
+    existentes = TrabajoReporte.objects.filter(clave=clave).exclude(estado='ERROR').order_by('-creado')
+    for trabajo in existentes:
+        if trabajo.estado != 'LISTO':
+            return trabajo
+        if trabajo.terminado >= limite and os.path.exists(ruta_archivo(trabajo)):
+            return trabajo
+        break
+    return TrabajoReporte.objects.create(clave=clave, parametros=parametros, usuario=usuario)
+
+
+def reclamar_vencidos():
+    """Devuelve a la cola los trabajos EN_PROCESO cuyo worker no termino a tiempo.
+
+    Un worker que se cae deja el trabajo EN_PROCESO y ``encolar_reporte`` lo
+    seguiria entregando para siempre. Pasado ``REPORTES_SEGUNDOS_PROCESO``
+    vuelve a PENDIENTE, o queda en ERROR si ya agoto ``REPORTES_MAX_INTENTOS``.
+    Devuelve cuantos trabajos se reclamaron.
+    """
+    ahora = timezone.now()
+    plazo = ahora - timedelta(seconds=settings.REPORTES_SEGUNDOS_PROCESO)
+    # Sin tomado: trabajos que quedaron EN_PROCESO antes de que existiera el plazo
+    vencidos = TrabajoReporte.objects.filter(Q(tomado__lt=plazo) | Q(tomado__isnull=True), estado='EN_PROCESO')
+    fallidos = vencidos.filter(intentos__gte=settings.REPORTES_MAX_INTENTOS).update(
+        estado='ERROR', terminado=ahora,
+        error=f'El reporte no terminó en {settings.REPORTES_MAX_INTENTOS} intentos.',
+    )
+    return fallidos + vencidos.update(estado='PENDIENTE', tomado=None)
+
+
+def procesar_trabajo(trabajo):
+    """Genera el archivo de un trabajo. Devuelve False si otro proceso ya lo tomo."""
+    tomado = TrabajoReporte.objects.filter(pk=trabajo.pk, estado='PENDIENTE').update(
+        estado='EN_PROCESO', tomado=timezone.now(), intentos=F('intentos') + 1
+    )
+    if not tomado:
+        return False
+
+    parametros = trabajo.parametros
+    productos = filtrar_productos(
+        fecha_inicio=parametros.get('fecha_inicio'),
+        fecha_fin=parametros.get('fecha_fin'),
+        categorias=parametros.get('categorias'),
+    )
+    formato = parametros.get('formato', 'xlsx')
+    nombre = f"{trabajo.clave}.{formato}"
+    os.makedirs(directorio_reportes(), exist_ok=True)
+    destino = os.path.join(directorio_reportes(), nombre)
+    temporal = destino + '.tmp'
+    try:
+        if formato == 'csv':
+            with open(temporal, 'w', encoding='utf-8', newline='') as f:
+                f.writelines(generar_csv(productos))
+        else:
+            escribir_xlsx(productos, temporal)
+        os.replace(temporal, destino)
+    except Exception as exc:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        TrabajoReporte.objects.filter(pk=trabajo.pk).update(
+            estado='ERROR', error=str(exc), terminado=timezone.now()
+        )
+        raise
+
+    TrabajoReporte.objects.filter(pk=trabajo.pk).update(
+        estado='LISTO', archivo=nombre, terminado=timezone.now()
+    )
+    return True
+
+
+def limpiar_reportes_vencidos():
+    """Borra los archivos cuyo periodo de cache ya paso. Devuelve cuantos se borraron."""
+    limite = timezone.now() - timedelta(seconds=settings.REPORTES_CACHE_SEGUNDOS)
+    vencidos = TrabajoReporte.objects.filter(estado='LISTO', terminado__lt=limite).exclude(archivo='')
+    borrados = 0
+    for trabajo in vencidos:
+        ruta = ruta_archivo(trabajo)
+        # El mismo archivo puede pertenecer a un trabajo mas reciente con la misma clave
+        vigente = TrabajoReporte.objects.filter(
+            archivo=trabajo.archivo, estado='LISTO', terminado__gte=limite
+        ).exists()
+        if not vigente and os.path.exists(ruta):
+            os.remove(ruta)
+            borrados += 1
+    vencidos.update(archivo='')
+    return borrados
@@ -0,0 +1,54 @@
+"""Resolucion de los grupos (roles) de un usuario con una sola consulta.
+
+Los nombres de grupo se cargan una vez y se guardan en el propio objeto
+``request.user``, asi el navbar, los mixins y las vistas comparten el
+resultado durante la peticion. Si ``INVENTARIO_CACHE_GRUPOS_SEGUNDOS`` es
+mayor que cero tambien se guardan en el cache de Django entre peticiones;
+las señales de ``User.groups`` los invalidan (conviene un cache compartido,
+como Redis, cuando hay varios procesos).
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from . import cache as inventario_cache
+
+ATRIBUTO = '_inventario_grupos'
+
+
+def _clave(user_id):
+    return inventario_cache.clave('grupos', user_id)
+
+
+def grupos_usuario(user):
+    """Nombres de los grupos del usuario como frozenset."""
+    if not user or not user.is_authenticated:
+        return frozenset()
+    grupos = getattr(user, ATRIBUTO, None)
+    if grupos is not None:
+        return grupos
+
+    segundos = getattr(settings, 'INVENTARIO_CACHE_GRUPOS_SEGUNDOS', 0)
+    if segundos:
+        grupos = cache.get(_clave(user.pk))
+    if grupos is None:
+        grupos = frozenset(user.groups.values_list('name', flat=True))
+        if segundos:
+            cache.set(_clave(user.pk), grupos, segundos)
+    setattr(user, ATRIBUTO, grupos)
+    return grupos
+
+
+def tiene_grupo(user, nombre):
+    return nombre in grupos_usuario(user)
+
+
+def tiene_alguno(user, nombres):
+    return not grupos_usuario(user).isdisjoint(nombres)
+
+
+def invalidar_usuario(user_id):
+    cache.delete(_clave(user_id))
+
+
+def invalidar_todos():
+    inventario_cache.invalidar('grupos')
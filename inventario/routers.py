@@ -0,0 +1,46 @@
+"""Reparto de lecturas entre la base primaria y una replica de solo lectura.
+
+``ReplicaMiddleware`` marca las peticiones GET/HEAD como aptas para leer de
+la replica. Todo lo demas (POST, comandos, trabajos en segundo plano) lee y
+escribe en ``default``. Despues de una escritura el navegador recibe una
+cookie que fija sus lecturas al primario unos segundos, asi el usuario ve
+sus propios cambios aunque la replica vaya atrasada.
+"""
+import contextvars
+
+from django.db import connections
+
+ALIAS_PRIMARIO = 'default'
+ALIAS_REPLICA = 'replica'
+
+_leer_replica = contextvars.ContextVar('inventario_leer_replica', default=False)
+
+
+def leer_de_replica(activo):
+    """Activa o desactiva las lecturas en la replica para el contexto actual. Devuelve el token."""
+    return _leer_replica.set(activo)
+
+
+def restaurar(token):
+    _leer_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _leer_replica.get():
+            return ALIAS_PRIMARIO
+        # Dentro de una transaccion se lee lo mismo que se va a escribir
+        if connections[ALIAS_PRIMARIO].in_atomic_block:
+            return ALIAS_PRIMARIO
+        return ALIAS_REPLICA
+
+    def db_for_write(self, model, **hints):
+        return ALIAS_PRIMARIO
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Ambas bases tienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La replica recibe el esquema por replicacion
+        return db == ALIAS_PRIMARIO
@@ -0,0 +1,222 @@
+from django.contrib.auth.models import Group, User
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import alertas, busqueda, cambios, catalogo, eventos, lotes, precios, roles, ubicaciones, valorizacion
+from .models import (
+    Categoria, MovimientoInventario, PrecioCompra, Producto, StockUbicacion, Ubicacion, VersionInventario,
+)
+
+
+# Cualquier cambio en productos o movimientos deja obsoletos los reportes y conteos de alertas
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=MovimientoInventario)
+@receiver(post_delete, sender=MovimientoInventario)
+def invalidar_version_inventario(sender, **kwargs):
+    VersionInventario.incrementar()
+    alertas.invalidar()
+
+
+# Un precio nuevo cambia el costo de las entradas desde su fecha y el
+# resumen de precios del producto (la version invalida los ETag de la API)
+@receiver(post_save, sender=PrecioCompra)
+@receiver(post_delete, sender=PrecioCompra)
+def invalidar_version_precios(sender, **kwargs):
+    VersionInventario.incrementar()
+
+
+# La valorizacion guardada queda pendiente para el worker (ver valorizacion.py)
+@receiver(post_save, sender=Producto)
+def invalidar_valorizacion_producto(sender, instance, created, **kwargs):
+    valorizacion.invalidar([instance.pk], crear=created)
+
+
+@receiver(post_save, sender=MovimientoInventario)
+@receiver(post_delete, sender=MovimientoInventario)
+@receiver(post_save, sender=PrecioCompra)
+@receiver(post_delete, sender=PrecioCompra)
+def invalidar_valorizacion(sender, instance, **kwargs):
+    valorizacion.invalidar([instance.producto_id])
+
+
+@receiver(post_save, sender=PrecioCompra)
+@receiver(post_delete, sender=PrecioCompra)
+def actualizar_resumen_precios(sender, instance, **kwargs):
+    precios.actualizar_producto(instance.producto_id)
+
+
+@receiver(m2m_changed, sender=Producto.categorias.through)
+def invalidar_version_categorias(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        VersionInventario.incrementar()
+
+
+# Entradas del cache de catalogo (ver catalogo.py)
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_producto_catalogo(sender, instance, **kwargs):
+    catalogo.invalidar_producto(instance.pk, instance.codigo)
+
+
+@receiver(post_save, sender=MovimientoInventario)
+@receiver(post_delete, sender=MovimientoInventario)
+def invalidar_producto_movimiento(sender, instance, **kwargs):
+    catalogo.invalidar_producto(instance.producto_id)
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_categorias(sender, **kwargs):
+    VersionInventario.incrementar()
+    catalogo.invalidar_categorias()
+
+
+@receiver(post_save, sender=Ubicacion)
+@receiver(post_delete, sender=Ubicacion)
+def invalidar_ubicaciones(sender, **kwargs):
+    catalogo.invalidar_ubicaciones()
+
+
+# Registro de cambios para la sincronizacion de dispositivos (ver cambios.py)
+@receiver(post_save, sender=Producto)
+def registrar_cambio_producto(sender, instance, **kwargs):
+    cambios.registrar_productos([instance.pk])
+
+
+@receiver(post_delete, sender=Producto)
+def registrar_baja_producto(sender, instance, **kwargs):
+    cambios.registrar({cambios.PRODUCTO: [instance.pk]}, eliminado=True)
+
+
+# El movimiento cambia el stock de su producto con un UPDATE, sin save()
+@receiver(post_save, sender=MovimientoInventario)
+def registrar_cambio_movimiento(sender, instance, **kwargs):
+    cambios.registrar({cambios.MOVIMIENTO: [instance.pk], cambios.PRODUCTO: [instance.producto_id]})
+
+
+@receiver(post_delete, sender=MovimientoInventario)
+def registrar_baja_movimiento(sender, instance, **kwargs):
+    cambios.registrar({cambios.MOVIMIENTO: [instance.pk]}, eliminado=True)
+
+
+# El resumen de precios del producto cambia con cada precio
+@receiver(post_save, sender=PrecioCompra)
+@receiver(post_delete, sender=PrecioCompra)
+def registrar_cambio_precio(sender, instance, **kwargs):
+    cambios.registrar_productos([instance.producto_id])
+
+
+@receiver(post_save, sender=Categoria)
+def registrar_cambio_categoria(sender, instance, **kwargs):
+    cambios.registrar({cambios.CATEGORIA: [instance.pk]})
+
+
+# Las filas de la tabla intermedia se borran en cascada sin m2m_changed
+@receiver(pre_delete, sender=Categoria)
+def registrar_productos_categoria(sender, instance, **kwargs):
+    cambios.registrar_productos(instance.producto_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Categoria)
+def registrar_baja_categoria(sender, instance, **kwargs):
+    cambios.registrar({cambios.CATEGORIA: [instance.pk]}, eliminado=True)
+
+
+@receiver(m2m_changed, sender=Producto.categorias.through)
+def registrar_categorias_producto(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            cambios.registrar_productos([instance.pk])
+    elif action in ('post_add', 'post_remove') and pk_set:
+        cambios.registrar_productos(pk_set)
+    elif action == 'pre_clear':
+        # Despues del clear ya no se sabe que productos tenia la categoria
+        cambios.registrar_productos(instance.producto_set.values_list('pk', flat=True))
+
+
+# Eventos en vivo para los tableros abiertos (ver eventos.py)
+@receiver(post_save, sender=Producto)
+def publicar_producto(sender, instance, **kwargs):
+    eventos.publicar(productos=[instance.pk])
+
+
+@receiver(post_save, sender=MovimientoInventario)
+def publicar_movimiento(sender, instance, created, **kwargs):
+    eventos.publicar(productos=[instance.producto_id], movimientos=[instance.pk] if created else [])
+
+
+# Stock por ubicacion (ver ubicaciones.py): se recuerda la ubicacion que
+# tenia el producto para llevar su stock a la nueva si se cambia
+@receiver(pre_save, sender=Producto)
+def recordar_ubicacion_anterior(sender, instance, update_fields=None, **kwargs):
+    instance._ubicacion_anterior = None
+    if not instance._state.adding and (update_fields is None or 'ubicacion' in update_fields):
+        instance._ubicacion_anterior = (
+            Producto.objects.filter(pk=instance.pk).values_list('ubicacion', flat=True).first()
+        )
+
+
+def _cantidad_guardada(created, update_fields):
+    # Un producto existente guarda su cantidad solo si se pide (ver Producto.save)
+    return created or update_fields is None or 'cantidad' in update_fields
+
+
+# Un producto creado o editado con otra cantidad o ubicacion ajusta su ubicacion principal
+@receiver(post_save, sender=Producto)
+def conciliar_stock_ubicaciones(sender, instance, created, update_fields=None, **kwargs):
+    anterior = getattr(instance, '_ubicacion_anterior', None)
+    reubicado = anterior is not None and anterior != instance.ubicacion
+    if reubicado:
+        ubicaciones.cambiar_principal({instance.pk: anterior})
+    if reubicado or _cantidad_guardada(created, update_fields):
+        ubicaciones.conciliar([instance.pk])
+
+
+# Lo mismo con los lotes (ver lotes.py); tambien recalcula su vencimiento
+@receiver(post_save, sender=Producto)
+def conciliar_lotes(sender, instance, created, update_fields=None, **kwargs):
+    if _cantidad_guardada(created, update_fields):
+        lotes.conciliar([instance.pk])
+
+
+# Al borrar un producto sus filas de stock se borran en cascada
+@receiver(post_delete, sender=StockUbicacion)
+def descontar_totales_ubicacion(sender, instance, **kwargs):
+    if instance.cantidad:
+        Ubicacion.objects.filter(pk=instance.ubicacion_id).update(
+            cantidad=F('cantidad') - instance.cantidad, productos=F('productos') - 1
+        )
+
+
+# Mantiene sincronizado el indice de texto completo (solo SQLite, ver busqueda.py)
+@receiver(post_save, sender=Producto)
+def indexar_producto_busqueda(sender, instance, using, **kwargs):
+    busqueda.indexar_producto(instance, using=using)
+
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto_busqueda(sender, instance, using, **kwargs):
+    busqueda.desindexar_producto(instance.pk, using=using)
+
+
+# Invalida el cache de grupos de usuario (ver roles.py)
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidar_grupos_usuario(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        roles.invalidar_usuario(instance.pk)
+    elif pk_set:
+        # group.user_set.add(...): pk_set son usuarios
+        for user_id in pk_set:
+            roles.invalidar_usuario(user_id)
+    else:
+        roles.invalidar_todos()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidar_grupos_renombrados(sender, **kwargs):
+    roles.invalidar_todos()
@@ -0,0 +1,167 @@
+"""Registro de movimientos de inventario con actualizacion atomica del stock.
+
+El stock nunca se lee, modifica y guarda desde Python: se descuenta con un
+``UPDATE ... SET cantidad = cantidad - n WHERE cantidad >= n`` dentro de la
+misma transaccion que inserta el movimiento, asi dos salidas concurrentes
+no pueden dejar el stock negativo ni perder una actualizacion.
+
+El mismo movimiento ajusta el stock por ubicacion (ubicaciones.py): las
+entradas suman en su destino, las salidas descuentan de su origen y las
+transferencias mueven stock de origen a destino sin cambiar el total.
+Tambien los lotes (lotes.py): cada entrada crea el suyo y las salidas los
+consumen en orden de vencimiento.
+
+Despues de crear un producto su cantidad solo cambia por movimientos: las
+correcciones de un conteo fisico son ajustes (``AJUSTE_ENTRADA`` y
+``AJUSTE_SALIDA``), asi la suma de los movimientos explica el stock y los
+cierres diarios (historial.py) no se desplazan al editar un producto.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from . import lotes, ubicaciones
+from .alertas import en_alerta_tras
+from .catalogo import invalidar_producto
+from .models import MovimientoInventario, Producto
+
+logger = logging.getLogger(__name__)
+
+# Efecto de cada tipo de movimiento sobre el stock del producto
+SIGNO_MOVIMIENTO = {
+    'ENTRADA': 1,
+    'TRANSFERENCIA': 0,
+    'SALIDA': -1,
+    'USO_PROYECTO': -1,
+    'AJUSTE_ENTRADA': 1,
+    'AJUSTE_SALIDA': -1,
+}
+# Ubicaciones que usa cada tipo: (origen, destino)
+UBICACIONES_MOVIMIENTO = {
+    'ENTRADA': (False, True),
+    'TRANSFERENCIA': (True, True),
+    'SALIDA': (True, False),
+    'USO_PROYECTO': (True, False),
+    'AJUSTE_ENTRADA': (False, True),
+    'AJUSTE_SALIDA': (True, False),
+}
+
+
+def crea_lote(tipo_movimiento):
+    """Las entradas y los ajustes de alta crean un lote; el resto consume o no toca lotes."""
+    return SIGNO_MOVIMIENTO[tipo_movimiento] > 0
+
+
+def cantidad_con_signo(prefijo=''):
+    """Expresion SQL con la cantidad de un movimiento con el signo de su efecto en el stock."""
+    return Case(
+        *[
+            When(**{f'{prefijo}tipo_movimiento': tipo}, then=F(f'{prefijo}cantidad') * signo)
+            for tipo, signo in SIGNO_MOVIMIENTO.items()
+        ],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+class StockInsuficienteError(Exception):
+    """El producto no tiene stock suficiente para el movimiento (en total o en ``ubicacion``)."""
+
+    def __init__(self, producto, cantidad, ubicacion=None):
+        self.producto = producto
+        self.cantidad = cantidad
+        self.ubicacion = ubicacion
+        if ubicacion is None:
+            super().__init__('Cantidad insuficiente en inventario.')
+        else:
+            super().__init__('Cantidad insuficiente en la ubicación de origen.')
+
+
+def aplicar_stock(producto_id, tipo_movimiento, cantidad, origen_id=None, destino_id=None):
+    """Ajusta el stock con UPDATEs condicionales. Debe llamarse dentro de una transaccion."""
+    productos = Producto.objects.filter(pk=producto_id)
+    delta = SIGNO_MOVIMIENTO[tipo_movimiento] * cantidad
+    if delta < 0:
+        productos = productos.filter(cantidad__gte=cantidad)
+    # La marca de alerta se recalcula en el mismo UPDATE que mueve el stock.
+    # Tambien corre en las transferencias: bloquea el producto antes que sus ubicaciones
+    actualizados = productos.update(cantidad=F('cantidad') + delta, en_alerta=en_alerta_tras(delta))
+    if not actualizados:
+        raise StockInsuficienteError(producto_id, cantidad)
+    usa_origen, usa_destino = UBICACIONES_MOVIMIENTO[tipo_movimiento]
+    cambios = {}
+    if usa_origen:
+        cambios[origen_id] = -cantidad
+    if usa_destino:
+        cambios[destino_id] = cambios.get(destino_id, 0) + cantidad
+    # Siempre en orden de id para que dos transferencias opuestas no se bloqueen entre si
+    for ubicacion_id in sorted(cambios):
+        if not ubicaciones.mover(producto_id, ubicacion_id, cambios[ubicacion_id]):
+            raise StockInsuficienteError(producto_id, cantidad, ubicacion_id)
+    if delta < 0:
+        faltante = lotes.consumir(producto_id, cantidad)
+        if faltante:
+            # El producto tenia stock pero sus lotes no lo cubrian: se avisa y
+            # se concilian para que vuelvan a sumar la cantidad del producto
+            logger.warning('Los lotes del producto %s no cubrian %s unidades de la salida', producto_id, faltante)
+            lotes.conciliar([producto_id])
+        else:
+            lotes.actualizar_vencimiento(Producto.objects.filter(pk=producto_id))
+    invalidar_producto(producto_id)
+
+
+def completar_ubicaciones(movimiento):
+    """Usa la ubicacion principal del producto donde el movimiento no indica otra."""
+    usa_origen, usa_destino = UBICACIONES_MOVIMIENTO[movimiento.tipo_movimiento]
+    if movimiento.tipo_movimiento == 'TRANSFERENCIA':
+        if movimiento.ubicacion_origen_id is None or movimiento.ubicacion_destino_id is None:
+            raise ValueError('Una transferencia requiere ubicación de origen y de destino.')
+        if movimiento.ubicacion_origen_id == movimiento.ubicacion_destino_id:
+            raise ValueError('El origen y el destino de una transferencia deben ser distintos.')
+        return
+    if not usa_origen:
+        movimiento.ubicacion_origen = None
+    elif movimiento.ubicacion_origen_id is None:
+        movimiento.ubicacion_origen_id = ubicaciones.principal(movimiento.producto_id)
+    if not usa_destino:
+        movimiento.ubicacion_destino = None
+    elif movimiento.ubicacion_destino_id is None:
+        movimiento.ubicacion_destino_id = ubicaciones.principal(movimiento.producto_id)
+
+
+def registrar_movimiento(movimiento, lote=None, fecha_vencimiento=None):
+    """Guarda ``movimiento`` (sin guardar aun) y aplica su efecto sobre el stock.
+
+    Una entrada o un ajuste de alta crea un lote con codigo ``lote`` (o uno derivado del
+    movimiento) y ``fecha_vencimiento``. Lanza ``StockInsuficienteError``
+    sin guardar nada si una salida supera el stock.
+    """
+    # Fuera de la transaccion, para que empiece por el UPDATE del producto: con
+    # SQLite en modo DEFERRED una lectura previa obliga a escalar el bloqueo
+    completar_ubicaciones(movimiento)
+    with transaction.atomic():
+        aplicar_stock(
+            movimiento.producto_id, movimiento.tipo_movimiento, movimiento.cantidad,
+            movimiento.ubicacion_origen_id, movimiento.ubicacion_destino_id,
+        )
+        movimiento.save()
+        if crea_lote(movimiento.tipo_movimiento):
+            lotes.crear(movimiento, lote, fecha_vencimiento)
+            lotes.actualizar_vencimiento(Producto.objects.filter(pk=movimiento.producto_id))
+    # El objeto en memoria queda con el stock que quedo en la base
+    movimiento.producto.refresh_from_db(fields=['cantidad', 'fecha_vencimiento'])
+    return movimiento
+
+
+def crear_movimiento(producto, tipo_movimiento, cantidad, usuario=None, lote=None, fecha_vencimiento=None,
+                     **campos):
+    movimiento = MovimientoInventario(
+        producto=producto,
+        tipo_movimiento=tipo_movimiento,
+        cantidad=cantidad,
+        usuario=usuario,
+        **campos,
+    )
+    return registrar_movimiento(movimiento, lote, fecha_vencimiento)
+
@@ -1,7 +1,9 @@
 from django import template
 
+from inventario.roles import tiene_grupo
+
 register = template.Library()
 
 @register.filter(name='has_group')
 def has_group(user, group_name):
-    return user.groups.filter(name=group_name).exists()
+    return tiene_grupo(user, group_name)
@@ -0,0 +1,60 @@
+"""Ayudas para pruebas: presupuestos de consultas SQL por vista.
+
+Uso en un ``TestCase``::
+
+    class VistasTest(PresupuestoConsultasMixin, TestCase):
+        def test_listado(self):
+            self.client.force_login(usuario)
+            self.assertDentroDelPresupuesto('get', reverse('producto-list'))
+
+Si la vista hace mas consultas que su presupuesto la prueba falla y muestra
+el SQL ejecutado, asi un N+1 nuevo rompe CI en vez de llegar a produccion.
+Las pruebas de inventario/tests.py recorren asi las vistas principales.
+
+Un GET se mide despues de una peticion previa igual: el presupuesto es el de
+una pagina con los caches compartidos (conteos del navbar, catalogo) ya
+cargados, como en produccion. Las consultas por fila no se guardan en esos
+caches, asi que un N+1 se sigue notando.
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+# Consultas maximas por peticion (con sesion iniciada) para cada vista
+PRESUPUESTOS_CONSULTAS = {
+    'home': 4,
+    'producto-list': 7,
+    'producto-detalle': 8,
+    'producto-buscar': 5,
+    'movimiento-list': 5,
+    'movimiento-nuevo': 5,
+    'alerta-stock-bajo': 7,
+    'productos-vencimiento': 7,
+    'reporte-inventario': 5,
+    'reporte-valorizacion': 5,
+    'api-productos': 7,
+    'api-producto': 6,
+    'api-movimientos': 5,
+}
+
+
+class PresupuestoConsultasMixin:
+    presupuestos_consultas = PRESUPUESTOS_CONSULTAS
+
+    def assertDentroDelPresupuesto(self, metodo, url, presupuesto=None, calentar=True, **kwargs):
+        vista = resolve(url.split('?')[0]).view_name
+        if presupuesto is None:
+            if vista not in self.presupuestos_consultas:
+                self.fail(f'La vista {vista} no tiene presupuesto de consultas definido.')
+            presupuesto = self.presupuestos_consultas[vista]
+        if calentar and metodo == 'get':
+            self.client.get(url, **kwargs)
+        with CaptureQueriesContext(connection) as capturadas:
+            response = getattr(self.client, metodo)(url, **kwargs)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+        consultas = len(capturadas)
+        if consultas > presupuesto:
+            detalle = '\n'.join(f"{i}. {q['sql']}" for i, q in enumerate(capturadas.captured_queries, start=1))
+            self.fail(f'{vista} hizo {consultas} consultas (presupuesto {presupuesto}):\n{detalle}')
+        return response
@@ -1,3 +1,1142 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import math
+import random
+import threading
+from decimal import Decimal
 
-# Create your tests here.
+import openpyxl
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.core.cache import cache
+from django.db import OperationalError, connection, transaction
+from django.db.models import Sum
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (
+    AsyncRequestFactory, Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.views import View
+
+from . import (
+    busqueda, catalogo, eventos, historial, importacion, lotes, pronosticos, reportes, routers, stock, tokens,
+    ubicaciones, valorizacion, vistas_async,
+)
+from .forms import FiltroMovimientosForm, MovimientoInventarioForm, ProductoForm
+from .middleware import ReplicaMiddleware
+from .models import (
+    Cambio, Categoria, MovimientoInventario, PrecioCompra, Producto, PronosticoDemanda, SnapshotStock, TokenApi,
+    TrabajoReporte, Ubicacion, ValorizacionProducto, VersionInventario,
+)
+from .testing import PresupuestoConsultasMixin
+
+
+class PresupuestoConsultasVistasTest(PresupuestoConsultasMixin, TestCase):
+    """Cada vista debe mantenerse dentro de su presupuesto de consultas (testing.py).
+
+    Hay varias filas por pagina, con categorias, precios, movimientos y lotes,
+    para que un N+1 se note en el conteo.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('gestor', password='x')
+        cls.usuario.groups.add(Group.objects.create(name='Administrador'))
+        categorias = [Categoria.objects.create(nombre=f'Categoria {i}') for i in range(3)]
+        hoy = timezone.localdate()
+        for i in range(12):
+            producto = Producto.objects.create(
+                codigo=f'P{i:03d}', nombre=f'Perno {i}', ubicacion=f'Bodega {i % 3}',
+                cantidad=10, umbral_stock_bajo=20 if i % 2 else 1,
+                fecha_vencimiento=hoy + datetime.timedelta(days=i) if i % 3 == 0 else None,
+            )
+            producto.categorias.set(categorias[:1 + i % 3])
+            PrecioCompra.objects.create(producto=producto, precio=Decimal('1000.00'), fecha_compra=hoy)
+            stock.crear_movimiento(producto, 'ENTRADA', 5, usuario=cls.usuario, lote=f'L{i}')
+            stock.crear_movimiento(producto, 'SALIDA', 2, usuario=cls.usuario)
+        cls.producto = producto
+        # Lo que hace el worker procesar_reportes con las valorizaciones pendientes
+        valorizacion.actualizar()
+
+    def setUp(self):
+        # Los catalogos en cache no deben esconder consultas de una prueba a otra
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def test_inicio(self):
+        self.assertDentroDelPresupuesto('get', reverse('home'))
+
+    def test_listado_productos(self):
+        self.assertDentroDelPresupuesto('get', reverse('producto-list'))
+        self.assertDentroDelPresupuesto('get', reverse('producto-list'), data={'nombre': 'perno', 'orden': 'cantidad'})
+
+    def test_detalle_producto(self):
+        self.assertDentroDelPresupuesto('get', reverse('producto-detalle', args=[self.producto.codigo]))
+
+    def test_busqueda(self):
+        self.assertDentroDelPresupuesto('get', reverse('producto-buscar'), data={'q': 'perno'})
+
+    def test_listado_movimientos(self):
+        self.assertDentroDelPresupuesto('get', reverse('movimiento-list'))
+        self.assertDentroDelPresupuesto('get', reverse('movimiento-list'), data={'tipo_movimiento': 'SALIDA'})
+
+    def test_nuevo_movimiento(self):
+        self.assertDentroDelPresupuesto('get', reverse('movimiento-nuevo'))
+
+    def test_alertas(self):
+        self.assertDentroDelPresupuesto('get', reverse('alerta-stock-bajo'))
+        self.assertDentroDelPresupuesto('get', reverse('productos-vencimiento'))
+
+    def test_reporte(self):
+        self.assertDentroDelPresupuesto('get', reverse('reporte-inventario'))
+
+    def test_valorizacion(self):
+        self.assertDentroDelPresupuesto('get', reverse('reporte-valorizacion'))
+
+    def test_api(self):
+        self.assertDentroDelPresupuesto('get', reverse('api-productos'))
+        self.assertDentroDelPresupuesto('get', reverse('api-producto', args=[self.producto.codigo]))
+        self.assertDentroDelPresupuesto('get', reverse('api-movimientos'))
+
+
+
+class AutenticacionApiTest(TestCase):
+    """Clientes con clave de API (sin sesion ni CSRF) y errores CSRF de la sesion en JSON."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('erp', password='x')
+        cls.usuario.groups.add(Group.objects.create(name='Administrador'))
+        cls.clave = tokens.crear(cls.usuario, 'ERP')
+
+    def crear_categoria(self, cliente, **extra):
+        return cliente.post(
+            reverse('api-categorias'), data={'nombre': 'Pernos'}, content_type='application/json', **extra
+        )
+
+    def test_clave_sin_csrf(self):
+        respuesta = self.crear_categoria(Client(enforce_csrf_checks=True), HTTP_AUTHORIZATION=f'Bearer {self.clave}')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertTrue(Categoria.objects.filter(nombre='Pernos').exists())
+        self.assertIsNotNone(TokenApi.objects.get().ultimo_uso)
+
+    def test_clave_invalida_o_revocada(self):
+        respuesta = self.client.get(reverse('api-categorias'), HTTP_AUTHORIZATION='Bearer otra')
+        self.assertEqual(respuesta.status_code, 401)
+        self.assertEqual(respuesta['WWW-Authenticate'], 'Bearer')
+        TokenApi.objects.update(activo=False)
+        respuesta = self.client.get(reverse('api-categorias'), HTTP_AUTHORIZATION=f'Bearer {self.clave}')
+        self.assertEqual(respuesta.status_code, 401)
+
+    def test_sesion_sin_csrf_responde_json(self):
+        cliente = Client(enforce_csrf_checks=True)
+        cliente.force_login(self.usuario)
+        respuesta = self.crear_categoria(cliente)
+        self.assertEqual(respuesta.status_code, 403)
+        self.assertIn('CSRF', respuesta.json()['error'])
+        self.assertFalse(Categoria.objects.exists())
+        # Las lecturas con sesion no necesitan token CSRF
+        self.assertEqual(cliente.get(reverse('api-categorias')).status_code, 200)
+
+
+class GruposUsuarioTest(TestCase):
+    """Los grupos del usuario se consultan una vez por peticion, o ninguna con el cache."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('logistica', password='x')
+        cls.usuario.groups.add(Group.objects.create(name='Encargado de Logística'))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def consultas_grupos(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return sum('"auth_group"' in c['sql'] for c in consultas.captured_queries)
+
+    def test_una_consulta_por_peticion(self):
+        # El mixin de grupos y el navbar preguntan por ellos
+        self.assertEqual(self.consultas_grupos(reverse('producto-list')), 1)
+        self.assertEqual(self.consultas_grupos(reverse('producto-list')), 1)
+
+    @override_settings(INVENTARIO_CACHE_GRUPOS_SEGUNDOS=60)
+    def test_cache_entre_peticiones(self):
+        url = reverse('producto-list')
+        self.assertEqual(self.consultas_grupos(url), 1)
+        self.assertEqual(self.consultas_grupos(url), 0)
+        # Cambiar los grupos del usuario invalida su entrada
+        self.usuario.groups.clear()
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class ReplicaTest(SimpleTestCase):
+    """Las lecturas de GET van a la replica salvo dentro de una transaccion o tras una escritura."""
+
+    # Sin la transaccion de TestCase, que mandaria todo al primario
+    databases = {'default'}
+
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def middleware(self, get_response):
+        middleware = ReplicaMiddleware(get_response)
+        # Sin DATABASE_REPLICA_URL en los tests: se activa a mano, el router no abre conexiones
+        middleware.activo = True
+        return middleware
+
+    def base_lectura(self, request):
+        leidas = []
+
+        def vista(request):
+            leidas.append(self.router.db_for_read(Producto))
+            with transaction.atomic():
+                leidas.append(self.router.db_for_read(Producto))
+            return HttpResponse()
+
+        respuesta = self.middleware(vista)(request)
+        return leidas, respuesta
+
+    def test_lecturas(self):
+        leidas, respuesta = self.base_lectura(self.factory.get('/'))
+        self.assertEqual(leidas, ['replica', 'default'])
+        self.assertNotIn(ReplicaMiddleware.COOKIE, respuesta.cookies)
+        # Fuera de la peticion todo vuelve al primario
+        self.assertEqual(self.router.db_for_read(Producto), 'default')
+        self.assertEqual(self.router.db_for_write(Producto), 'default')
+
+    def test_lectura_propia(self):
+        leidas, respuesta = self.base_lectura(self.factory.post('/'))
+        self.assertEqual(leidas, ['default', 'default'])
+        cookie = respuesta.cookies[ReplicaMiddleware.COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_LECTURA_PROPIA_SEGUNDOS)
+        # Con la cookie el navegador lee del primario hasta que expire
+        request = self.factory.get('/')
+        request.COOKIES[ReplicaMiddleware.COOKIE] = cookie.value
+        self.assertEqual(self.base_lectura(request)[0], ['default', 'default'])
+
+    async def test_async(self):
+        async def vista(request):
+            # La marca tambien llega a las consultas que corren en un hilo
+            return HttpResponse(await sync_to_async(self.router.db_for_read)(Producto))
+
+        respuesta = await self.middleware(vista)(AsyncRequestFactory().get('/'))
+        self.assertEqual(respuesta.content, b'replica')
+
+
+class PublicadorEventosTest(TestCase):
+    """Cada evento publicado llega a todas las conexiones abiertas del proceso."""
+
+    def setUp(self):
+        self.producto = Producto.objects.create(codigo='S1', nombre='Sello', ubicacion='Bodega', cantidad=2)
+        self.publicador = eventos.Publicador()
+
+    async def recibir(self, suscripcion, cantidad):
+        return [(await suscripcion.siguiente(1))[0] for _ in range(cantidad)]
+
+    async def test_todas_las_suscripciones(self):
+        primera, segunda = self.publicador.suscribir(), self.publicador.suscribir()
+
+        def publicar():
+            with self.captureOnCommitCallbacks(execute=True):
+                eventos.BackendMemoria(self.publicador).publicar(productos=[self.producto.pk])
+                # Nada sale antes del commit
+                self.assertTrue(primera.cola.empty())
+
+        await sync_to_async(publicar)()
+        self.assertEqual(await self.recibir(primera, 2), ['stock', 'alerta'])
+        self.assertEqual(await self.recibir(segunda, 2), ['stock', 'alerta'])
+        # Desde otro hilo y sin la conexion que se fue
+        self.publicador.desuscribir(segunda)
+        await sync_to_async(self.publicador.difundir, thread_sensitive=False)([('recargar', {})])
+        self.assertEqual(await self.recibir(primera, 1), ['recargar'])
+        self.assertTrue(segunda.cola.empty())
+
+    async def test_cola_llena(self):
+        suscripcion = self.publicador.suscribir()
+        for _ in range(eventos.TAMANO_COLA + 1):
+            suscripcion.entregar(('stock', {}))
+        # Un cliente lento recibe un solo aviso de recargar en vez de eventos viejos
+        self.assertEqual(await self.recibir(suscripcion, 1), ['recargar'])
+        self.assertTrue(suscripcion.cola.empty())
+
+
+class VistasAsyncTest(TestCase):
+    """Las variantes de vistas_async.py (ASGI) responden lo mismo que las vistas sincronicas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('gestor', password='x')
+        cls.usuario.groups.add(Group.objects.create(name='Administrador'))
+        cls.clave = tokens.crear(cls.usuario, 'Lector')
+        for i in range(3):
+            producto = Producto.objects.create(codigo=f'A{i}', nombre=f'Arandela {i}', ubicacion='Bodega', cantidad=0)
+            stock.crear_movimiento(producto, 'ENTRADA', 10 + i, usuario=cls.usuario, lote=f'LA{i}')
+        cls.producto = producto
+
+    def pedido(self, url, usuario=None, metodo='get', **kwargs):
+        request = getattr(AsyncRequestFactory(), metodo)(url, **kwargs)
+        request.user = usuario or self.usuario
+
+        async def auser():
+            return request.user
+        request.auser = auser
+        return request
+
+    async def responder(self, vista, request, **kwargs):
+        respuesta = await vista.as_view()(request, **kwargs)
+        if hasattr(respuesta, 'render'):
+            await sync_to_async(respuesta.render)()
+        return respuesta
+
+    def test_handlers_async(self):
+        for nombre in dir(vistas_async):
+            vista = getattr(vistas_async, nombre)
+            if isinstance(vista, type) and issubclass(vista, View):
+                self.assertTrue(vista.view_is_async, nombre)
+
+    async def test_paginas(self):
+        respuesta = await self.responder(vistas_async.ProductoListView, self.pedido(reverse('producto-list')))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([p.codigo for p in respuesta.context_data['productos']], ['A0', 'A1', 'A2'])
+        respuesta = await self.responder(
+            vistas_async.ProductoDetailView, self.pedido(reverse('producto-detalle', args=['A2'])), codigo='A2',
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([lote.codigo for lote in respuesta.context_data['lotes']], ['LA2'])
+        self.assertContains(respuesta, 'LA2')
+        respuesta = await self.responder(
+            vistas_async.MovimientoInventarioListView, self.pedido(reverse('movimiento-list')),
+        )
+        self.assertEqual(len(respuesta.context_data['movimientos']), 3)
+        # Sin sesion redirige al login, como la vista sincronica
+        respuesta = await self.responder(
+            vistas_async.ProductoListView, self.pedido(reverse('producto-list'), usuario=AnonymousUser()),
+        )
+        self.assertEqual(respuesta.status_code, 302)
+
+    async def test_api(self):
+        url = reverse('api-productos')
+        sincronica = await sync_to_async(self.client.get)(url, HTTP_AUTHORIZATION=f'Bearer {self.clave}')
+        respuesta = await self.responder(vistas_async.ProductosApiView, self.pedido(url))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(json.loads(respuesta.content), sincronica.json())
+        respuesta = await self.responder(
+            vistas_async.ProductosApiView, self.pedido(url, headers={'If-None-Match': respuesta['ETag']}),
+        )
+        self.assertEqual(respuesta.status_code, 304)
+        respuesta = await self.responder(
+            vistas_async.ProductoApiView, self.pedido(reverse('api-producto', args=['NO'])), codigo='NO',
+        )
+        self.assertEqual(respuesta.status_code, 404)
+        self.assertIn('error', json.loads(respuesta.content))
+        respuesta = await self.responder(vistas_async.ProductosApiView, self.pedido(url, usuario=AnonymousUser()))
+        self.assertEqual(respuesta.status_code, 401)
+
+    async def test_api_escritura(self):
+        # Las escrituras siguen siendo las sincronicas, ejecutadas en un hilo
+        request = self.pedido(
+            reverse('api-movimientos'), metodo='post', content_type='application/json',
+            data={'producto': 'A2', 'tipo_movimiento': 'SALIDA', 'cantidad': 4},
+            headers={'Authorization': f'Bearer {self.clave}'},
+        )
+        respuesta = await self.responder(vistas_async.MovimientosApiView, request)
+        self.assertEqual(respuesta.status_code, 201)
+        producto = await Producto.objects.aget(codigo='A2')
+        self.assertEqual(producto.cantidad, 8)
+
+
+class CacheCatalogoTest(TestCase):
+    """Las opciones de los formularios salen del cache con cualquier backend; los productos, si se configura."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Categoria.objects.create(nombre='Pernos')
+        ubicaciones.ids_por_nombre(['Bodega'], crear=True)
+        cls.producto = Producto.objects.create(codigo='C1', nombre='Clavo', ubicacion='Bodega', cantidad=3)
+
+    def setUp(self):
+        cache.clear()
+
+    def opciones(self):
+        form = MovimientoInventarioForm()
+        return (
+            [nombre for _, nombre in ProductoForm().fields['categorias'].choices],
+            [nombre for _, nombre in form.fields['ubicacion_origen'].choices],
+        )
+
+    def test_opciones_sin_consultas(self):
+        self.assertEqual(settings.INVENTARIO_CACHE_CATALOGO_SEGUNDOS, 0)
+        self.opciones()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.opciones(), (['Pernos'], ['---------', 'Bodega']))
+
+    @override_settings(INVENTARIO_CACHE_OPCIONES_SEGUNDOS=300)
+    def test_opciones_tras_guardar(self):
+        self.opciones()
+        with self.captureOnCommitCallbacks(execute=True):
+            Categoria.objects.create(nombre='Arandelas')
+            ubicaciones.ids_por_nombre(['Patio'], crear=True)
+        self.assertEqual(self.opciones(), (['Arandelas', 'Pernos'], ['---------', 'Bodega', 'Patio']))
+        with self.captureOnCommitCallbacks(execute=True):
+            Ubicacion.objects.filter(nombre='Patio').get().delete()
+        self.assertEqual(self.opciones()[1], ['---------', 'Bodega'])
+
+    @override_settings(INVENTARIO_CACHE_CATALOGO_SEGUNDOS=300)
+    def test_productos(self):
+        catalogo.producto_por_codigo('C1')
+        with self.assertNumQueries(0):
+            self.assertEqual(catalogo.producto_por_codigo('C1').cantidad, 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.crear_movimiento(self.producto, 'ENTRADA', 2)
+        self.assertEqual(catalogo.producto_por_codigo('C1').cantidad, 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.nombre = 'Clavo largo'
+            self.producto.save()
+        self.assertEqual(catalogo.producto_o_404('C1').nombre, 'Clavo largo')
+
+
+@override_settings(INVENTARIO_SYNC_MARGEN_SEGUNDOS=0)
+class SincronizacionTest(TestCase):
+    """/api/sync/ entrega cada objeto una vez con su ultimo estado, por paginas y con lapidas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('lector', password='x')
+        cls.usuario.groups.add(Group.objects.create(name='Encargado de Logística'))
+        cls.productos = [
+            Producto.objects.create(codigo=f'S{i}', nombre=f'Sello {i}', ubicacion='Bodega', cantidad=1)
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def sincronizar(self, desde=0, limite=2):
+        """Sigue las paginas desde ``desde`` hasta que ``mas`` es falso."""
+        paginas = []
+        while True:
+            datos = self.client.get(reverse('api-sync'), {'since': desde, 'limite': limite}).json()
+            paginas.append(datos)
+            desde = datos['hasta']
+            if not datos['mas']:
+                return paginas
+
+    def test_paginas(self):
+        paginas = self.sincronizar()
+        self.assertGreater(len(paginas), 2)
+        codigos = [fila['codigo'] for pagina in paginas for fila in pagina['productos']]
+        self.assertEqual(sorted(codigos), [p.codigo for p in self.productos])
+        # Una modificacion posterior vuelve a entregar solo ese producto, con un seq mayor
+        hasta = paginas[-1]['hasta']
+        self.productos[0].nombre = 'Sello nuevo'
+        self.productos[0].save()
+        self.productos[0].save()
+        paginas = self.sincronizar(hasta)
+        self.assertEqual([fila['nombre'] for p in paginas for fila in p['productos']], ['Sello nuevo'])
+        self.assertGreater(paginas[-1]['hasta'], hasta)
+        self.assertEqual(Cambio.objects.filter(modelo='producto', objeto_id=self.productos[0].pk).count(), 1)
+
+    def test_lapidas(self):
+        producto = self.productos[1]
+        movimiento = stock.crear_movimiento(producto, 'ENTRADA', 2)
+        hasta = self.sincronizar()[-1]['hasta']
+        pk = producto.pk
+        producto.delete()
+        paginas = self.sincronizar(hasta)
+        eliminados = paginas[-1]['eliminados']
+        self.assertEqual(eliminados['productos'], [pk])
+        self.assertEqual(eliminados['movimientos'], [movimiento.pk])
+        self.assertEqual(paginas[-1]['productos'], [])
+        # Desde cero el objeto borrado solo aparece como lapida
+        completa = self.sincronizar(limite=50)
+        self.assertNotIn(pk, [fila['id'] for p in completa for fila in p['productos']])
+        self.assertIn(pk, [i for p in completa for i in p['eliminados']['productos']])
+
+
+class BusquedaProductosTest(TestCase):
+    """Filtros por prefijo y por palabras del listado, con orden y cursor de la API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('gestor', password='x')
+        cls.usuario.groups.add(Group.objects.create(name='Gestor de Inventario'))
+        datos = [
+            ('AB1', 'Perno hexagonal', 'Almacén Norte', 5),
+            ('AB2', 'Tuerca', 'almacén sur', 1),
+            ('AC1', 'Perno largo', 'Bodega', 9),
+            ('X1', 'Superperno', 'Patio', 3),
+            ('X2', 'Arandela', 'Patio', 3),
+            ('X3', 'Perno corto', 'Patio', 7),
+        ]
+        for codigo, nombre, ubicacion, cantidad in datos:
+            Producto.objects.create(codigo=codigo, nombre=nombre, ubicacion=ubicacion, cantidad=cantidad)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def codigos(self, **filtros):
+        respuesta = self.client.get(reverse('producto-list'), filtros)
+        return [p.codigo for p in respuesta.context['productos']]
+
+    def test_filtros(self):
+        self.assertEqual(self.codigos(codigo='AB'), ['AB1', 'AB2'])
+        self.assertEqual(self.codigos(codigo='ab'), [])
+        # Palabras que empiezan con lo escrito, no subcadenas
+        self.assertEqual(self.codigos(nombre='perno'), ['AB1', 'AC1', 'X3'])
+        self.assertEqual(self.codigos(nombre='perno larg'), ['AC1'])
+        self.assertEqual(self.codigos(ubicacion='ALMA'), ['AB1', 'AB2'])
+        self.assertEqual(self.codigos(ubicacion='patio', nombre='perno', orden='-cantidad'), ['X3'])
+
+    def test_orden(self):
+        self.assertEqual(self.codigos(orden='-codigo'), ['X3', 'X2', 'X1', 'AC1', 'AB2', 'AB1'])
+        self.assertEqual(self.codigos(orden='cantidad'), ['AB2', 'X1', 'X2', 'AB1', 'X3', 'AC1'])
+        self.assertEqual(self.codigos(ubicacion='p', orden='-cantidad'), ['X3', 'X2', 'X1'])
+
+    def test_cursor_ida_y_vuelta(self):
+        url = reverse('api-productos') + '?orden=-cantidad&limite=2&campos=codigo'
+        paginas = []
+        while url:
+            datos = self.client.get(url).json()
+            paginas.append([fila['codigo'] for fila in datos['resultados']])
+            url, anterior = datos['siguiente'], datos['anterior']
+        self.assertEqual(paginas, [['AC1', 'X3'], ['AB1', 'X2'], ['X1', 'AB2']])
+        # Hacia atras se recorren las mismas paginas
+        vuelta = []
+        while anterior:
+            datos = self.client.get(anterior).json()
+            vuelta.append([fila['codigo'] for fila in datos['resultados']])
+            anterior = datos['anterior']
+        self.assertEqual(vuelta, paginas[-2::-1])
+
+    def codigos_busqueda(self, texto):
+        return [p['codigo'] for p in busqueda.buscar(texto)]
+
+    def test_buscar(self):
+        self.assertEqual(sorted(self.codigos_busqueda('pern')), ['AB1', 'AC1', 'X3'])
+        self.assertEqual(self.codigos_busqueda('perno hexa'), ['AB1'])
+        # El codigo tambien esta indexado; los caracteres sueltos no rompen la consulta
+        self.assertEqual(self.codigos_busqueda('x2'), ['X2'])
+        self.assertEqual(self.codigos_busqueda('"tuerca*'), ['AB2'])
+        self.assertEqual(self.codigos_busqueda('!!'), [])
+
+    def test_indice_al_guardar(self):
+        producto = Producto.objects.get(codigo='X2')
+        producto.nombre = 'Golilla'
+        producto.save()
+        self.assertEqual(self.codigos_busqueda('arandela'), [])
+        self.assertEqual(self.codigos_busqueda('golilla'), ['X2'])
+        self.assertEqual(self.codigos(nombre='goli'), ['X2'])
+        producto.delete()
+        self.assertEqual(self.codigos_busqueda('golilla'), [])
+
+
+class StockUbicacionesTest(TestCase):
+    """Las transferencias mueven stock entre ubicaciones y editar un producto no lo reconcilia."""
+
+    def setUp(self):
+        self.producto = Producto.objects.create(codigo='U1', nombre='Union', ubicacion='Bodega', cantidad=10)
+        self.bodega = Ubicacion.objects.get(nombre='Bodega')
+        self.taller = Ubicacion.objects.create(nombre='Taller')
+
+    def stock(self):
+        return dict(self.producto.stock_ubicaciones.filter(cantidad__gt=0).values_list('ubicacion__nombre', 'cantidad'))
+
+    def test_transferencia(self):
+        stock.crear_movimiento(
+            self.producto, 'TRANSFERENCIA', 4, ubicacion_origen=self.bodega, ubicacion_destino=self.taller,
+        )
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 10)
+        self.assertEqual(self.stock(), {'Bodega': 6, 'Taller': 4})
+        self.assertEqual(
+            dict(Ubicacion.objects.values_list('nombre', 'cantidad')), {'Bodega': 6, 'Taller': 4},
+        )
+
+    def test_edicion_sin_cambios_de_stock(self):
+        self.producto.nombre = 'Union americana'
+        with CaptureQueriesContext(connection) as consultas:
+            self.producto.save()
+        tablas = ' '.join(c['sql'] for c in consultas.captured_queries)
+        self.assertNotIn('inventario_stockubicacion', tablas)
+        self.assertNotIn('inventario_lote', tablas)
+        # Cambiar la ubicacion principal si lleva el stock
+        self.producto.ubicacion = 'Taller'
+        self.producto.save()
+        self.assertEqual(self.stock(), {'Taller': 10})
+
+
+class ImportacionMovimientosTest(TestCase):
+    """Las lineas con errores se informan y el resto se aplica al stock y a los lotes."""
+
+    def setUp(self):
+        self.producto = Producto.objects.create(codigo='I1', nombre='Ignitor', ubicacion='Bodega', cantidad=0)
+        Ubicacion.objects.create(nombre='Taller')
+
+    def test_errores_y_totales(self):
+        manana = timezone.localdate() + datetime.timedelta(days=1)
+        filas = [
+            {'codigo': 'I1', 'tipo_movimiento': 'ENTRADA', 'cantidad': 10, 'lote': 'A', 'fecha_vencimiento': manana},
+            {'codigo': 'I1', 'tipo_movimiento': 'SALIDA', 'cantidad': 'x'},
+            {'codigo': 'NO', 'tipo_movimiento': 'ENTRADA', 'cantidad': 1},
+            {'codigo': 'I1', 'tipo_movimiento': 'SALIDA', 'cantidad': 20},
+            {'codigo': 'I1', 'tipo_movimiento': 'ENTRADA', 'cantidad': 5},
+            {'codigo': 'I1', 'tipo_movimiento': 'TRANSFERENCIA', 'cantidad': 4, 'origen': 'Bodega', 'destino': 'Taller'},
+            {'codigo': 'I1', 'tipo_movimiento': 'SALIDA', 'cantidad': 3},
+        ]
+        resultado = importacion.importar_movimientos(importacion.numerar(filas))
+        self.assertEqual(resultado.creados, 4)
+        self.assertEqual([e['linea'] for e in resultado.errores], [2, 3, 4])
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 12)
+        self.assertEqual(
+            dict(self.producto.stock_ubicaciones.values_list('ubicacion__nombre', 'cantidad')),
+            {'Bodega': 8, 'Taller': 4},
+        )
+        # Cada lote apunta a la entrada que lo creo; la salida consume primero el que vence antes
+        entradas = MovimientoInventario.objects.filter(tipo_movimiento='ENTRADA').order_by('pk')
+        self.assertEqual(
+            [(lote.movimiento_id, lote.cantidad) for lote in self.producto.lotes.order_by('movimiento_id')],
+            [(entradas[0].pk, 7), (entradas[1].pk, 5)],
+        )
+        self.assertEqual(self.producto.lotes.get(movimiento=entradas[0]).codigo, 'A')
+
+
+class ImportacionCatalogoTest(TestCase):
+    """La carga del catalogo crea o actualiza por codigo y solo toca los campos editables."""
+
+    def setUp(self):
+        self.producto = Producto.objects.create(
+            codigo='C1', nombre='Cable', descripcion='Cobre', ubicacion='Bodega', cantidad=10, umbral_stock_bajo=2,
+        )
+
+    def filas(self):
+        return importacion.numerar([
+            {'codigo': 'C1', 'nombre': 'Cable 2mm', 'descripcion': 'Cobre', 'ubicacion': 'Bodega',
+             'cantidad': 99, 'umbral_stock_bajo': 2, 'categorias': 'Electricidad'},
+            {'codigo': 'C2', 'nombre': 'Cinta', 'ubicacion': 'Patio', 'cantidad': 5, 'categorias': 'Electricidad, Aislantes'},
+            {'codigo': '', 'nombre': 'Sin codigo', 'ubicacion': 'Patio'},
+            {'codigo': 'C3', 'nombre': 'Conector', 'ubicacion': 'Patio', 'cantidad': -1},
+        ])
+
+    def test_simular(self):
+        resultado = importacion.importar_catalogo(self.filas(), simular=True)
+        self.assertEqual((resultado.creados, resultado.actualizados), (1, 1))
+        self.assertEqual([e['linea'] for e in resultado.errores], [3, 4])
+        self.assertEqual(resultado.cambios[0]['nombre'], ['Cable', 'Cable 2mm'])
+        self.assertFalse(Producto.objects.filter(codigo='C2').exists())
+        self.assertFalse(Categoria.objects.exists())
+
+    def test_upsert(self):
+        resultado = importacion.importar_catalogo(self.filas())
+        self.assertEqual((resultado.creados, resultado.actualizados, resultado.categorias_creadas), (1, 1, 2))
+        self.producto.refresh_from_db()
+        # La cantidad de un producto existente no cambia con la carga
+        self.assertEqual((self.producto.nombre, self.producto.cantidad), ('Cable 2mm', 10))
+        self.assertEqual(list(self.producto.categorias.values_list('nombre', flat=True)), ['Electricidad'])
+        nuevo = Producto.objects.get(codigo='C2')
+        self.assertEqual(nuevo.cantidad, 5)
+        self.assertEqual(list(nuevo.lotes.values_list('cantidad', flat=True)), [5])
+        self.assertEqual(list(nuevo.stock_ubicaciones.values_list('ubicacion__nombre', 'cantidad')), [('Patio', 5)])
+        self.assertEqual(busqueda.buscar('cinta')[0]['codigo'], 'C2')
+        # Repetir el archivo no cambia nada
+        resultado = importacion.importar_catalogo(self.filas())
+        self.assertEqual((resultado.creados, resultado.actualizados, resultado.sin_cambios), (0, 0, 2))
+
+
+class VencimientoLotesTest(TestCase):
+    """La fecha del producto solo aplica al stock que se agrega; la de un lote se corrige aparte."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('gestor', password='x')
+        cls.usuario.groups.add(Group.objects.create(name='Gestor de Inventario'))
+        cls.hoy = timezone.localdate()
+        cls.producto = Producto.objects.create(
+            codigo='L1', nombre='Lubricante', ubicacion='Bodega', cantidad=5, fecha_vencimiento=cls.hoy,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def patch(self, url, datos):
+        return self.client.patch(url, data=datos, content_type='application/json')
+
+    def test_fecha_en_edicion(self):
+        url = reverse('api-producto', args=['L1'])
+        otra = (self.hoy + datetime.timedelta(days=30)).isoformat()
+        respuesta = self.patch(url, {'fecha_vencimiento': otra})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('fecha_vencimiento', respuesta.json()['errores'])
+        # El stock nuevo trae su fecha en la entrada y el producto muestra la mas proxima
+        respuesta = self.client.post(
+            reverse('api-movimientos'), content_type='application/json',
+            data={'producto': 'L1', 'tipo_movimiento': 'ENTRADA', 'cantidad': 3, 'fecha_vencimiento': otra},
+        )
+        self.assertEqual(respuesta.status_code, 201)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.fecha_vencimiento, self.hoy)
+        self.assertEqual(sorted(self.producto.lotes.values_list('cantidad', 'fecha_vencimiento')),
+                         [(3, self.hoy + datetime.timedelta(days=30)), (5, self.hoy)])
+
+    def test_corregir_lote(self):
+        lote = self.producto.lotes.get()
+        url = reverse('api-lote', args=['L1', lote.pk])
+        otra = self.hoy + datetime.timedelta(days=60)
+        respuesta = self.patch(url, {'fecha_vencimiento': otra.isoformat()})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['fecha_vencimiento'], otra.isoformat())
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.fecha_vencimiento, otra)
+        self.assertEqual(self.patch(url, {}).status_code, 400)
+
+    def test_consumo_fefo(self):
+        producto = Producto.objects.create(codigo='F1', nombre='Filtro', ubicacion='Bodega', cantidad=0)
+        for codigo, cantidad, dias in (('LEJANO', 5, 30), ('SIN-FECHA', 5, None), ('PROXIMO', 4, 5)):
+            fecha = self.hoy + datetime.timedelta(days=dias) if dias is not None else None
+            stock.crear_movimiento(producto, 'ENTRADA', cantidad, lote=codigo, fecha_vencimiento=fecha)
+        # Sale primero lo que vence antes; lo que no vence queda al final
+        stock.crear_movimiento(producto, 'SALIDA', 7)
+        self.assertEqual(
+            list(producto.lotes.order_by('codigo').values_list('codigo', 'cantidad')),
+            [('LEJANO', 2), ('PROXIMO', 0), ('SIN-FECHA', 5)],
+        )
+        stock.crear_movimiento(producto, 'SALIDA', 4)
+        self.assertEqual([(l.codigo, l.cantidad) for l in lotes.lotes_de(producto)], [('SIN-FECHA', 3)])
+        producto.refresh_from_db()
+        self.assertIsNone(producto.fecha_vencimiento)
+
+
+class FiltroMovimientosTest(TestCase):
+    """Cada filtro del historial de movimientos, y los dias completos en el rango de fechas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create_user('ana', password='x')
+        cls.beto = User.objects.create_user('beto', password='x')
+        p1 = Producto.objects.create(codigo='M1', nombre='Martillo', ubicacion='Bodega', cantidad=0)
+        p2 = Producto.objects.create(codigo='M2', nombre='Mazo', ubicacion='Bodega', cantidad=0)
+        hoy = timezone.localdate()
+        cls.hoy = hoy
+        datos = [
+            ('e1', p1, 'ENTRADA', None, cls.ana, hoy - datetime.timedelta(days=10)),
+            ('u1', p1, 'USO_PROYECTO', 'Puente', cls.beto, hoy - datetime.timedelta(days=2)),
+            ('e2', p2, 'ENTRADA', None, cls.beto, hoy - datetime.timedelta(days=2)),
+            ('u2', p2, 'USO_PROYECTO', 'Galpon', cls.ana, hoy),
+        ]
+        cls.ids = {}
+        for nombre, producto, tipo, proyecto, usuario, dia in datos:
+            movimiento = stock.crear_movimiento(producto, tipo, 1, usuario=usuario, proyecto=proyecto)
+            # Al final del dia, para comprobar que "hasta" lo incluye completo
+            fecha = timezone.make_aware(datetime.datetime.combine(dia, datetime.time(23, 59)))
+            MovimientoInventario.objects.filter(pk=movimiento.pk).update(fecha=fecha)
+            cls.ids[movimiento.pk] = nombre
+
+    def filtrar(self, **datos):
+        form = FiltroMovimientosForm(datos)
+        return sorted(self.ids[pk] for pk in form.filtrar(MovimientoInventario.objects.all()).values_list('pk', flat=True))
+
+    def test_filtros(self):
+        self.assertEqual(self.filtrar(producto='M1'), ['e1', 'u1'])
+        self.assertEqual(self.filtrar(tipo_movimiento='USO_PROYECTO'), ['u1', 'u2'])
+        self.assertEqual(self.filtrar(proyecto='Puente'), ['u1'])
+        self.assertEqual(self.filtrar(usuario='ana'), ['e1', 'u2'])
+        self.assertEqual(self.filtrar(usuario='ana', producto='M2'), ['u2'])
+
+    def test_fechas(self):
+        hace_dos = (self.hoy - datetime.timedelta(days=2)).isoformat()
+        self.assertEqual(self.filtrar(desde=hace_dos), ['e2', 'u1', 'u2'])
+        self.assertEqual(self.filtrar(hasta=hace_dos), ['e1', 'e2', 'u1'])
+        self.assertEqual(self.filtrar(desde=hace_dos, hasta=hace_dos), ['e2', 'u1'])
+        # Un formulario invalido no filtra
+        self.assertEqual(self.filtrar(desde='ayer', producto='M1'), ['e1', 'e2', 'u1', 'u2'])
+
+
+class AlertasTest(TestCase):
+    """en_alerta sigue al stock y el navbar cuenta lo mismo que los listados."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('gestor', password='x')
+        cls.usuario.groups.add(Group.objects.create(name='Gestor de Inventario'))
+        cls.hoy = timezone.localdate()
+
+    def setUp(self):
+        cache.clear()
+        self.producto = Producto.objects.create(codigo='A1', nombre='Aceite', ubicacion='Bodega', cantidad=8,
+                                                umbral_stock_bajo=5)
+
+    def en_alerta(self):
+        return Producto.objects.filter(pk=self.producto.pk).values_list('en_alerta', flat=True).get()
+
+    def test_save(self):
+        self.assertFalse(self.en_alerta())
+        # El umbral se compara con la cantidad de la fila, no con la del objeto
+        Producto.objects.filter(pk=self.producto.pk).update(cantidad=3)
+        self.producto.umbral_stock_bajo = 4
+        self.producto.save()
+        self.assertTrue(self.en_alerta())
+        self.producto.umbral_stock_bajo = 2
+        self.producto.save()
+        self.assertFalse(self.en_alerta())
+
+    def test_movimientos(self):
+        stock.crear_movimiento(self.producto, 'SALIDA', 3)
+        self.assertTrue(self.en_alerta())
+        stock.crear_movimiento(self.producto, 'ENTRADA', 1)
+        self.assertFalse(self.en_alerta())
+        importacion.importar_movimientos(importacion.numerar([
+            {'codigo': 'A1', 'tipo_movimiento': 'USO_PROYECTO', 'cantidad': 6},
+        ]))
+        self.assertTrue(self.en_alerta())
+
+    def test_conteos_navbar(self):
+        # Dos lotes por vencer del mismo producto y uno lejano
+        stock.crear_movimiento(self.producto, 'SALIDA', 8)
+        for dias in (3, 10, 90):
+            stock.crear_movimiento(self.producto, 'ENTRADA', 1, fecha_vencimiento=self.hoy + datetime.timedelta(days=dias))
+        self.client.force_login(self.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.get(reverse('productos-vencimiento'))
+        self.assertEqual(len(respuesta.context['lotes_vencimiento']), 2)
+        self.assertEqual(respuesta.context['alertas_inventario']['vencimiento'], 2)
+        self.assertEqual(respuesta.context['alertas_inventario']['stock_bajo'], 1)
+
+
+class EdicionProductoTest(TestCase):
+    """Editar un producto no toca su stock: la cantidad cambia solo con movimientos, tambien los ajustes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('gestor', password='x')
+        cls.usuario.groups.add(Group.objects.create(name='Gestor de Inventario'))
+        cls.producto = Producto.objects.create(
+            codigo='A1', nombre='Arandela', ubicacion='Bodega', cantidad=10, umbral_stock_bajo=12,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_edicion_no_pisa_movimientos(self):
+        # El formulario se carga antes de que se registre una entrada
+        leido = Producto.objects.get(pk=self.producto.pk)
+        stock.crear_movimiento(self.producto, 'ENTRADA', 5)
+        form = ProductoForm({'codigo': 'A1', 'nombre': 'Arandela plana', 'ubicacion': 'Bodega'}, instance=leido)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.nombre, self.producto.cantidad), ('Arandela plana', 15))
+        self.assertFalse(self.producto.en_alerta)
+        self.assertEqual(self.producto.stock_ubicaciones.aggregate(total=Sum('cantidad'))['total'], 15)
+
+        respuesta = self.client.post(
+            reverse('producto-editar', args=[self.producto.pk]), {'codigo': 'A1', 'nombre': 'Arandela', 'ubicacion': 'Bodega'}
+        )
+        self.assertEqual(respuesta.status_code, 302)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 15)
+
+    def test_cantidad_por_api(self):
+        respuesta = self.client.patch(
+            reverse('api-producto', args=['A1']), data={'cantidad': 12}, content_type='application/json'
+        )
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('cantidad', respuesta.json()['errores'])
+        # Enviar la cantidad actual junto con otros cambios no es un error
+        respuesta = self.client.patch(
+            reverse('api-producto', args=['A1']), data={'cantidad': 10, 'umbral_stock_bajo': 3},
+            content_type='application/json',
+        )
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_ajuste_y_cierre(self):
+        entrada = stock.crear_movimiento(self.producto, 'ENTRADA', 5)
+        MovimientoInventario.objects.filter(pk=entrada.pk).update(fecha=entrada.fecha - datetime.timedelta(days=1))
+        respuesta = self.client.post(
+            reverse('api-movimientos'), content_type='application/json',
+            data={'producto': 'A1', 'tipo_movimiento': 'AJUSTE_SALIDA', 'cantidad': 3},
+        )
+        self.assertEqual(respuesta.status_code, 201)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 12)
+
+        historial.generar_cierres()
+        ayer = timezone.localdate(entrada.fecha - datetime.timedelta(days=1))
+        self.assertEqual(SnapshotStock.objects.get(producto=self.producto, fecha=ayer).cantidad, 15)
+        self.assertEqual(historial.stock_en_fecha(self.producto, ayer), 15)
+
+
+class ReporteInventarioTest(TestCase):
+    """El CSV se envia mientras se genera; un xlsx grande va a la cola en vez de armarse en la peticion."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('gestor', password='x')
+        cls.usuario.groups.add(Group.objects.create(name='Gestor de Inventario'))
+        for i in range(3):
+            Producto.objects.create(codigo=f'R{i}', nombre=f'Rodamiento {i}', ubicacion='Bodega', cantidad=i)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def pedir(self, formato):
+        return self.client.post(reverse('reporte-inventario'), {'formato': formato})
+
+    def test_csv_por_partes(self):
+        respuesta = self.pedir('csv')
+        self.assertIsInstance(respuesta, StreamingHttpResponse)
+        partes = iter(respuesta.streaming_content)
+        # Los encabezados salen antes de leer los productos
+        with self.assertNumQueries(0):
+            encabezados = next(partes).decode()
+        self.assertTrue(encabezados.startswith('\ufeffCódigo,Nombre'))
+        filas = b''.join(partes).decode().splitlines()
+        self.assertEqual([fila.split(',')[0] for fila in filas], ['R0', 'R1', 'R2'])
+
+    def test_xlsx_pequeno(self):
+        respuesta = self.pedir('xlsx')
+        self.assertTrue(respuesta.streaming)
+        libro = openpyxl.load_workbook(io.BytesIO(b''.join(respuesta.streaming_content)), read_only=True)
+        self.assertEqual(len(list(libro.active.rows)), 4)
+
+    @override_settings(REPORTES_XLSX_MAXIMO_DIRECTO=2)
+    def test_xlsx_grande_en_cola(self):
+        respuesta = self.pedir('xlsx')
+        trabajo = TrabajoReporte.objects.get()
+        self.assertRedirects(respuesta, reverse('reporte-trabajo', args=[trabajo.pk]))
+        self.assertEqual(trabajo.parametros['formato'], 'xlsx')
+        # El CSV se sigue enviando directo con cualquier tamaño
+        self.assertTrue(self.pedir('csv').streaming)
+        self.assertEqual(TrabajoReporte.objects.count(), 1)
+
+
+@override_settings(REPORTES_SEGUNDOS_PROCESO=60, REPORTES_MAX_INTENTOS=2)
+class ReportesAbandonadosTest(TestCase):
+    """Un trabajo EN_PROCESO de un worker caido vuelve a la cola al vencer su plazo."""
+
+    def trabajo(self, hace, intentos):
+        return TrabajoReporte.objects.create(
+            clave='x', estado='EN_PROCESO', intentos=intentos,
+            tomado=timezone.now() - datetime.timedelta(seconds=hace),
+        )
+
+    def test_reclamar_vencidos(self):
+        vigente = self.trabajo(30, 1)
+        abandonado = self.trabajo(120, 1)
+        agotado = self.trabajo(120, 2)
+        self.assertEqual(reportes.reclamar_vencidos(), 2)
+        vigente.refresh_from_db()
+        abandonado.refresh_from_db()
+        agotado.refresh_from_db()
+        self.assertEqual(vigente.estado, 'EN_PROCESO')
+        self.assertEqual((abandonado.estado, abandonado.tomado), ('PENDIENTE', None))
+        self.assertEqual(agotado.estado, 'ERROR')
+
+
+class ResumenPreciosTest(TestCase):
+    """El resumen de precios del producto se recalcula al guardar o borrar un PrecioCompra."""
+
+    def setUp(self):
+        self.producto = Producto.objects.create(codigo='P1', nombre='Pintura', ubicacion='Bodega')
+        self.hoy = timezone.localdate()
+
+    def precio(self, valor, dias):
+        return PrecioCompra.objects.create(
+            producto=self.producto, precio=Decimal(valor), fecha_compra=self.hoy - datetime.timedelta(days=dias),
+        )
+
+    def resumen(self):
+        return Producto.objects.filter(pk=self.producto.pk).values_list(*Producto.CAMPOS_PRECIO).get()
+
+    def test_resumen(self):
+        reciente = self.precio('120.00', 1)
+        # Uno mas antiguo registrado despues no es el precio actual
+        self.precio('100.00', 30)
+        self.assertEqual(self.resumen(), (
+            Decimal('120.00'), self.hoy - datetime.timedelta(days=1), Decimal('100.00'), Decimal('120.00'),
+            Decimal('110.00'), 2,
+        ))
+        reciente.precio = Decimal('90.00')
+        reciente.save()
+        self.assertEqual(self.resumen()[0], Decimal('90.00'))
+        self.assertEqual(self.resumen()[2], Decimal('90.00'))
+        reciente.delete()
+        self.assertEqual(self.resumen()[0], Decimal('100.00'))
+        self.assertEqual(self.resumen()[5], 1)
+
+    def test_guardar_producto_no_pisa_resumen(self):
+        leido = Producto.objects.get(pk=self.producto.pk)
+        self.precio('50.00', 0)
+        leido.nombre = 'Pintura epoxica'
+        leido.save()
+        self.assertEqual(self.resumen()[0], Decimal('50.00'))
+
+
+class PronosticosTest(TestCase):
+    """Consumo diario, desviacion y punto de reorden sobre un historial conocido."""
+
+    def setUp(self):
+        self.producto = Producto.objects.create(codigo='R1', nombre='Rodamiento', ubicacion='Bodega', cantidad=100)
+        self.otro = Producto.objects.create(codigo='R2', nombre='Reten', ubicacion='Bodega', cantidad=100)
+        hoy = timezone.localdate()
+        historial = [
+            (self.producto, 'SALIDA', 4, 1),
+            (self.producto, 'SALIDA', 2, 2),
+            (self.producto, 'USO_PROYECTO', 4, 2),
+            (self.producto, 'USO_PROYECTO', 10, 5),
+            # Fuera de la ventana: hoy, hace 20 dias y las entradas
+            (self.producto, 'SALIDA', 50, 0),
+            (self.producto, 'SALIDA', 30, 20),
+            (self.producto, 'ENTRADA', 40, 3),
+            (self.otro, 'SALIDA', 5, 20),
+        ]
+        for producto, tipo, cantidad, dias in historial:
+            movimiento = stock.crear_movimiento(producto, tipo, cantidad)
+            fecha = timezone.make_aware(datetime.datetime.combine(hoy - datetime.timedelta(days=dias), datetime.time(12)))
+            MovimientoInventario.objects.filter(pk=movimiento.pk).update(fecha=fecha)
+        # Un pronostico anterior de un producto que ya no consume se descarta
+        PronosticoDemanda.objects.create(
+            producto=self.otro, consumo_diario=1, desviacion_diaria=0, dias_historial=10, punto_reorden=7,
+            calculado=timezone.now() - datetime.timedelta(days=1),
+        )
+
+    def test_pronostico(self):
+        self.assertEqual(pronosticos.calcular(dias=10), 1)
+        pronostico = PronosticoDemanda.objects.get()
+        # Dias con 4, 6 y 10 unidades y siete en cero: media 2, varianza 152/10 - 4
+        self.assertEqual(pronostico.producto, self.producto)
+        self.assertAlmostEqual(pronostico.consumo_diario, 2.0)
+        self.assertAlmostEqual(pronostico.desviacion_diaria, math.sqrt(11.2))
+        # 2 * 7 + 1.65 * 3.35 * sqrt(7) = 28.6
+        self.assertEqual(pronostico.punto_reorden, 29)
+        self.assertEqual(pronostico.dias_cobertura, 20)
+
+    def test_aplicar_umbrales(self):
+        pronosticos.calcular(dias=10)
+        self.assertEqual(pronosticos.aplicar_umbrales(), 1)
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.cantidad, self.producto.umbral_stock_bajo), (40, 29))
+        self.assertFalse(self.producto.en_alerta)
+        self.assertEqual(pronosticos.aplicar_umbrales(), 0)
+        # El umbral nuevo rige para los movimientos siguientes
+        stock.crear_movimiento(self.producto, 'SALIDA', 11)
+        self.producto.refresh_from_db()
+        self.assertTrue(self.producto.en_alerta)
+
+
+class ValorizacionGuardadaTest(TestCase):
+    """Los cambios dejan pendiente solo al producto afectado; el total usa el ultimo valor calculado."""
+
+    def setUp(self):
+        hoy = timezone.localdate()
+        self.productos = []
+        for i in range(3):
+            producto = Producto.objects.create(codigo=f'V{i}', nombre=f'Valvula {i}', ubicacion='Bodega', cantidad=0)
+            PrecioCompra.objects.create(producto=producto, precio=Decimal('10.00'), fecha_compra=hoy)
+            stock.crear_movimiento(producto, 'ENTRADA', 4)
+            self.productos.append(producto)
+
+    def test_recalculo_incremental(self):
+        self.assertEqual(valorizacion.valorizacion_total()['pendientes'], 3)
+        self.assertEqual(valorizacion.actualizar(), 3)
+        totales = valorizacion.valorizacion_total()
+        self.assertEqual((totales['pendientes'], totales['unidades'], totales['valor_fifo']), (0, 12, Decimal('120.00')))
+
+        stock.crear_movimiento(self.productos[0], 'SALIDA', 1)
+        totales = valorizacion.valorizacion_total()
+        # Hasta que corra el worker se suma el valor anterior del producto
+        self.assertEqual((totales['pendientes'], totales['valor_fifo']), (1, Decimal('120.00')))
+        self.assertEqual(valorizacion.valor_producto(self.productos[0]).valor_fifo, Decimal('30.00'))
+
+        self.assertEqual(valorizacion.actualizar(), 1)
+        self.assertEqual(valorizacion.valorizacion_total()['valor_fifo'], Decimal('110.00'))
+        self.assertEqual(ValorizacionProducto.objects.filter(vigente=True).count(), 3)
+
+
+class EfectosMovimientoTest(TestCase):
+    """La version del inventario sube al confirmar el movimiento, y los lotes vuelven a cuadrar."""
+
+    def setUp(self):
+        self.producto = Producto.objects.create(codigo='E1', nombre='Empaquetadura', ubicacion='Bodega', cantidad=0)
+        stock.crear_movimiento(self.producto, 'ENTRADA', 10, lote='E-A')
+
+    def version(self):
+        return VersionInventario.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+    def test_version_al_confirmar(self):
+        antes = self.version()
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.crear_movimiento(self.producto, 'SALIDA', 3)
+            # Dentro de la transaccion la fila de la version no se toca
+            self.assertEqual(self.version(), antes)
+        self.assertGreater(self.version(), antes)
+
+    def test_lotes_descuadrados(self):
+        self.producto.lotes.update(cantidad=4)
+        with self.assertLogs('inventario.stock', 'WARNING'):
+            stock.crear_movimiento(self.producto, 'SALIDA', 6)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 4)
+        self.assertEqual(self.producto.lotes.aggregate(total=Sum('cantidad'))['total'], 4)
+
+
+class ConcurrenciaStockTest(TransactionTestCase):
+    """Movimientos concurrentes sobre un producto: el stock final debe cuadrar con los registrados.
+
+    Cada hilo usa su propia conexion, asi que hace falta TransactionTestCase:
+    con TestCase el producto no se veria fuera de la transaccion de la prueba.
+    Con SQLite la base de pruebas es un archivo (ver settings.py).
+    """
+    hilos = 8
+    movimientos_por_hilo = 15
+    stock_inicial = 100
+
+    def test_movimientos_concurrentes(self):
+        producto = Producto.objects.create(
+            codigo='ESTRES', nombre='Prueba de concurrencia', ubicacion='PRUEBA', cantidad=self.stock_inicial,
+        )
+        resultados = {'ok': 0, 'insuficiente': 0, 'bloqueo': 0}
+        candado = threading.Lock()
+        azar = random.Random(5)
+
+        def trabajador(semilla):
+            azar_hilo = random.Random(semilla)
+            try:
+                for _ in range(self.movimientos_por_hilo):
+                    tipo = azar_hilo.choice(['ENTRADA', 'SALIDA', 'SALIDA', 'USO_PROYECTO'])
+                    try:
+                        stock.crear_movimiento(Producto(pk=producto.pk), tipo, azar_hilo.randint(1, 10))
+                        clave = 'ok'
+                    except stock.StockInsuficienteError:
+                        clave = 'insuficiente'
+                    except OperationalError:
+                        clave = 'bloqueo'
+                    with candado:
+                        resultados[clave] += 1
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=trabajador, args=(azar.random(),)) for _ in range(self.hilos)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        producto.refresh_from_db()
+        neto = MovimientoInventario.objects.filter(producto=producto).aggregate(
+            neto=Sum(stock.cantidad_con_signo())
+        )['neto'] or 0
+        por_ubicacion = producto.stock_ubicaciones.aggregate(total=Sum('cantidad'))['total'] or 0
+        # busy_timeout espera el candado: ningun movimiento debe fallar por bloqueo
+        self.assertEqual(resultados['bloqueo'], 0)
+        self.assertEqual(sum(resultados.values()), self.hilos * self.movimientos_por_hilo)
+        self.assertEqual(resultados['ok'], MovimientoInventario.objects.filter(producto=producto).count())
+        self.assertEqual(producto.cantidad, self.stock_inicial + neto)
+        self.assertEqual(por_ubicacion, producto.cantidad)
+        self.assertGreaterEqual(producto.cantidad, 0)
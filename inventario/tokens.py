@@ -0,0 +1,57 @@
+"""Claves de la API para clientes que no son un navegador (lectores, ERP).
+
+El cliente envia ``Authorization: Bearer <clave>`` en cada peticion; con
+clave no hay sesion ni cookie, asi que esas peticiones no pasan por la
+revision CSRF (ver ``api.ApiView``). En la base solo queda el SHA-256 de la
+clave: se busca por indice unico y no hace falta el hash lento de las
+contraseñas, que en un lector que consulta cada pocos segundos costaria
+mas que la consulta misma.
+"""
+import datetime
+import hashlib
+import secrets
+
+from django.utils import timezone
+
+from .models import TokenApi
+
+ESQUEMA = 'Bearer'
+# ultimo_uso se actualiza a lo sumo una vez por intervalo, no en cada peticion
+INTERVALO_USO = datetime.timedelta(hours=1)
+
+
+class TokenInvalido(Exception):
+    pass
+
+
+def _huella(clave):
+    return hashlib.sha256(clave.encode()).hexdigest()
+
+
+def crear(usuario, nombre):
+    """Crea una clave para ``usuario`` y la devuelve; no se puede volver a consultar."""
+    clave = secrets.token_urlsafe(32)
+    TokenApi.objects.create(usuario=usuario, nombre=nombre, huella=_huella(clave))
+    return clave
+
+
+def autenticar(request):
+    """Usuario de la clave de ``request``, o None si la peticion no trae una.
+
+    Lanza ``TokenInvalido`` si la clave no existe, fue revocada o su usuario
+    esta inactivo.
+    """
+    esquema, _, clave = request.headers.get('Authorization', '').partition(' ')
+    if esquema.lower() != ESQUEMA.lower():
+        return None
+    token = (
+        TokenApi.objects.select_related('usuario')
+        .filter(huella=_huella(clave.strip()), activo=True, usuario__is_active=True)
+        .first()
+    )
+    if token is None:
+        raise TokenInvalido('Clave de API inválida o revocada.')
+    ahora = timezone.now()
+    if token.ultimo_uso is None or token.ultimo_uso < ahora - INTERVALO_USO:
+        TokenApi.objects.filter(pk=token.pk).update(ultimo_uso=ahora)
+    return token.usuario
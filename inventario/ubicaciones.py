@@ -0,0 +1,217 @@
+"""Stock por ubicacion y totales por ubicacion, mantenidos en cada escritura.
+
+``StockUbicacion`` tiene una fila por producto y ubicacion; la suma de las
+filas de un producto es siempre ``Producto.cantidad``. ``Ubicacion.cantidad``
+y ``Ubicacion.productos`` se ajustan con ``F()`` en la misma transaccion que
+el movimiento, asi los tableros leen totales sin recorrer el historial.
+
+``Producto.ubicacion`` sigue siendo texto: es la ubicacion principal del
+producto, donde entran y de donde salen los movimientos que no indican otra.
+Cambiarla lleva a la nueva el stock que habia en la anterior (``cambiar_principal``).
+
+Orden de bloqueo: producto, filas de stock (por id de ubicacion) y totales
+de ubicacion, igual en stock.py, importacion.py y aqui.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Sum, Value, When
+
+from . import catalogo
+from .models import Producto, StockUbicacion, Ubicacion
+
+SIN_UBICACION = 'Sin ubicación'
+
+
+def nombre_principal(texto):
+    return (texto or '').strip()[:100] or SIN_UBICACION
+
+
+def ids_por_nombre(nombres, crear=False):
+    """{nombre: id} de las ubicaciones ``nombres``; con ``crear`` se crean las que falten."""
+    nombres = set(nombres)
+    if crear and nombres:
+        Ubicacion.objects.bulk_create([Ubicacion(nombre=n) for n in nombres], ignore_conflicts=True)
+        catalogo.invalidar_ubicaciones()
+    return dict(Ubicacion.objects.filter(nombre__in=nombres).values_list('nombre', 'id'))
+
+
+def principal(producto_id):
+    """Id de la ubicacion principal del producto, creandola si no existe."""
+    # Se lee de la base: el producto en memoria puede ser solo una referencia por pk
+    nombre = nombre_principal(Producto.objects.filter(pk=producto_id).values_list('ubicacion', flat=True).first())
+    ubicacion_id = Ubicacion.objects.filter(nombre=nombre).values_list('pk', flat=True).first()
+    return ubicacion_id or ids_por_nombre([nombre], crear=True)[nombre]
+
+
+def mover(producto_id, ubicacion_id, delta):
+    """Suma ``delta`` al stock del producto en la ubicacion y a sus totales.
+
+    Devuelve False, sin cambiar nada, si un descuento supera el stock de la
+    ubicacion. Debe llamarse dentro de una transaccion.
+    """
+    if not delta:
+        return True
+    filas = StockUbicacion.objects.filter(producto_id=producto_id, ubicacion_id=ubicacion_id)
+    if delta < 0:
+        if filas.filter(cantidad=-delta).update(cantidad=0):
+            productos = -1
+        elif filas.filter(cantidad__gt=-delta).update(cantidad=F('cantidad') + delta):
+            productos = 0
+        else:
+            return False
+    elif filas.filter(cantidad=0).update(cantidad=delta):
+        productos = 1
+    elif filas.update(cantidad=F('cantidad') + delta):
+        productos = 0
+    else:
+        productos = 1
+        try:
+            with transaction.atomic():
+                StockUbicacion.objects.create(producto_id=producto_id, ubicacion_id=ubicacion_id, cantidad=delta)
+        except IntegrityError:
+            # Otra transaccion creo la fila entre el UPDATE y el INSERT
+            if filas.filter(cantidad=0).update(cantidad=delta):
+                productos = 1
+            else:
+                filas.update(cantidad=F('cantidad') + delta)
+                productos = 0
+    Ubicacion.objects.filter(pk=ubicacion_id).update(cantidad=F('cantidad') + delta, productos=F('productos') + productos)
+    return True
+
+
+def aplicar_saldos(antes, despues):
+    """Escribe en bloque los saldos ``despues`` ({(producto_id, ubicacion_id): cantidad}).
+
+    ``antes`` tiene, para los pares que ya tienen fila, ``(id_fila, cantidad)``.
+    Un UPDATE por cada variacion distinta y uno por cada ajuste de totales.
+    """
+    nuevas = []
+    por_delta = {}
+    totales = {}
+    for par, saldo in despues.items():
+        fila_id, previo = antes.get(par, (None, 0))
+        if saldo == previo:
+            continue
+        if fila_id is None:
+            nuevas.append(StockUbicacion(producto_id=par[0], ubicacion_id=par[1], cantidad=saldo))
+        else:
+            por_delta.setdefault(saldo - previo, []).append(fila_id)
+        total = totales.setdefault(par[1], [0, 0])
+        total[0] += saldo - previo
+        total[1] += (saldo > 0) - (previo > 0)
+
+    for delta, ids in por_delta.items():
+        StockUbicacion.objects.filter(pk__in=ids).update(cantidad=F('cantidad') + delta)
+    StockUbicacion.objects.bulk_create(nuevas, batch_size=1000)
+    por_total = {}
+    for ubicacion_id, total in totales.items():
+        por_total.setdefault(tuple(total), []).append(ubicacion_id)
+    for (cantidad, productos), ids in por_total.items():
+        Ubicacion.objects.filter(pk__in=sorted(ids)).update(
+            cantidad=F('cantidad') + cantidad, productos=F('productos') + productos
+        )
+
+
+def recalcular_totales(ubicacion_ids=None):
+    """Recalcula desde StockUbicacion los totales de las ubicaciones (o de todas)."""
+    ubicaciones = Ubicacion.objects.all()
+    if ubicacion_ids is not None:
+        ubicaciones = ubicaciones.filter(pk__in=list(ubicacion_ids))
+    totales = {
+        fila['ubicacion_id']: fila
+        for fila in StockUbicacion.objects.filter(ubicacion__in=ubicaciones).values('ubicacion_id').annotate(
+            total=Sum('cantidad'), con_stock=Sum(Case(When(cantidad__gt=0, then=Value(1)), default=Value(0))),
+        )
+    }
+    for ubicacion in ubicaciones.only('pk'):
+        fila = totales.get(ubicacion.pk, {})
+        Ubicacion.objects.filter(pk=ubicacion.pk).update(
+            cantidad=fila.get('total') or 0, productos=fila.get('con_stock') or 0
+        )
+
+
+@transaction.atomic
+def cambiar_principal(anteriores):
+    """Lleva a la ubicacion principal actual el stock que cada producto tenia en la anterior.
+
+    ``anteriores`` es {producto_id: texto de ``Producto.ubicacion`` antes del
+    cambio}. Cambiar la ubicacion de un producto es moverlo: si el stock se
+    quedara en la ubicacion vieja, las salidas sin origen no lo encontrarian.
+    Debe llamarse despues de guardar la ubicacion nueva y antes de ``conciliar``.
+    """
+    anteriores = {pk: nombre_principal(texto) for pk, texto in anteriores.items()}
+    if not anteriores:
+        return
+    # El producto se bloquea primero, como en los movimientos
+    productos = Producto.objects.select_for_update().filter(pk__in=list(anteriores)).values_list('pk', 'ubicacion')
+    cambios = [
+        (pk, anteriores[pk], nombre_principal(texto))
+        for pk, texto in productos
+        if nombre_principal(texto) != anteriores[pk]
+    ]
+    if not cambios:
+        return
+    ids = ids_por_nombre({a for _, a, _ in cambios})
+    ids.update(ids_por_nombre({n for _, _, n in cambios}, crear=True))
+    for pk, anterior, nueva in cambios:
+        if anterior not in ids:
+            continue
+        cantidad = (
+            StockUbicacion.objects.filter(producto_id=pk, ubicacion_id=ids[anterior])
+            .values_list('cantidad', flat=True).first()
+        )
+        if cantidad:
+            for ubicacion_id, delta in sorted({ids[anterior]: -cantidad, ids[nueva]: cantidad}.items()):
+                mover(pk, ubicacion_id, delta)
+
+
+@transaction.atomic
+def conciliar(producto_ids):
+    """Ajusta el stock por ubicacion de los productos a su ``Producto.cantidad``.
+
+    Cubre los productos creados o editados sin movimientos (formulario,
+    carga de catalogo): la diferencia se suma a la ubicacion principal o,
+    si falta stock, se descuenta primero de ella y luego de las mas llenas.
+    Tambien crea la ubicacion principal si aun no existe.
+    """
+    producto_ids = list(producto_ids)
+    if not producto_ids:
+        return
+    # El producto se bloquea primero, como en los movimientos
+    productos = list(
+        Producto.objects.select_for_update().filter(pk__in=producto_ids).values_list('pk', 'ubicacion', 'cantidad')
+    )
+    sumas = dict(
+        StockUbicacion.objects.filter(producto_id__in=producto_ids)
+        .values('producto_id').annotate(total=Sum('cantidad')).values_list('producto_id', 'total')
+    )
+    diferencias = [
+        (pk, ubicacion, cantidad - (sumas.get(pk) or 0))
+        for pk, ubicacion, cantidad in productos
+        if cantidad != (sumas.get(pk) or 0)
+    ]
+    principales = ids_por_nombre({nombre_principal(u) for _, u, _ in productos}, crear=True)
+    for pk, ubicacion, diferencia in diferencias:
+        ubicacion_id = principales[nombre_principal(ubicacion)]
+        if diferencia > 0:
+            mover(pk, ubicacion_id, diferencia)
+            continue
+        filas = (
+            StockUbicacion.objects.filter(producto_id=pk, cantidad__gt=0)
+            .order_by(Case(When(ubicacion_id=ubicacion_id, then=Value(0)), default=Value(1)), '-cantidad', 'pk')
+            .values_list('ubicacion_id', 'cantidad')
+        )
+        for otra, cantidad in filas:
+            descuento = min(cantidad, -diferencia)
+            mover(pk, otra, -descuento)
+            diferencia += descuento
+            if not diferencia:
+                break
+
+
+def stock_de(producto):
+    """Filas de stock con cantidad del producto, con su ubicacion, en orden de nombre."""
+    return (
+        StockUbicacion.objects.filter(producto=producto, cantidad__gt=0)
+        .select_related('ubicacion').order_by('ubicacion__nombre')
+    )
+
@@ -1,18 +1,48 @@
+from django.conf import settings
 from django.urls import path
-from . import views
-from .views import ProductoListView, ProductoCreateView, ProductoUpdateView, ProductoDeleteView,MovimientoInventarioListView, MovimientoInventarioCreateView, AlertaStockBajoListView, ProductosVencimientoListView, ProductoDetailView, PrecioCompraCreateView
+from . import api, views
+from .views import ProductoListView, ProductoCreateView, ProductoUpdateView, ProductoDeleteView,MovimientoInventarioListView, MovimientoInventarioCreateView, AlertaStockBajoListView, ProductosVencimientoListView, ProductoDetailView, PrecioCompraCreateView, ReporteInventarioView
+
+# Con ASGI las lecturas usan los handlers async (ver vistas_async.py)
+api_lectura = api
+if settings.INVENTARIO_VISTAS_ASYNC:
+    from . import vistas_async as api_lectura
+    from .vistas_async import ProductoListView, MovimientoInventarioListView, AlertaStockBajoListView, ProductosVencimientoListView, ProductoDetailView
 
 urlpatterns = [
     path('', views.HomeView.as_view(), name='home'),
     path('list/', ProductoListView.as_view(), name='producto-list'),
     path('nuevo/', ProductoCreateView.as_view(), name='producto-nuevo'),
+    path('importar/', views.ProductoImportarView.as_view(), name='producto-importar'),
     path('editar/<int:pk>/', ProductoUpdateView.as_view(), name='producto-editar'),
     path('eliminar/<int:pk>/', ProductoDeleteView.as_view(), name='producto-eliminar'),
     path('movimientos/', MovimientoInventarioListView.as_view(), name='movimiento-list'),
     path('movimientos/nuevo/', MovimientoInventarioCreateView.as_view(), name='movimiento-nuevo'),
+    path('movimientos/importar/', views.MovimientoImportarView.as_view(), name='movimiento-importar'),
+    path('ubicaciones/', views.UbicacionListView.as_view(), name='ubicacion-list'),
+    path('ubicaciones/<int:pk>/', views.UbicacionDetailView.as_view(), name='ubicacion-detalle'),
     path('alertas/stock-bajo/', AlertaStockBajoListView.as_view(), name='alerta-stock-bajo'),
+    path('productos/buscar/', views.ProductoBusquedaView.as_view(), name='producto-buscar'),
     path('productos/vencimiento/', ProductosVencimientoListView.as_view(), name='productos-vencimiento'),
     path('producto/<str:codigo>/', ProductoDetailView.as_view(), name='producto-detalle'),
+    path('producto/<str:codigo>/stock/', views.StockHistoricoView.as_view(), name='producto-stock-historico'),
     path('producto/<str:codigo>/nuevo-precio/', PrecioCompraCreateView.as_view(), name='precio-compra-nuevo'),
+    path('reportes/inventario/', ReporteInventarioView.as_view(), name='reporte-inventario'),
+    path('reportes/valorizacion/', views.ValorizacionView.as_view(), name='reporte-valorizacion'),
+    path('reportes/movimientos/', views.TotalesMovimientosView.as_view(), name='reporte-movimientos'),
+    path('reportes/trabajos/<int:pk>/', views.TrabajoReporteDetailView.as_view(), name='reporte-trabajo'),
+    path('reportes/trabajos/<int:pk>/estado/', views.TrabajoReporteEstadoView.as_view(), name='reporte-estado'),
+    path('reportes/trabajos/<int:pk>/descargar/', views.TrabajoReporteDescargaView.as_view(), name='reporte-descargar'),
+    path('api/productos/', api_lectura.ProductosApiView.as_view(), name='api-productos'),
+    path('api/productos/<str:codigo>/', api_lectura.ProductoApiView.as_view(), name='api-producto'),
+    path('api/productos/<str:codigo>/precios/', api_lectura.PreciosApiView.as_view(), name='api-precios'),
+    path('api/productos/<str:codigo>/lotes/', api_lectura.LotesApiView.as_view(), name='api-lotes'),
+    path('api/productos/<str:codigo>/lotes/<int:pk>/', api_lectura.LoteApiView.as_view(), name='api-lote'),
+    path('api/movimientos/', api_lectura.MovimientosApiView.as_view(), name='api-movimientos'),
+    path('api/categorias/', api_lectura.CategoriasApiView.as_view(), name='api-categorias'),
+    path('api/sync/', api.SincronizacionApiView.as_view(), name='api-sync'),
+    path('eventos/', views.EventosView.as_view(), name='eventos'),
+    path('metricas/', views.MetricasView.as_view(), name='metricas'),
+    path('metricas/prometheus/', views.MetricasPrometheusView.as_view(), name='metricas-prometheus'),
 ]
 
@@ -0,0 +1,274 @@
+"""Valorizacion del inventario a costo promedio ponderado y FIFO.
+
+``PrecioCompra`` no registra cantidades, asi que cada ENTRADA se valoriza al
+precio de compra vigente en su fecha: el ultimo precio con ``fecha_compra``
+menor o igual al dia de la entrada, o el primero conocido si la entrada es
+anterior a todos.
+
+* Promedio ponderado: costo = suma(cantidad * precio) / suma(cantidad) de
+  las entradas, aplicado al stock actual.
+* FIFO: las salidas consumen primero las entradas mas antiguas, por lo que el
+  stock actual corresponde a las entradas mas recientes. Lo que ninguna
+  entrada cubre (stock inicial, transferencias) se valoriza al primer precio.
+
+El catalogo se recorre por bloques de productos; cada bloque trae sus precios
+y sus entradas en dos consultas ordenadas y se resuelve en una sola pasada.
+
+El valor de cada producto queda en ``ValorizacionProducto``. Un cambio de
+producto, movimiento o precio solo lo marca pendiente (``invalidar``, desde
+signals.py y los caminos masivos) y el worker ``procesar_reportes`` lo
+recalcula con ``actualizar``. El reporte suma los valores guardados: no
+recalcula el catalogo en la peticion y, mientras haya pendientes, muestra el
+ultimo valor calculado de cada uno.
+"""
+import csv
+import datetime
+import functools
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import BigIntegerField, Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Cast, Greatest, Round
+from django.utils import timezone
+
+from .models import MovimientoInventario, PrecioCompra, Producto, ValorizacionProducto
+from .reportes import _Eco
+
+CAMPOS_VALOR = ['cantidad', 'costo_promedio', 'valor_promedio', 'valor_fifo', 'vigente', 'calculado']
+TAMANO_BLOQUE = 2000
+CENTAVO = Decimal('0.01')
+
+ENCABEZADOS = ['Código', 'Nombre', 'Cantidad', 'Costo promedio', 'Valor promedio', 'Valor FIFO']
+
+
+class ValorProducto:
+    def __init__(self, producto_id, cantidad, costo_promedio=None, valor_promedio=Decimal(0), valor_fifo=Decimal(0)):
+        self.producto_id = producto_id
+        self.cantidad = cantidad
+        self.costo_promedio = costo_promedio
+        self.valor_promedio = valor_promedio
+        self.valor_fifo = valor_fifo
+
+    @property
+    def tiene_precio(self):
+        return self.costo_promedio is not None
+
+    def as_dict(self):
+        return {
+            'producto_id': self.producto_id,
+            'cantidad': self.cantidad,
+            'costo_promedio': self.costo_promedio,
+            'valor_promedio': self.valor_promedio,
+            'valor_fifo': self.valor_fifo,
+        }
+
+
+def invalidar(ids, crear=False):
+    """Marca pendiente la valorizacion de los productos ``ids`` (lista o queryset de productos).
+
+    ``crear`` agrega la fila de los productos nuevos; las señales de
+    movimientos y precios no la crean porque pueden llegar durante el borrado
+    en cascada del producto.
+    """
+    if isinstance(ids, models.QuerySet):
+        ids = list(ids.values_list('pk', flat=True))
+    ids = sorted(set(ids))
+    for i in range(0, len(ids), TAMANO_BLOQUE):
+        parte = ids[i:i + TAMANO_BLOQUE]
+        if crear:
+            ValorizacionProducto.objects.bulk_create(
+                [ValorizacionProducto(producto_id=pk) for pk in parte], ignore_conflicts=True
+            )
+        ValorizacionProducto.objects.filter(producto_id__in=parte, vigente=True).update(vigente=False)
+
+
+def _valorizar(producto_id, cantidad, precios, entradas):
+    """``precios`` [(desde, precio)] y ``entradas`` [(fecha, cantidad)] vienen en orden ascendente.
+
+    ``desde`` es el inicio del dia de compra, para comparar directo con la
+    fecha y hora de cada entrada.
+    """
+    if not precios:
+        return ValorProducto(producto_id, cantidad)
+
+    # Capas de costo: cada entrada con el precio vigente en su dia
+    capas = []
+    vigente = precios[0][1]
+    i = 0
+    for fecha, unidades in entradas:
+        while i < len(precios) and precios[i][0] <= fecha:
+            vigente = precios[i][1]
+            i += 1
+        capas.append((unidades, vigente))
+
+    unidades_total = sum(u for u, _ in capas)
+    if unidades_total:
+        costo = sum(u * p for u, p in capas) / unidades_total
+    else:
+        costo = sum(p for _, p in precios) / len(precios)
+
+    restante = max(cantidad, 0)
+    valor_fifo = Decimal(0)
+    for unidades, precio in reversed(capas):
+        if not restante:
+            break
+        tomadas = min(unidades, restante)
+        valor_fifo += tomadas * precio
+        restante -= tomadas
+    valor_fifo += restante * precios[0][1]
+
+    return ValorProducto(
+        producto_id,
+        cantidad,
+        costo_promedio=costo.quantize(CENTAVO),
+        valor_promedio=(max(cantidad, 0) * costo).quantize(CENTAVO),
+        valor_fifo=valor_fifo.quantize(CENTAVO),
+    )
+
+
+# Hay pocas fechas de compra distintas: cada una se convierte una sola vez
+@functools.lru_cache(maxsize=4096)
+def _inicio_dia(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min), timezone.get_default_timezone())
+
+
+def _agrupar(filas):
+    grupos = {}
+    for producto_id, fecha, valor in filas:
+        grupos.setdefault(producto_id, []).append((fecha, valor))
+    return grupos
+
+
+def _valorizar_bloque(bloque):
+    """``bloque`` es una lista de (pk, cantidad, ...) ordenada por pk."""
+    primero, ultimo = bloque[0][0], bloque[-1][0]
+    if ultimo - primero + 1 == len(bloque):
+        filtro = Q(producto_id__gte=primero, producto_id__lte=ultimo)
+    else:
+        # Pendientes salteados: un rango leeria tambien los productos de entre medio
+        filtro = Q(producto_id__in=[fila[0] for fila in bloque])
+    precios = _agrupar(
+        (producto_id, _inicio_dia(fecha_compra), precio)
+        for producto_id, fecha_compra, precio in (
+            PrecioCompra.objects
+            .filter(filtro)
+            .order_by('producto_id', 'fecha_compra', 'id')
+            .values_list('producto_id', 'fecha_compra', 'precio')
+        )
+    )
+    entradas = _agrupar(
+        MovimientoInventario.objects
+        .filter(filtro, tipo_movimiento='ENTRADA')
+        .order_by('producto_id', 'fecha', 'id')
+        .values_list('producto_id', 'fecha', 'cantidad')
+        .iterator(chunk_size=TAMANO_BLOQUE)
+    )
+    for fila in bloque:
+        pk, cantidad = fila[0], fila[1]
+        yield fila, _valorizar(pk, cantidad, precios.get(pk, []), entradas.get(pk, []))
+
+
+def valorizar(productos=None):
+    """Genera (fila, ValorProducto) para ``productos`` (queryset) o todo el catalogo.
+
+    ``fila`` es la tupla (pk, cantidad, codigo, nombre) del producto.
+    """
+    if productos is None:
+        productos = Producto.objects.all()
+    filas = productos.order_by('pk').values_list('pk', 'cantidad', 'codigo', 'nombre')
+    bloque = []
+    for fila in filas.iterator(chunk_size=TAMANO_BLOQUE):
+        bloque.append(fila)
+        if len(bloque) >= TAMANO_BLOQUE:
+            yield from _valorizar_bloque(bloque)
+            bloque = []
+    if bloque:
+        yield from _valorizar_bloque(bloque)
+
+
+def _valor_guardado(fila):
+    return ValorProducto(
+        fila.producto_id, fila.cantidad, fila.costo_promedio, fila.valor_promedio, fila.valor_fifo,
+    )
+
+
+def actualizar(limite=None):
+    """Recalcula hasta ``limite`` valorizaciones pendientes, por bloques. Devuelve cuantas.
+
+    Cada bloque se lee y se guarda en una transaccion con sus filas
+    bloqueadas: un cambio que llega mientras tanto espera y vuelve a dejar
+    pendiente el producto despues de guardar, en vez de perderse.
+    """
+    procesados = 0
+    while limite is None or procesados < limite:
+        tamano = TAMANO_BLOQUE if limite is None else min(TAMANO_BLOQUE, limite - procesados)
+        with transaction.atomic():
+            ids = list(
+                ValorizacionProducto.objects.select_for_update(skip_locked=True)
+                .filter(vigente=False).order_by('producto_id')
+                .values_list('producto_id', flat=True)[:tamano]
+            )
+            if not ids:
+                break
+            ahora = timezone.now()
+            ValorizacionProducto.objects.bulk_create(
+                [
+                    ValorizacionProducto(
+                        producto_id=valor.producto_id, cantidad=valor.cantidad,
+                        costo_promedio=valor.costo_promedio, valor_promedio=valor.valor_promedio,
+                        valor_fifo=valor.valor_fifo, vigente=True, calculado=ahora,
+                    )
+                    for _, valor in valorizar(Producto.objects.filter(pk__in=ids))
+                ],
+                update_conflicts=True, unique_fields=['producto'], update_fields=CAMPOS_VALOR,
+            )
+        procesados += len(ids)
+    return procesados
+
+
+def valor_producto(producto):
+    """Valor guardado del producto; si esta pendiente se calcula en el momento (sin guardarlo)."""
+    fila = ValorizacionProducto.objects.filter(producto_id=producto.pk, vigente=True).first()
+    if fila is not None:
+        return _valor_guardado(fila)
+    _, valor = next(valorizar(Producto.objects.filter(pk=producto.pk)))
+    return valor
+
+
+def _suma_centavos(campo):
+    # SQLite suma los decimales como REAL y pierde centavos en catalogos grandes
+    return Sum(Cast(Round(F(campo) * 100), BigIntegerField()))
+
+
+def valorizacion_total():
+    """Totales del catalogo por ambos metodos, con los valores guardados.
+
+    ``pendientes`` cuenta los productos cuyo valor sumado es el del ultimo
+    calculo, anterior a su cambio mas reciente.
+    """
+    totales = ValorizacionProducto.objects.aggregate(
+        productos=Count('pk'),
+        sin_precio=Count('pk', filter=Q(costo_promedio__isnull=True)),
+        pendientes=Count('pk', filter=Q(vigente=False)),
+        unidades=Sum(Greatest('cantidad', Value(0))),
+        valor_promedio=_suma_centavos('valor_promedio'),
+        valor_fifo=_suma_centavos('valor_fifo'),
+        calculado=Max('calculado'),
+    )
+    totales['unidades'] = totales['unidades'] or 0
+    for campo in ('valor_promedio', 'valor_fifo'):
+        totales[campo] = (Decimal(totales[campo] or 0) / 100).quantize(CENTAVO)
+    return totales
+
+
+def generar_csv():
+    """Lineas CSV con la valorizacion guardada de cada producto, para StreamingHttpResponse."""
+    writer = csv.writer(_Eco())
+    yield '\ufeff' + writer.writerow(ENCABEZADOS)
+    filas = ValorizacionProducto.objects.order_by('producto_id').values_list(
+        'producto__codigo', 'producto__nombre', 'cantidad', 'costo_promedio', 'valor_promedio', 'valor_fifo',
+    )
+    for codigo, nombre, cantidad, costo, valor_promedio, valor_fifo in filas.iterator(chunk_size=TAMANO_BLOQUE):
+        yield writer.writerow([
+            codigo, nombre, cantidad, '' if costo is None else costo, valor_promedio, valor_fifo,
+        ])
@@ -1,29 +1,48 @@
-from django.urls import reverse_lazy
+from django.conf import settings
+from django.urls import reverse, reverse_lazy
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, TemplateView,DetailView
-from datetime import timedelta
-from .models import Categoria, Producto, MovimientoInventario, PrecioCompra
-from .forms import ProductoForm, UserRegisterForm, PrecioCompraForm, ReporteInventarioForm
+from .models import Categoria, Producto, MovimientoInventario, PrecioCompra, TrabajoReporte, Ubicacion
+from .forms import ProductoForm, UserRegisterForm, PrecioCompraForm, ReporteInventarioForm, BusquedaProductoForm, MovimientoInventarioForm, ImportarMovimientosForm, ImportarCatalogoForm, FiltroMovimientosForm
 from .decorators import GroupRequiredMixin
+from .roles import tiene_alguno, tiene_grupo
+from .paginacion import KeysetPaginationMixin, paginar_keyset
 from django.contrib.auth.models import Group
-from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import F,Q
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.utils import timezone
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.views import View
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, redirect, render
+from django.core.serializers.json import DjangoJSONEncoder
+from asgiref.sync import sync_to_async
+from . import alertas, busqueda, catalogo, eventos, historial, importacion, lotes, metricas, reportes, stock, ubicaciones, valorizacion
+import asyncio
 import datetime
-import openpyxl
+import json
+import os
+import tempfile
 
 
-class ProductoListView(LoginRequiredMixin, GroupRequiredMixin, ListView):
+class ProductoListView(LoginRequiredMixin, GroupRequiredMixin, KeysetPaginationMixin, ListView):
     login_url = 'login'
     group_required = ['Administrador', 'Gestor de Inventario', 'Encargado de Logística']
     model = Producto
     template_name = 'inventario/producto_list.html'
     context_object_name = 'productos'
+    paginate_by = 50
+
+    def get_queryset(self):
+        self.form = BusquedaProductoForm(self.request.GET or None)
+        return self.form.filtrar(Producto.objects.all())
+
+    def get_orden_keyset(self):
+        return self.form.orden_keyset()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['form'] = self.form
+        return context
+
 
-    
-    
 
 class ProductoCreateView(LoginRequiredMixin, GroupRequiredMixin, CreateView):
     login_url = 'login'
@@ -36,7 +55,7 @@ class ProductoCreateView(LoginRequiredMixin, GroupRequiredMixin, CreateView):
     def get_form(self, form_class=None):
         form = super().get_form(form_class)
         # Si no es admin, ocultamos el campo nuevas_categorias
-        if not self.request.user.groups.filter(name='Administrador').exists():
+        if not tiene_grupo(self.request.user, 'Administrador'):
             form.fields.pop('nuevas_categorias')
         return form
 
@@ -49,7 +68,7 @@ class ProductoCreateView(LoginRequiredMixin, GroupRequiredMixin, CreateView):
         form.save_m2m()
 
         # Si es admin, crear y asignar nuevas categorías
-        if self.request.user.groups.filter(name='Administrador').exists():
+        if tiene_grupo(self.request.user, 'Administrador'):
             nuevas_cats = form.cleaned_data.get('nuevas_categorias')
             if nuevas_cats:
                 lista_cats = [c.strip() for c in nuevas_cats.split(',') if c.strip()]
@@ -72,7 +91,7 @@ class ProductoUpdateView(LoginRequiredMixin, GroupRequiredMixin, UpdateView):
     def get_form(self, form_class=None):
         form = super().get_form(form_class)
         # Si no es admin, ocultamos el campo nuevas_categorias
-        if not self.request.user.groups.filter(name='Administrador').exists():
+        if not tiene_grupo(self.request.user, 'Administrador'):
             form.fields.pop('nuevas_categorias')
         return form
 
@@ -85,7 +104,7 @@ class ProductoUpdateView(LoginRequiredMixin, GroupRequiredMixin, UpdateView):
         form.save_m2m()
 
         # Si es admin, procesar nuevas categorías y asignarlas
-        if self.request.user.groups.filter(name='Administrador').exists():
+        if tiene_grupo(self.request.user, 'Administrador'):
             nuevas_cats = form.cleaned_data.get('nuevas_categorias')
             if nuevas_cats:
                 lista_cats = [c.strip() for c in nuevas_cats.split(',') if c.strip()]
@@ -106,6 +125,35 @@ class ProductoDeleteView(LoginRequiredMixin, GroupRequiredMixin, DeleteView):
     success_url = reverse_lazy('producto-list')
 
 
+# Carga masiva del catalogo desde Excel o CSV
+class ProductoImportarView(LoginRequiredMixin, GroupRequiredMixin, View):
+    login_url = 'login'
+    group_required = ['Administrador', 'Gestor de Inventario']
+    template_name = 'inventario/producto_importar.html'
+
+    def get(self, request):
+        return render(request, self.template_name, {'form': ImportarCatalogoForm()})
+
+    def post(self, request):
+        form = ImportarCatalogoForm(request.POST, request.FILES)
+        if not form.is_valid():
+            return render(request, self.template_name, {'form': form})
+        archivo = form.cleaned_data['archivo']
+        if archivo.name.lower().endswith('.xlsx'):
+            filas = importacion.leer_xlsx(archivo)
+        else:
+            filas = importacion.leer_csv(archivo)
+        resultado = importacion.importar_catalogo(
+            filas, simular=form.cleaned_data['simular'],
+            crear_categorias=tiene_grupo(request.user, 'Administrador'),
+        )
+        return render(request, self.template_name, {
+            'form': form,
+            'resultado': resultado,
+            'simulado': form.cleaned_data['simular'],
+        })
+
+
 # Registro de usuarios con asignación de grupo
 class RegisterView(CreateView):
     form_class = UserRegisterForm
@@ -126,7 +174,7 @@ class HomeView(TemplateView):
 
 
 # Vista para listar movimientos (usuarios autorizados)
-class MovimientoInventarioListView(LoginRequiredMixin, ListView):
+class MovimientoInventarioListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = MovimientoInventario
     template_name = 'inventario/movimiento_list.html'
     context_object_name = 'movimientos'
@@ -138,60 +186,120 @@ class MovimientoInventarioListView(LoginRequiredMixin, ListView):
             'Administrador', 'Gestor de Inventario', 'Encargado de Logística',
             'Auditor de Inventario', 'Comprador', 'Jefe de Producción'
         ]
-        if any(user.groups.filter(name=grp).exists() for grp in allowed_groups):
-            return MovimientoInventario.objects.all().order_by('-fecha')
-        else:
+        self.form = FiltroMovimientosForm(self.request.GET or None)
+        if not tiene_alguno(user, allowed_groups):
             return MovimientoInventario.objects.none()
 
+        # producto, usuario y ubicaciones se traen en la misma consulta (la tabla y __str__ los usan)
+        return self.form.filtrar(MovimientoInventario.objects.select_related(
+            'producto', 'usuario', 'ubicacion_origen', 'ubicacion_destino'
+        ))
+
+    def get_orden_keyset(self):
+        return ['-fecha', '-id']
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['form'] = self.form
+        context['eventos_en_vivo'] = eventos.en_vivo(self.request)
+        return context
+
 
 # Vista para crear movimientos (solo grupos autorizados)
 class MovimientoInventarioCreateView(LoginRequiredMixin, GroupRequiredMixin, CreateView):
     model = MovimientoInventario
-    fields = ['producto', 'tipo_movimiento', 'cantidad', 'proyecto', 'observaciones']
+    form_class = MovimientoInventarioForm
     template_name = 'inventario/movimiento_form.html'
     success_url = reverse_lazy('movimiento-list')
     group_required = ['Administrador', 'Gestor de Inventario', 'Encargado de Logística']
 
     def form_valid(self, form):
         form.instance.usuario = self.request.user
-        producto = form.cleaned_data['producto']
-        cantidad = form.cleaned_data['cantidad']
-        tipo = form.cleaned_data['tipo_movimiento']
-
-        if tipo in ['ENTRADA', 'TRANSFERENCIA']:
-            producto.cantidad += cantidad
-        elif tipo in ['SALIDA', 'USO_PROYECTO']:
-            if producto.cantidad < cantidad:
-                form.add_error('cantidad', 'Cantidad insuficiente en inventario.')
-                return self.form_invalid(form)
-            producto.cantidad -= cantidad
-        producto.save()
-        return super().form_valid(form)
+        try:
+            # El movimiento y el ajuste de stock se guardan en una sola transaccion
+            self.object = stock.registrar_movimiento(
+                form.instance, form.cleaned_data['lote'], form.cleaned_data['fecha_vencimiento']
+            )
+        except stock.StockInsuficienteError as exc:
+            form.add_error('cantidad' if exc.ubicacion is None else 'ubicacion_origen', str(exc))
+            return self.form_invalid(form)
+        return HttpResponseRedirect(self.get_success_url())
+
+
+# Autocompletado de productos para formularios y buscadores (JSON)
+class ProductoBusquedaView(LoginRequiredMixin, GroupRequiredMixin, View):
+    group_required = ['Administrador', 'Gestor de Inventario', 'Encargado de Logística']
+
+    def get(self, request):
+        try:
+            limite = max(1, min(int(request.GET.get('limite', 10)), 50))
+        except ValueError:
+            limite = 10
+        resultados = busqueda.buscar(request.GET.get('q', ''), limite=limite)
+        return JsonResponse({'resultados': resultados})
+
+
+# Carga masiva de movimientos: arreglo JSON o archivo CSV
+class MovimientoImportarView(LoginRequiredMixin, GroupRequiredMixin, View):
+    group_required = ['Administrador', 'Gestor de Inventario', 'Encargado de Logística']
+    template_name = 'inventario/movimiento_importar.html'
+
+    def get(self, request):
+        return render(request, self.template_name, {'form': ImportarMovimientosForm()})
+
+    def post(self, request):
+        if request.content_type == 'application/json':
+            try:
+                filas = json.loads(request.body)
+            except ValueError:
+                return JsonResponse({'error': 'JSON inválido.'}, status=400)
+            if not isinstance(filas, list):
+                return JsonResponse({'error': 'Se esperaba un arreglo de movimientos.'}, status=400)
+            resultado = importacion.importar_movimientos(importacion.numerar(filas), usuario=request.user)
+            return JsonResponse(resultado.as_dict())
+
+        form = ImportarMovimientosForm(request.POST, request.FILES)
+        if not form.is_valid():
+            return render(request, self.template_name, {'form': form})
+        resultado = importacion.importar_movimientos(
+            importacion.leer_csv(form.cleaned_data['archivo']), usuario=request.user
+        )
+        return render(request, self.template_name, {'form': ImportarMovimientosForm(), 'resultado': resultado})
 
 
 # Vista para alertas de stock bajo
-class AlertaStockBajoListView(LoginRequiredMixin, ListView):
+class AlertaStockBajoListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Producto
     template_name = 'inventario/alerta_stock_bajo.html'
     context_object_name = 'productos_alerta'
+    paginate_by = 50
 
     def get_queryset(self):
-        return Producto.objects.filter(cantidad__lte=F('umbral_stock_bajo')).order_by('cantidad')
+        # Lee el indice parcial de productos marcados en alerta
+        return alertas.productos_stock_bajo().select_related('pronostico')
+
+    def get_orden_keyset(self):
+        return ['cantidad', 'id']
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['eventos_en_vivo'] = eventos.en_vivo(self.request)
+        return context
 
 
 #Alerta de Proximo Vencimiento
 
-class ProductosVencimientoListView(LoginRequiredMixin, ListView):
-    model = Producto
+class ProductosVencimientoListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     template_name = 'inventario/productos_vencimiento.html'
-    context_object_name = 'productos_vencimiento'
+    context_object_name = 'lotes_vencimiento'
+    paginate_by = 50
 
     def get_queryset(self):
-        hoy = timezone.now().date()
-        fecha_alerta = hoy + timedelta(days=30)  # Avisar 30 días antes
-        return Producto.objects.filter(
-            Q(fecha_vencimiento__lte=fecha_alerta) & Q(fecha_vencimiento__isnull=False)
-        ).order_by('fecha_vencimiento')
+        # Por lote, avisando 30 días antes (alertas.DIAS_AVISO_VENCIMIENTO)
+        return alertas.lotes_por_vencer().select_related('producto')
+
+    def get_orden_keyset(self):
+        return ['fecha_vencimiento', 'id']
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -212,7 +320,7 @@ class PrecioCompraCreateView(LoginRequiredMixin, GroupRequiredMixin, CreateView)
 
     def dispatch(self, request, *args, **kwargs):
         # Obtener el producto por codigo para usar en todo el proceso
-        self.producto = Producto.objects.get(codigo=kwargs['codigo'])
+        self.producto = catalogo.producto_o_404(kwargs['codigo'])
         return super().dispatch(request, *args, **kwargs)
 
     def get_initial(self):
@@ -239,9 +347,69 @@ class ProductoDetailView(LoginRequiredMixin, GroupRequiredMixin, DetailView):
     slug_url_kwarg = 'codigo'
     group_required = ['Administrador', 'Gestor de Inventario', 'Encargado de Logística']
 
+    precios_por_pagina = 20
+    orden_precios = ['-fecha_compra', '-id']
+
+    def get_object(self, queryset=None):
+        # El producto sale del cache del catalogo; la valorizacion tiene su propio cache
+        return catalogo.producto_o_404(self.kwargs['codigo'])
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # La variante async (vistas_async.py) deja las lecturas hechas en self.lecturas
+        lecturas = getattr(self, 'lecturas', None) or self.leer()
+        pagina = lecturas['precios_compra']
+        context.update(lecturas)
+        context['page_obj'] = pagina
+        context['is_paginated'] = pagina.has_other_pages()
+        context['query_params'] = ''
+        return context
+
+    def leer(self):
+        return {
+            # Historial paginado por (fecha_compra, id); el resumen ya viene en el producto
+            'precios_compra': paginar_keyset(
+                self.object.precios_compra.all(), self.orden_precios,
+                self.request.GET.get('cursor'), self.precios_por_pagina,
+            ),
+            'valor': valorizacion.valor_producto(self.object),
+            'stock_ubicaciones': list(ubicaciones.stock_de(self.object)),
+            'lotes': list(lotes.lotes_de(self.object)),
+        }
+
+
+# Ubicaciones con sus totales (mantenidos en cada movimiento, ver ubicaciones.py)
+class UbicacionListView(LoginRequiredMixin, GroupRequiredMixin, KeysetPaginationMixin, ListView):
+    model = Ubicacion
+    group_required = ['Administrador', 'Gestor de Inventario', 'Encargado de Logística']
+    template_name = 'inventario/ubicacion_list.html'
+    context_object_name = 'ubicaciones'
+    paginate_by = 50
+
+    def get_queryset(self):
+        return Ubicacion.objects.all()
+
+    def get_orden_keyset(self):
+        return ['nombre', 'id']
+
+
+# Stock de cada producto en una ubicacion, por rango del indice (ubicacion, producto)
+class UbicacionDetailView(LoginRequiredMixin, GroupRequiredMixin, KeysetPaginationMixin, ListView):
+    group_required = ['Administrador', 'Gestor de Inventario', 'Encargado de Logística']
+    template_name = 'inventario/ubicacion_detail.html'
+    context_object_name = 'stock'
+    paginate_by = 50
+
+    def get_queryset(self):
+        self.ubicacion = get_object_or_404(Ubicacion, pk=self.kwargs['pk'])
+        return self.ubicacion.stock.filter(cantidad__gt=0).select_related('producto')
+
+    def get_orden_keyset(self):
+        return ['producto_id', 'id']
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['precios_compra'] = self.object.precios_compra.order_by('-fecha_compra')
+        context['ubicacion'] = self.ubicacion
         return context
     
 
@@ -256,41 +424,185 @@ class ReporteInventarioView(LoginRequiredMixin, GroupRequiredMixin, View):
     def post(self, request):
         form = ReporteInventarioForm(request.POST)
         if form.is_valid():
-            productos = Producto.objects.all()
-
-            fecha_inicio = form.cleaned_data.get('fecha_inicio')
-            fecha_fin = form.cleaned_data.get('fecha_fin')
-            categorias = form.cleaned_data.get('categorias')
-
-            if fecha_inicio:
-                productos = productos.filter(fecha_vencimiento__gte=fecha_inicio)
-            if fecha_fin:
-                productos = productos.filter(fecha_vencimiento__lte=fecha_fin)
-            if categorias and categorias.exists():
-                productos = productos.filter(categorias__in=categorias).distinct()
-
-            # Crear Excel
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Reporte Inventario"
-
-            # Encabezados
-            headers = ['Código', 'Nombre', 'Cantidad', 'Ubicación', 'Fecha Vencimiento', 'Categorías']
-            ws.append(headers)
-
-            for p in productos:
-                categorias_str = ", ".join([c.nombre for c in p.categorias.all()])
-                fecha_ven = p.fecha_vencimiento.strftime("%d/%m/%Y") if p.fecha_vencimiento else ""
-                row = [p.codigo, p.nombre, p.cantidad, p.ubicacion, fecha_ven, categorias_str]
-                ws.append(row)
-
-            # Preparar respuesta para descargar
-            response = HttpResponse(
+            productos = reportes.filtrar_productos(
+                fecha_inicio=form.cleaned_data.get('fecha_inicio'),
+                fecha_fin=form.cleaned_data.get('fecha_fin'),
+                categorias=form.cleaned_data.get('categorias'),
+            )
+            nombre = f"reporte_inventario_{datetime.date.today()}"
+
+            # El xlsx se arma completo antes de enviarse: los grandes van a la cola
+            limite = settings.REPORTES_XLSX_MAXIMO_DIRECTO
+            grande = form.cleaned_data['formato'] == 'xlsx' and productos[:limite + 1].count() > limite
+            if form.cleaned_data['segundo_plano'] or grande:
+                parametros = reportes.parametros_reporte(form.cleaned_data)
+                trabajo = reportes.encolar_reporte(parametros, usuario=request.user)
+                if trabajo.estado == 'LISTO':
+                    return redirect('reporte-descargar', pk=trabajo.pk)
+                return redirect('reporte-trabajo', pk=trabajo.pk)
+
+            if form.cleaned_data['formato'] == 'csv':
+                # Se envia fila por fila, sin armar el archivo completo en memoria
+                response = StreamingHttpResponse(
+                    reportes.generar_csv(productos),
+                    content_type='text/csv; charset=utf-8',
+                )
+                response['Content-Disposition'] = f'attachment; filename={nombre}.csv'
+                return response
+
+            # Pocos productos: el libro write_only se vuelca a un archivo temporal y se envia por bloques
+            archivo = tempfile.TemporaryFile()
+            reportes.escribir_xlsx(productos, archivo)
+            archivo.seek(0)
+            return FileResponse(
+                archivo,
+                as_attachment=True,
+                filename=f"{nombre}.xlsx",
                 content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             )
-            filename = f"reporte_inventario_{datetime.date.today()}.xlsx"
-            response['Content-Disposition'] = f'attachment; filename={filename}'
-            wb.save(response)
+
+        return render(request, 'inventario/reporte_inventario.html', {'form': form})
+
+
+#estado de un reporte generado en segundo plano
+class TrabajoReporteDetailView(LoginRequiredMixin, GroupRequiredMixin, DetailView):
+    group_required = ['Administrador', 'Gestor de Inventario']
+    model = TrabajoReporte
+    template_name = 'inventario/reporte_trabajo.html'
+    context_object_name = 'trabajo'
+
+
+class TrabajoReporteEstadoView(LoginRequiredMixin, GroupRequiredMixin, View):
+    group_required = ['Administrador', 'Gestor de Inventario']
+
+    def get(self, request, pk):
+        trabajo = get_object_or_404(TrabajoReporte, pk=pk)
+        data = {'id': trabajo.pk, 'estado': trabajo.estado, 'error': trabajo.error}
+        if trabajo.estado == 'LISTO':
+            data['url'] = reverse('reporte-descargar', kwargs={'pk': trabajo.pk})
+        return JsonResponse(data)
+
+
+class TrabajoReporteDescargaView(LoginRequiredMixin, GroupRequiredMixin, View):
+    group_required = ['Administrador', 'Gestor de Inventario']
+
+    def get(self, request, pk):
+        trabajo = get_object_or_404(TrabajoReporte, pk=pk, estado='LISTO')
+        ruta = reportes.ruta_archivo(trabajo)
+        if not trabajo.archivo or not os.path.exists(ruta):
+            raise Http404("El reporte ya no está disponible.")
+        formato = trabajo.parametros.get('formato', 'xlsx')
+        return FileResponse(
+            open(ruta, 'rb'),
+            as_attachment=True,
+            filename=f"reporte_inventario_{trabajo.terminado.date()}.{formato}",
+        )
+
+
+#valorizacion del catalogo completo (promedio ponderado y FIFO)
+class ValorizacionView(LoginRequiredMixin, GroupRequiredMixin, View):
+    group_required = ['Administrador', 'Gestor de Inventario']
+
+    def get(self, request):
+        if request.GET.get('formato') == 'csv':
+            response = StreamingHttpResponse(valorizacion.generar_csv(), content_type='text/csv; charset=utf-8')
+            response['Content-Disposition'] = f'attachment; filename="valorizacion_{timezone.localdate()}.csv"'
             return response
+        return render(request, 'inventario/reporte_valorizacion.html', {'totales': valorizacion.valorizacion_total()})
+
+
+def _fecha_parametro(request, nombre, defecto=None):
+    valor = request.GET.get(nombre)
+    if not valor:
+        return defecto
+    return datetime.date.fromisoformat(valor)
+
 
-        return render(request, 'inventario/reporte_inventario.html', {'form': form})
\ No newline at end of file
+#stock de un producto al cierre de una fecha (snapshot mas cercano + movimientos)
+class StockHistoricoView(LoginRequiredMixin, GroupRequiredMixin, View):
+    group_required = ['Administrador', 'Gestor de Inventario', 'Encargado de Logística']
+
+    def get(self, request, codigo):
+        producto = catalogo.producto_o_404(codigo)
+        try:
+            fecha = _fecha_parametro(request, 'fecha', timezone.localdate())
+        except ValueError:
+            return JsonResponse({'error': 'La fecha debe tener el formato YYYY-MM-DD.'}, status=400)
+        return JsonResponse({
+            'codigo': producto.codigo,
+            'fecha': fecha,
+            'cantidad': historial.stock_en_fecha(producto, fecha),
+        })
+
+
+#totales de movimientos por proyecto y tipo en un periodo
+class TotalesMovimientosView(LoginRequiredMixin, GroupRequiredMixin, View):
+    group_required = ['Administrador', 'Gestor de Inventario']
+
+    def get(self, request):
+        hoy = timezone.localdate()
+        try:
+            desde = _fecha_parametro(request, 'desde', hoy.replace(day=1))
+            hasta = _fecha_parametro(request, 'hasta', hoy)
+        except ValueError:
+            return JsonResponse({'error': 'Las fechas deben tener el formato YYYY-MM-DD.'}, status=400)
+        totales = historial.totales_periodo(
+            desde, hasta,
+            proyecto=request.GET.get('proyecto'),
+            tipo_movimiento=request.GET.get('tipo_movimiento'),
+        )
+        return JsonResponse({'desde': desde, 'hasta': hasta, 'totales': totales})
+
+
+#eventos en vivo (server-sent events) para los tableros de alertas y movimientos
+class EventosView(View):
+    group_required = [
+        'Administrador', 'Gestor de Inventario', 'Encargado de Logística',
+        'Auditor de Inventario', 'Comprador', 'Jefe de Producción',
+    ]
+    # Comentario periodico para que proxies y navegadores no cierren la conexion
+    segundos_latido = 15
+
+    async def get(self, request):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return HttpResponse(status=401)
+        if not user.is_superuser and not await sync_to_async(tiene_alguno)(user, self.group_required):
+            return HttpResponse(status=403)
+        if not eventos.en_vivo(request):
+            # Con WSGI el flujo se enviaria recien al terminar y ocuparia un worker:
+            # con 204 el EventSource deja de reconectar
+            return HttpResponse(status=204)
+        response = StreamingHttpResponse(self.flujo(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def flujo(self):
+        # La suscripcion se crea en el loop que envia la respuesta
+        suscripcion = eventos.publicador.suscribir()
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    tipo, datos = await suscripcion.siguiente(self.segundos_latido)
+                except asyncio.TimeoutError:
+                    yield ': latido\n\n'
+                    continue
+                yield f'event: {tipo}\ndata: {json.dumps(datos, cls=DjangoJSONEncoder)}\n\n'
+        finally:
+            eventos.publicador.desuscribir(suscripcion)
+
+
+#metricas de tiempos y consultas por vista (solo staff)
+class MetricasView(LoginRequiredMixin, UserPassesTestMixin, View):
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        return JsonResponse({'vistas': metricas.registro.as_dict(), 'cache': metricas.registro.cache_dict()})
+
+
+class MetricasPrometheusView(MetricasView):
+    def get(self, request):
+        return HttpResponse(metricas.registro.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
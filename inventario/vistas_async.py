@@ -0,0 +1,98 @@
+"""Variantes ``async def`` de las vistas de solo lectura, para servir con ASGI.
+
+urls.py las usa en lugar de las de views.py y api.py cuando
+``INVENTARIO_VISTAS_ASYNC`` es verdadero (por defecto, al arrancar con
+maestranza/asgi.py). Con WSGI Django ejecutaria un handler async con
+``async_to_sync`` en cada peticion, sin ganar nada.
+
+Los listados, el detalle y los GET de la API leen con el ORM asincrono; el
+resto (formularios de filtro, roles, cache del catalogo, las escrituras de
+la API) corre en un hilo con ``sync_to_async``. El contexto y las
+plantillas son los de las vistas sincronicas.
+"""
+from asgiref.sync import sync_to_async
+
+from . import api, catalogo, lotes, ubicaciones, valorizacion, views
+from .decorators import AsyncAccesoMixin
+from .forms import BusquedaProductoForm, FiltroMovimientosForm
+from .models import Categoria, Lote, MovimientoInventario, PrecioCompra, Producto
+from .paginacion import AsyncKeysetMixin, apaginar_keyset
+
+
+class ProductoListView(AsyncAccesoMixin, AsyncKeysetMixin, views.ProductoListView):
+    pass
+
+
+class MovimientoInventarioListView(AsyncAccesoMixin, AsyncKeysetMixin, views.MovimientoInventarioListView):
+    pass
+
+
+class AlertaStockBajoListView(AsyncAccesoMixin, AsyncKeysetMixin, views.AlertaStockBajoListView):
+    pass
+
+
+class ProductosVencimientoListView(AsyncAccesoMixin, AsyncKeysetMixin, views.ProductosVencimientoListView):
+    pass
+
+
+class ProductoDetailView(AsyncAccesoMixin, views.ProductoDetailView):
+    async def get(self, request, *args, **kwargs):
+        self.object = await sync_to_async(self.get_object)()
+        self.lecturas = {
+            'precios_compra': await apaginar_keyset(
+                self.object.precios_compra.all(), self.orden_precios,
+                request.GET.get('cursor'), self.precios_por_pagina,
+            ),
+            'valor': await sync_to_async(valorizacion.valor_producto)(self.object),
+            'stock_ubicaciones': [fila async for fila in ubicaciones.stock_de(self.object)],
+            'lotes': [lote async for lote in lotes.lotes_de(self.object)],
+        }
+        return self.render_to_response(self.get_context_data(object=self.object))
+
+
+# API
+
+class ProductosApiView(api.AsyncApiMixin, api.ProductosApiView):
+    async def get(self, request):
+        self.form = await sync_to_async(self.filtros)(BusquedaProductoForm)
+        return await self.arespuesta_condicional(lambda: self.alistar(self.form.filtrar(Producto.objects.all())))
+
+
+class ProductoApiView(api.AsyncApiMixin, api.ProductoApiView):
+    async def get(self, request, codigo):
+        return await self.arespuesta_condicional(lambda: self.adetalle(Producto.objects.filter(codigo=codigo)))
+
+
+class MovimientosApiView(api.AsyncApiMixin, api.MovimientosApiView):
+    async def get(self, request):
+        form = await sync_to_async(self.filtros)(FiltroMovimientosForm)
+        return await self.arespuesta_condicional(
+            lambda: self.alistar(form.filtrar(MovimientoInventario.objects.all()))
+        )
+
+
+class PreciosApiView(api.AsyncApiMixin, api.PreciosApiView):
+    async def get(self, request, codigo):
+        producto = await sync_to_async(catalogo.producto_o_404)(codigo)
+        return await self.arespuesta_condicional(
+            lambda: self.alistar(PrecioCompra.objects.filter(producto=producto))
+        )
+
+
+class LotesApiView(api.AsyncApiMixin, api.LotesApiView):
+    async def get(self, request, codigo):
+        producto = await sync_to_async(catalogo.producto_o_404)(codigo)
+        return await self.arespuesta_condicional(lambda: self.alistar(lotes.lotes_de(producto)))
+
+
+class LoteApiView(api.AsyncApiMixin, api.LoteApiView):
+    async def get(self, request, codigo, pk):
+        producto = await sync_to_async(catalogo.producto_o_404)(codigo)
+        return await self.arespuesta_condicional(
+            lambda: self.adetalle(Lote.objects.filter(producto=producto, pk=pk))
+        )
+
+
+class CategoriasApiView(api.AsyncApiMixin, api.CategoriasApiView):
+    async def get(self, request):
+        return await self.arespuesta_condicional(lambda: self.alistar(Categoria.objects.all()))
@@ -3,6 +3,19 @@ ASGI config for maestranza project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Con ASGI los listados, el detalle de producto y los GET de la API se sirven
+con los handlers async de inventario/vistas_async.py (DJANGO_ASGI activa
+INVENTARIO_VISTAS_ASYNC), y los eventos en vivo de los tableros (/eventos/)
+solo funcionan aqui. Con WSGI se usan las vistas sincronicas; comparar ambos
+despliegues con ``manage.py benchmark_servidores``. Para servirlo, con varios
+workers y INVENTARIO_EVENTOS_BACKEND = 'inventario.eventos.BackendCambios':
+
+    uvicorn maestranza.asgi:application --workers 4 --no-access-log
+
+Con ASGI las conexiones persistentes a la base (DB_CONN_MAX_AGE) quedan en
+los hilos de ``sync_to_async`` sin que nadie las cierre; DJANGO_ASGI hace
+que settings.py use una conexion por peticion.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -12,5 +25,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'maestranza.settings')
+os.environ['DJANGO_ASGI'] = '1'
 
 application = get_asgi_application()
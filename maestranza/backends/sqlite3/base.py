@@ -0,0 +1,35 @@
+"""Backend SQLite con pragmas y ``BEGIN IMMEDIATE`` configurables.
+
+Django 5.0 no tiene ``init_command`` ni ``transaction_mode`` para SQLite, asi
+que este backend los agrega leyendo dos claves de ``OPTIONS``:
+
+* ``pragmas``: dict de PRAGMA que se aplican a cada conexion nueva.
+* ``transaction_mode``: ``'IMMEDIATE'`` hace que ``atomic()`` tome el candado
+  de escritura al empezar. Con el ``BEGIN`` diferido por defecto, dos
+  transacciones que leen y luego escriben pueden chocar y una falla con
+  "database is locked" sin esperar el ``busy_timeout``.
+
+El resto de ``OPTIONS`` se pasa igual que siempre a ``sqlite3.connect``.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop('pragmas', None)
+        kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for pragma, valor in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            conn.execute(f'PRAGMA {pragma} = {valor}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        modo = self.settings_dict['OPTIONS'].get('transaction_mode')
+        if modo:
+            self.cursor().execute(f'BEGIN {modo}')
+        else:
+            super()._start_transaction_under_autocommit()